@@ -1,16 +1,41 @@
 import os
+import sys
+import gzip
 import json
 import time
+import hashlib
+import hmac
+import heapq
+import bisect
+import math
+import functools
+import itertools
 import traceback
+import random
+import secrets
 import threading
+import contextvars
 import webbrowser
-import statistics
-from collections import deque
-from flask import Flask, request, jsonify, render_template_string
+from concurrent.futures import ThreadPoolExecutor
+from collections import deque, namedtuple
+from datetime import datetime, timedelta, timezone
+from statistics import NormalDist
+from urllib.parse import urljoin
+from flask import Flask, Response, request, jsonify
+from flask.json.provider import DefaultJSONProvider
 from flask_cors import CORS
 import requests
+import numpy as np
 import pyotp
 from SmartApi import SmartConnect
+try:
+    import orjson
+except ImportError:  # optional fast serializer; stdlib json is used without it
+    orjson = None
+try:
+    import brotli
+except ImportError:  # optional; dashboard assets are then precompressed with gzip only
+    brotli = None
 
 # ---------- CONFIG ----------
 API_KEY = os.getenv("SMARTAPI_API_KEY", "Aez3BY2l")
@@ -23,6 +48,120 @@ POLL_INTERVAL = 1
 TOKEN_FILE = "token_list_nse.json"
 INSTRUMENT_URL = "https://margincalculator.angelbroking.com/OpenAPI_File/files/OpenAPIScripMaster.json"
 
+# Broker session lifecycle
+SESSION_TTL = 20 * 60 * 60       # seconds a SmartAPI session is trusted for
+SESSION_RENEW_MARGIN = 30 * 60   # renew this long before the session expires
+LOGIN_RETRY_MIN = 2              # seconds between failed login attempts (doubles up to max)
+LOGIN_RETRY_MAX = 120
+
+# Broker client resilience
+BROKER_POOL_SIZE = 20            # pooled HTTPS connections to the SmartAPI host
+BROKER_CONNECT_TIMEOUT = 3       # seconds
+BROKER_READ_TIMEOUT = 5          # seconds
+BROKER_MAX_RETRIES = 2           # retries after the first attempt for retryable errors
+BROKER_RETRY_BASE = 0.2          # seconds, doubled per attempt with full jitter
+BREAKER_FAILURE_THRESHOLD = 5    # consecutive failures that open the circuit
+BREAKER_COOLDOWN = 15            # seconds the circuit stays open before a probe
+QUOTE_STALE_MAX = 120            # max age in seconds of a cached quote served during an outage
+BATCH_QUOTE_MAX = 50             # tokens per SmartAPI market-data request
+
+# Broker rate limit and quote scheduling
+BROKER_RATE_LIMIT = float(os.getenv("SIM_BROKER_RATE", "10"))  # SmartAPI requests per second across all routes
+BROKER_RATE_BURST = float(os.getenv("SIM_BROKER_BURST", "10"))  # requests that may go out back to back after an idle spell
+BROKER_RATE_MAX_WAIT = 1.0       # seconds a call may queue for quota before it is refused
+SCHEDULER_RATE_SHARE = 0.8       # share of the rate limit the background scheduler plans to use
+QUOTE_CLASSES = ("position", "chart", "scanner")  # scheduling priority, highest first
+QUOTE_CLASS_RESERVE = {"position": 0, "chart": 1, "scanner": 3}  # quota tokens each class leaves untouched
+QUOTE_WATCH_TTL = 60             # seconds a chart/scanner subscription lives without being renewed
+QUOTE_MAX_INTERVAL = 60          # slowest polling interval the scheduler will fall back to
+
+# Warm start
+WARM_START_ENABLED = os.getenv("SIM_WARM_START", "1") == "1"  # prefill new symbols from recent candles
+CANDLE_INTERVAL = "ONE_MINUTE"
+CANDLE_SECONDS = 60              # length of a CANDLE_INTERVAL candle; warm start seeds bar timeframes it divides
+CANDLE_CACHE_DIR = "candle_cache"
+CANDLE_CACHE_MAX_AGE = 30 * 60   # seconds a cached series is used without asking the broker for newer candles
+CANDLE_CACHE_MAX = 2000          # candles kept per symbol and interval
+CANDLE_LOOKBACK_DAYS = 5         # a first fetch reaches back this far, past weekends and holidays
+WARM_START_WORKERS = 2           # candle warm-ups run on this many background threads, off the tick path
+WARM_START_MAX_WAIT = 30         # seconds a candle fetch waits for quota beyond the scanner's reserve
+
+# Watchlists
+WATCHLIST_FILE = "watchlists.json"
+WATCHLIST_MAX = 50
+WATCHLIST_MAX_SYMBOLS = 200
+WATCHLIST_LEASE = 60             # seconds a subscription lives unless its quotes are read again
+SYMBOL_IDLE_EVICT = 10 * 60      # seconds without a tick before an unwatched symbol's state is dropped
+EVICT_INTERVAL = 30              # seconds between idle-symbol sweeps
+
+# Universe scanner
+SCANNER_ENABLED = os.getenv("SIM_SCANNER", "0") == "1"  # rotate quotes across the universe on spare quota
+SCANNER_SUFFIX = "-EQ"           # instruments the scanner covers
+SCANNER_DEFAULT_LIMIT = 20
+SCANNER_MAX_LIMIT = 500
+
+# Basket orders
+BASKET_MAX_LEGS = 100
+
+# Resting orders
+ORDER_MAX_OPEN = 1_000_000       # resting orders across all symbols
+ORDER_CLOSED_KEEP = 1000         # filled/cancelled/rejected orders kept for listing
+ORDER_COMPACT_MIN = 1024         # cancelled heap entries a symbol tolerates before compaction
+ORDER_LIST_MAX = 500             # orders returned by one listing
+
+# Portfolio risk
+RISK_SAMPLE_SECONDS = 5          # held symbols' returns are sampled together this often
+RISK_HALFLIFE = 120              # samples for the covariance weights to halve
+RISK_HISTORY = 720               # return samples kept for historical VaR
+RISK_MIN_SAMPLES = 30            # samples before historical VaR is reported
+RISK_CONFIDENCE = 0.99
+RISK_VAR_HORIZON = 3600          # seconds VaR is quoted over
+
+# Transaction history compaction
+TX_HOT_MAX_COUNT = 5000          # raw fills kept in memory before compacting
+TX_HOT_MAX_AGE = 24 * 60 * 60    # seconds a raw fill stays hot
+TX_HOT_MIN_KEEP = 50             # never compact the fills /api/status shows
+TX_COMPACT_BATCH = 1000          # extra fills rolled up per pass to avoid compacting on every append
+TX_COMPACT_INTERVAL = 60         # seconds between compactions triggered by fill age alone
+TX_ARCHIVE_FILE = "transactions_archive.jsonl"
+STATUS_DELTA_HISTORY = 1000      # status versions a ?since= client may lag before it gets a full snapshot
+
+# Polled JSON responses
+COMPRESS_MIN_BYTES = 1024        # gzip responses larger than this when the client accepts it
+
+# Metrics
+LATENCY_BUCKETS = (0.00005, 0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01,
+                   0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)  # histogram upper bounds, seconds
+
+# Chart history
+TICK_HISTORY_MAX = 8 * 60 * 60   # ticks kept per symbol for /api/history (8h at one tick a second)
+HISTORY_DEFAULT_SPAN = 60 * 60   # seconds charted when no start is given
+HISTORY_DEFAULT_POINTS = 500
+HISTORY_MAX_POINTS = 5000
+
+# OHLC bars
+BAR_TIMEFRAMES = (1, 60, 300, 900)  # seconds; bars of each are built for every ticking symbol
+BAR_HISTORY_MAX = 2000           # closed bars kept per symbol and timeframe
+BAR_DEFAULT_LIMIT = 200          # bars returned by /api/bars without ?limit=
+
+# Indicators
+INDICATOR_MAX_PER_SYMBOL = 32    # distinct indicator configurations one symbol may carry
+INDICATOR_MAX_PERIOD = 10000     # ticks
+INDICATOR_DEFAULT_NAMES = "ema:20,rsi:14,macd,vwap,keltner"  # /api/indicators without ?names=
+HISTORY_MARGIN = 50              # prices kept per symbol beyond the longest window a strategy reads
+
+# Tracing and profiling
+ADMIN_TOKEN = os.getenv("SIM_ADMIN_TOKEN", "")  # X-Admin-Token for /api/admin/*; admin is off when unset
+SLOW_REQUEST_SECONDS = 0.5       # requests slower than this are logged with their span breakdown
+SLOW_TRACE_KEEP = 100            # most recent slow traces kept for /api/admin/traces
+PROFILE_INTERVAL = 0.005         # seconds between stack samples while profiling
+PROFILE_MAX_SECONDS = 300        # a forgotten profiler stops itself after this long
+
+# Dashboard assets
+DASHBOARD_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "static", "dashboard")
+ASSET_URL_PREFIX = "/assets/"
+ASSET_MAX_AGE = 365 * 24 * 60 * 60  # hashed asset names change with their content, so cache them for a year
+
 # Strategy Parameters
 STRATEGY_PARAMS = {
     "enabled": False,
@@ -37,25 +176,658 @@ STRATEGY_PARAMS = {
     "atr_period": 14,
     "atr_multiplier": 1.5,
     "confirmation_ticks": 1,
-    "auto_trade_enabled": False
+    "auto_trade_enabled": False,
+    "strategies": ["bollinger"],  # enabled strategy plugins, highest priority first
+    "rsi_period": 14,
+    "rsi_oversold": 30,
+    "rsi_overbought": 70,
+    "protective_orders": True,  # rest an OCO stop-loss/take-profit behind each auto-traded buy
+    "execution_model": "flat",  # flat: slippage_pct only; impact: spread, market impact, partial fills, latency
+    "spread_pct": 0.001,        # quoted bid/ask spread; a fill crosses half of it
+    "impact_coef": 0.1,         # price impact = impact_coef * sqrt(filled / liquidity_shares)
+    "liquidity_shares": 100000, # shares available to one order, as the quote feed has no volume
+    "max_participation": 0.1,   # largest share of liquidity one order takes; the rest is not filled
+    "latency_ms": 0,            # order latency the price drifts over before the fill
+    "max_var_pct": 0.05,        # reject buys that would lift portfolio VaR above this share of equity
+    "max_position_pct": 1.0,    # reject buys that would make one position more than this share of equity
+    "bar_timeframe": 0  # 0 evaluates strategies on every tick, else on each close of a bar this many seconds long
 }
 # ----------------------------
 
+# ---------- RECORD TYPES ----------
+# Fills can number in the hundreds of thousands during auto-trading, so the
+# per-record types use __slots__ and interned symbols instead of plain dicts.
+# to_dict() produces the exact wire format the dashboard already consumes.
+class Signal:
+    """Strategy signal with the band values it was derived from"""
+    __slots__ = ("action", "reason", "price", "lower_band", "middle_band", "upper_band", "atr", "strategy")
+
+    def __init__(self, action, reason, price, lower_band, middle_band, upper_band, atr, strategy="bollinger"):
+        self.action = sys.intern(action)
+        self.reason = sys.intern(reason)
+        self.price = price
+        self.lower_band = lower_band
+        self.middle_band = middle_band
+        self.upper_band = upper_band
+        self.atr = atr
+        self.strategy = sys.intern(strategy)
+
+    def to_dict(self):
+        return {
+            "action": self.action,
+            "reason": self.reason,
+            "price": self.price,
+            "lower_band": self.lower_band,
+            "middle_band": self.middle_band,
+            "upper_band": self.upper_band,
+            "atr": self.atr,
+            "strategy": self.strategy
+        }
+
+class Holding:
+    """Open position in one symbol, updated in place on every fill"""
+    __slots__ = ("symbol", "qty", "avg_price")
+
+    def __init__(self, symbol, qty, avg_price):
+        self.symbol = sys.intern(symbol)
+        self.qty = qty
+        self.avg_price = avg_price
+
+    def to_dict(self):
+        return {"qty": self.qty, "avg_price": self.avg_price}
+
+class Transaction:
+    """A single simulated fill"""
+    __slots__ = ("type", "symbol", "qty", "price", "total", "timestamp", "signal", "realized_pnl")
+
+    def __init__(self, type, symbol, qty, price, total, timestamp, signal=None, realized_pnl=0.0):
+        self.type = sys.intern(type)
+        self.symbol = sys.intern(symbol)
+        self.qty = qty
+        self.price = price
+        self.total = total
+        self.timestamp = timestamp
+        self.signal = signal
+        self.realized_pnl = realized_pnl
+
+    def to_dict(self):
+        tx = {
+            "type": self.type,
+            "symbol": self.symbol,
+            "qty": self.qty,
+            "price": self.price,
+            "total": self.total,
+            "timestamp": self.timestamp
+        }
+        if self.signal:
+            tx["strategy_signal"] = self.signal.to_dict()
+        return tx
+
+class TransactionSummary:
+    """Per-symbol, per-day rollup of compacted fills, with volume and VWAP per side"""
+    __slots__ = ("symbol", "day", "count", "buy_volume", "buy_notional", "sell_volume", "sell_notional",
+                 "realized_pnl")
+
+    def __init__(self, symbol, day):
+        self.symbol = sys.intern(symbol)
+        self.day = day
+        self.count = 0
+        self.buy_volume = 0
+        self.buy_notional = 0.0
+        self.sell_volume = 0
+        self.sell_notional = 0.0
+        self.realized_pnl = 0.0
+
+    def add(self, tx):
+        self.count += 1
+        if tx.type == "BUY":
+            self.buy_volume += tx.qty
+            self.buy_notional += tx.total
+        else:
+            self.sell_volume += tx.qty
+            self.sell_notional += tx.total
+        self.realized_pnl += tx.realized_pnl
+
+    def to_dict(self):
+        return {
+            "symbol": self.symbol,
+            "day": self.day,
+            "count": self.count,
+            "buy_volume": self.buy_volume,
+            "buy_vwap": self.buy_notional / self.buy_volume if self.buy_volume else 0.0,
+            "sell_volume": self.sell_volume,
+            "sell_vwap": self.sell_notional / self.sell_volume if self.sell_volume else 0.0,
+            "realized_pnl": self.realized_pnl
+        }
+
+class SimulatorJSONProvider(DefaultJSONProvider):
+    """JSON provider that serializes record types straight from their slots"""
+    @staticmethod
+    def default(o):
+        if hasattr(o, "to_dict"):
+            return o.to_dict()
+        return DefaultJSONProvider.default(o)
+
+    def dumps(self, obj, **kwargs):
+        with span("serialize"):
+            started = time.perf_counter()
+            try:
+                return super().dumps(obj, **kwargs)
+            finally:
+                JSON_ENCODE_TIME.observe(time.perf_counter() - started)
+
 app = Flask(__name__)
+app.json = SimulatorJSONProvider(app)
 CORS(app)
 
 SMART_OBJ = None
 TOKEN_DATA = None
-LOCK = threading.Lock()
+LOCK = threading.Lock()  # guards starting the background login threads only
+
+# Readiness of the background login / instrument loading
+BROKER_STATUS = {
+    "started": False,
+    "logged_in": False,
+    "tokens_loaded": False,
+    "login_time": None,
+    "expires_at": None,
+    "renewals": 0,
+    "last_error": None
+}
+SESSION_RENEW_EVENT = threading.Event()
+
+# ---------- METRICS ----------
+class Histogram:
+    """Latency histogram over LATENCY_BUCKETS.
+
+    observe() takes no lock; under the GIL a rare lost increment is a fair
+    price for keeping it cheap enough for the tick path.
+    """
+    __slots__ = ("counts", "sum", "count")
+
+    def __init__(self):
+        self.counts = [0] * (len(LATENCY_BUCKETS) + 1)
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, seconds):
+        self.counts[bisect.bisect_left(LATENCY_BUCKETS, seconds)] += 1
+        self.sum += seconds
+        self.count += 1
+
+class Metrics:
+    """Process-wide counters, gauges and histograms in Prometheus text format"""
+    def __init__(self):
+        self.kinds = {}        # name -> (type, help)
+        self.values = {}       # (name, labels) -> number, for counters and gauges
+        self.histograms = {}   # (name, labels) -> Histogram
+        self.collectors = []   # callables returning [(name, labels, value)] at scrape time
+
+    def describe(self, name, kind, text):
+        self.kinds[name] = (kind, text)
+
+    def inc(self, name, labels=(), n=1):
+        key = (name, labels)
+        self.values[key] = self.values.get(key, 0) + n
+
+    def histogram(self, name, labels=()):
+        key = (name, labels)
+        hist = self.histograms.get(key)
+        if hist is None:
+            hist = self.histograms.setdefault(key, Histogram())
+        return hist
+
+    @staticmethod
+    def _labels(labels, extra=()):
+        pairs = tuple(labels) + tuple(extra)
+        if not pairs:
+            return ""
+        escaped = (str(v).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n") for _, v in pairs)
+        return "{" + ",".join(f'{k}="{v}"' for (k, _), v in zip(pairs, escaped)) + "}"
+
+    def render(self, extra=(), only=None):
+        """extra labels go on every sample; only limits output to those metric names"""
+        series = {}
+        for (name, labels), value in list(self.values.items()):
+            series.setdefault(name, []).append(f"{name}{self._labels(labels, extra)} {value}")
+        for collect in self.collectors if only is None else ():
+            for name, labels, value in collect():
+                series.setdefault(name, []).append(f"{name}{self._labels(labels, extra)} {value}")
+        for (name, labels), hist in list(self.histograms.items()):
+            lines = series.setdefault(name, [])
+            cumulative = 0
+            for bound, n in zip(LATENCY_BUCKETS + ("+Inf",), hist.counts):
+                cumulative += n
+                lines.append(f"{name}_bucket{self._labels(labels, tuple(extra) + (('le', bound),))} {cumulative}")
+            lines.append(f"{name}_sum{self._labels(labels, extra)} {hist.sum}")
+            lines.append(f"{name}_count{self._labels(labels, extra)} {hist.count}")
+        if only is not None:
+            series = {name: lines for name, lines in series.items() if name in only}
+
+        out = []
+        for name in sorted(series):
+            kind, text = self.kinds.get(name, ("untyped", ""))
+            out.append(f"# HELP {name} {text}")
+            out.append(f"# TYPE {name} {kind}")
+            out.extend(series[name])
+        return "\n".join(out) + "\n"
+
+METRICS = Metrics()
+for _name, _kind, _text in (
+    ("http_request_seconds", "histogram", "HTTP request latency by route"),
+    ("http_requests_total", "counter", "HTTP requests by route, method and status"),
+    ("http_requests_in_flight", "gauge", "HTTP requests currently being served"),
+    ("broker_request_seconds", "histogram", "SmartAPI round-trip time per attempt, by route"),
+    ("broker_calls_total", "counter", "SmartAPI call outcomes"),
+    ("broker_circuit_open", "gauge", "1 while the broker circuit breaker is open"),
+    ("quote_flights_total", "counter", "Quote lookups that led a broker call or joined one in flight"),
+    ("quote_flights_in_flight", "gauge", "Quote lookups currently waiting on the broker"),
+    ("response_cache_total", "counter", "Versioned response cache lookups by result"),
+    ("indicator_seconds", "histogram", "Indicator and signal computation time"),
+    ("strategy_seconds", "histogram", "Per-strategy signal evaluation time"),
+    ("indicator_updates_total", "counter", "Incremental indicator updates applied by ticks"),
+    ("indicators_registered", "gauge", "Indicator instances registered across all symbols"),
+    ("portfolio_var", "gauge", "Parametric portfolio VaR in rupees over RISK_VAR_HORIZON"),
+    ("portfolio_exposure", "gauge", "Net market value of held positions"),
+    ("symbols_evicted_total", "counter", "Idle, unwatched symbols whose ring, indicators and history were dropped"),
+    ("watched_symbols", "gauge", "Symbols some live watchlist subscription holds"),
+    ("warm_starts_total", "counter", "New symbols warmed from candles, by source: cache, broker, stale_cache, none"),
+    ("resting_orders_total", "counter", "Resting order events: placed, filled, rejected, cancelled"),
+    ("resting_orders_open", "gauge", "Resting orders waiting for their trigger"),
+    ("bars_closed_total", "counter", "OHLC bars closed, by timeframe in seconds"),
+    ("symbol_lookup_seconds", "histogram", "Time to resolve a stock name to a SmartAPI token"),
+    ("json_encode_seconds", "histogram", "JSON serialization time by encoder"),
+    ("ticks_total", "counter", "Quotes recorded into price history"),
+    ("broker_quota_available", "gauge", "Broker rate-limit tokens available right now"),
+    ("quote_schedule_symbols", "gauge", "Symbols the quote scheduler polls, by priority class"),
+    ("quote_schedule_interval_seconds", "gauge", "Current polling interval per priority class"),
+    ("quote_schedule_max_lag_seconds", "gauge", "Worst lag behind the nominal poll cadence, by class"),
+    ("scanner_ready_symbols", "gauge", "Universe instruments with a full bb_window of scanned quotes"),
+    ("scanner_sweep_seconds", "gauge", "Duration of the scanner's last full rotation over the universe"),
+    ("trades_total", "counter", "Simulated fills by side"),
+    ("partial_fills_total", "counter", "Fills the execution model cut short of the requested quantity")
+):
+    METRICS.describe(_name, _kind, _text)
+JSON_ENCODE_TIME = METRICS.histogram("json_encode_seconds", (("encoder", "json"),))
+ORJSON_ENCODE_TIME = METRICS.histogram("json_encode_seconds", (("encoder", "orjson"),))
+
+def timed(name, span_name, **labels):
+    """Decorator recording each call's duration in histogram name and as a trace span"""
+    hist = METRICS.histogram(name, tuple(labels.items()))
+    def wrap(fn):
+        @functools.wraps(fn)
+        def inner(*args, **kwargs):
+            trace = CURRENT_TRACE.get()
+            if trace is not None:
+                trace.depth += 1
+            started = time.perf_counter()
+            try:
+                return fn(*args, **kwargs)
+            finally:
+                elapsed = time.perf_counter() - started
+                hist.observe(elapsed)
+                if trace is not None:
+                    trace.depth -= 1
+                    trace.spans.append((span_name, trace.depth, started - trace.started, elapsed))
+        return inner
+    return wrap
+
+def observe_request(route, method, status, seconds):
+    """Record one served HTTP request; shared by both serving modes"""
+    METRICS.histogram("http_request_seconds", (("route", route),)).observe(seconds)
+    METRICS.inc("http_requests_total", (("route", route), ("method", method), ("status", str(status))))
+
+def _broker_metrics():
+    stats = BROKER.stats()
+    rows = [("broker_calls_total", (("outcome", k),), v) for k, v in stats["counters"].items()]
+    rows.append(("broker_circuit_open", (), int(stats["breaker"] == "open")))
+    flights = QUOTE_FLIGHTS.stats()
+    rows.append(("quote_flights_total", (("role", "leader"),), flights["leaders"]))
+    rows.append(("quote_flights_total", (("role", "coalesced"),), flights["coalesced"]))
+    rows.append(("quote_flights_in_flight", (), flights["in_flight"]))
+    return rows
+
+METRICS.collectors.append(_broker_metrics)
+
+def metrics_text():
+    return METRICS.render()
+
+# ---------- TRACING & PROFILING ----------
+class Trace:
+    """Spans recorded while serving one request"""
+    __slots__ = ("method", "route", "started", "spans", "depth")
+
+    def __init__(self, method, route):
+        self.method = method
+        self.route = route
+        self.started = time.perf_counter()
+        self.spans = []  # (name, depth, offset, duration), in completion order
+        self.depth = 0
+
+    def to_dict(self):
+        spans = sorted(self.spans, key=lambda sp: sp[2])
+        return {
+            "method": self.method,
+            "route": self.route,
+            "spans": [{"name": n, "depth": d, "offset_ms": o * 1000, "duration_ms": t * 1000}
+                      for n, d, o, t in spans]
+        }
+
+CURRENT_TRACE = contextvars.ContextVar("current_trace", default=None)
+SLOW_TRACES = deque(maxlen=SLOW_TRACE_KEEP)
+
+class span:
+    """Time a block as a span of the current request's trace, if there is one"""
+    __slots__ = ("name", "trace", "started")
+
+    def __init__(self, name):
+        self.name = name
+
+    def __enter__(self):
+        self.trace = CURRENT_TRACE.get()
+        if self.trace is not None:
+            self.trace.depth += 1
+            self.started = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        trace = self.trace
+        if trace is not None:
+            trace.depth -= 1
+            trace.spans.append((self.name, trace.depth, self.started - trace.started,
+                                time.perf_counter() - self.started))
+        return False
+
+def begin_request(method, route):
+    """Start tracing a request; returns the context token for end_request"""
+    METRICS.inc("http_requests_in_flight")
+    return CURRENT_TRACE.set(Trace(method, route))
+
+def end_request(token, status):
+    """Record the request's metrics and log it if it was slow"""
+    METRICS.inc("http_requests_in_flight", n=-1)
+    trace = CURRENT_TRACE.get()
+    try:
+        CURRENT_TRACE.reset(token)
+    except ValueError:  # finished from another context (e.g. a closed stream)
+        pass
+    if trace is None:
+        return
+    elapsed = time.perf_counter() - trace.started
+    observe_request(trace.route, trace.method, status, elapsed)
+    if elapsed >= SLOW_REQUEST_SECONDS:
+        entry = trace.to_dict()
+        entry.update(status=status, duration_ms=elapsed * 1000, at=time.time())
+        SLOW_TRACES.append(entry)
+        top = sorted((sp for sp in trace.spans if sp[1] == 0), key=lambda sp: -sp[3])[:5]
+        breakdown = ", ".join(f"{n} {t * 1000:.0f}ms" for n, _, _, t in top) or "no spans"
+        print(f"🐢 Slow request {trace.method} {trace.route} -> {status} in {elapsed * 1000:.0f}ms ({breakdown})")
+
+class SamplingProfiler:
+    """Wall-clock sampler of every thread's stack, kept as folded stacks.
+
+    The output is the "folded" format read by flamegraph.pl and speedscope:
+    one line per distinct stack, frames joined by ';', then a sample count.
+    """
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread = None
+        self.stacks = {}
+        self.samples = 0
+        self.interval = PROFILE_INTERVAL
+        self.started_at = None
+        self.stopped_at = None
+
+    def running(self):
+        return self._thread is not None and self._thread.is_alive()
+
+    def start(self, interval=None):
+        with self._lock:
+            if self.running():
+                return False
+            self.stacks = {}
+            self.samples = 0
+            self.interval = interval or PROFILE_INTERVAL
+            self.started_at = time.time()
+            self.stopped_at = None
+            self._stop.clear()
+            self._thread = threading.Thread(target=self._run, name="sampling-profiler", daemon=True)
+            self._thread.start()
+            return True
+
+    def stop(self):
+        with self._lock:
+            if not self.running():
+                return False
+            self._stop.set()
+            self._thread.join()
+            return True
+
+    def _run(self):
+        me = threading.get_ident()
+        deadline = time.monotonic() + PROFILE_MAX_SECONDS
+        while not self._stop.wait(self.interval) and time.monotonic() < deadline:
+            names = {t.ident: t.name for t in threading.enumerate()}
+            for ident, frame in sys._current_frames().items():
+                if ident == me:
+                    continue
+                frames = []
+                while frame is not None:
+                    code = frame.f_code
+                    frames.append(f"{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})")
+                    frame = frame.f_back
+                frames.append(names.get(ident, str(ident)))
+                key = ";".join(reversed(frames))
+                self.stacks[key] = self.stacks.get(key, 0) + 1
+            self.samples += 1
+        self.stopped_at = time.time()
+
+    def folded(self):
+        return "".join(f"{stack} {count}\n" for stack, count in sorted(self.stacks.items()))
+
+    def status(self):
+        return {
+            "running": self.running(),
+            "interval": self.interval,
+            "samples": self.samples,
+            "stacks": len(self.stacks),
+            "started_at": self.started_at,
+            "stopped_at": self.stopped_at
+        }
+
+PROFILER = SamplingProfiler()
+
+def admin_error(token):
+    """Return (payload, status) when token does not grant admin access, else None"""
+    if not ADMIN_TOKEN:
+        return {"error": "Admin endpoints are disabled; set SIM_ADMIN_TOKEN"}, 403
+    if not token or not hmac.compare_digest(token, ADMIN_TOKEN):
+        return {"error": "Invalid admin token"}, 403
+    return None
+
+def profiler_control(data):
+    """Start or stop the sampling profiler, returning (payload, status)"""
+    data = data or {}
+    action = data.get("action")
+    if action == "start":
+        try:
+            interval = float(data.get("interval_ms", PROFILE_INTERVAL * 1000)) / 1000
+        except (TypeError, ValueError):
+            return {"error": "Invalid interval_ms"}, 400
+        if not 0.001 <= interval <= 1:
+            return {"error": "interval_ms must be between 1 and 1000"}, 400
+        started = PROFILER.start(interval)
+        return {"success": started, "profiler": PROFILER.status()}, 200 if started else 409
+    if action == "stop":
+        stopped = PROFILER.stop()
+        return {"success": stopped, "profiler": PROFILER.status()}, 200 if stopped else 409
+    return {"error": "action must be start or stop"}, 400
+
+# ---------- SERIALIZATION ----------
+def json_bytes(obj):
+    """Serialize to JSON bytes, with orjson when it is installed"""
+    if orjson is not None:
+        with span("serialize"):
+            started = time.perf_counter()
+            body = orjson.dumps(obj, default=SimulatorJSONProvider.default,
+                                option=orjson.OPT_SORT_KEYS | orjson.OPT_NON_STR_KEYS | orjson.OPT_SERIALIZE_NUMPY)
+            ORJSON_ENCODE_TIME.observe(time.perf_counter() - started)
+        return body
+    return app.json.dumps(obj).encode("utf-8")
+
+class CachedPayload:
+    __slots__ = ("key", "etag", "body", "gzipped")
+
+    def __init__(self, key, etag, body):
+        self.key = key
+        self.etag = etag
+        self.body = body
+        self.gzipped = None
+
+RESPONSE_CACHE = {}  # endpoint name -> CachedPayload for the latest version
+
+def render_versioned(name, key, build, if_none_match, accept_encoding):
+    """Serve build() as JSON with a version-derived ETag.
+
+    The body is only serialized (and compressed) again when key changes, and
+    a client already holding the current ETag gets a bodiless 304. Returns
+    (status, headers, body) so both serving modes can use it.
+    """
+    entry = RESPONSE_CACHE.get(name)
+    result = "hit"
+    if entry is None or entry.key != key:
+        etag = hashlib.blake2b(repr(key).encode(), digest_size=8).hexdigest()
+        entry = RESPONSE_CACHE[name] = CachedPayload(key, f'"{name}-{etag}"', json_bytes(build()))
+        result = "miss"
+
+    headers = {"ETag": entry.etag, "Cache-Control": "no-cache", "Vary": "Accept-Encoding"}
+    if if_none_match and (entry.etag in if_none_match or if_none_match.strip() == "*"):
+        METRICS.inc("response_cache_total", (("endpoint", name), ("result", "not_modified")))
+        return 304, headers, b""
+    METRICS.inc("response_cache_total", (("endpoint", name), ("result", result)))
+
+    headers["Content-Type"] = "application/json"
+    body = entry.body
+    if len(body) >= COMPRESS_MIN_BYTES and "gzip" in (accept_encoding or ""):
+        if entry.gzipped is None:
+            entry.gzipped = gzip.compress(body, compresslevel=5)
+        body = entry.gzipped
+        headers["Content-Encoding"] = "gzip"
+    return 200, headers, body
+
+def versioned_response(name, key, build):
+    status, headers, body = render_versioned(name, key, build, request.headers.get("If-None-Match"),
+                                             request.headers.get("Accept-Encoding"))
+    return Response(body, status=status, headers=headers)
+
+# ---------- DASHBOARD ASSETS ----------
+class StaticAsset:
+    """One dashboard file with its identity, gzip and (optionally) brotli bodies"""
+    __slots__ = ("content_type", "etag", "variants")
+
+    def __init__(self, content_type, data):
+        self.content_type = content_type
+        self.etag = '"' + hashlib.sha256(data).hexdigest()[:16] + '"'
+        self.variants = {"identity": data, "gzip": gzip.compress(data, compresslevel=9)}
+        if brotli is not None:
+            self.variants["br"] = brotli.compress(data, quality=11)
+
+DASHBOARD_FILES = (
+    ("dashboard.css", "text/css; charset=utf-8"),
+    ("dashboard.js", "application/javascript; charset=utf-8")
+)
+DASHBOARD = None  # (index StaticAsset, {hashed name: StaticAsset}), built on first use
+
+def build_dashboard():
+    """Hash, compress and link the dashboard files once.
+
+    Each asset is published under a content-hashed name and index.html is
+    rewritten to point at those names, so the page itself is the only
+    dashboard response that ever needs revalidating.
+    """
+    with open(os.path.join(DASHBOARD_DIR, "index.html"), encoding="utf-8") as f:
+        page = f.read()
+    assets = {}
+    for filename, content_type in DASHBOARD_FILES:
+        with open(os.path.join(DASHBOARD_DIR, filename), "rb") as f:
+            data = f.read()
+        stem, ext = os.path.splitext(filename)
+        hashed = f"{stem}.{hashlib.sha256(data).hexdigest()[:12]}{ext}"
+        assets[hashed] = StaticAsset(content_type, data)
+        page = page.replace(f"/static/dashboard/{filename}", ASSET_URL_PREFIX + hashed)
+    return StaticAsset("text/html; charset=utf-8", page.encode("utf-8")), assets
+
+def get_dashboard():
+    global DASHBOARD
+    if DASHBOARD is None:
+        DASHBOARD = build_dashboard()
+    return DASHBOARD
+
+def accepted_encodings(accept_encoding):
+    accepted = set()
+    for part in (accept_encoding or "").split(","):
+        coding, _, params = part.strip().partition(";")
+        if params.replace(" ", "") not in ("q=0", "q=0.0", "q=0.00", "q=0.000"):
+            accepted.add(coding.strip().lower())
+    return accepted
+
+def render_asset(name, if_none_match, accept_encoding):
+    """Serve the dashboard page (name None) or a hashed asset.
+
+    Returns (status, headers, body) so both serving modes can use it.
+    """
+    index, assets = get_dashboard()
+    if name is None:
+        asset, cache_control = index, "no-cache"
+    else:
+        asset = assets.get(name)
+        if asset is None:
+            return 404, {"Content-Type": "text/plain"}, b"Not found"
+        cache_control = f"public, max-age={ASSET_MAX_AGE}, immutable"
+
+    headers = {"ETag": asset.etag, "Cache-Control": cache_control, "Vary": "Accept-Encoding"}
+    if if_none_match and (asset.etag in if_none_match or if_none_match.strip() == "*"):
+        return 304, headers, b""
+
+    headers["Content-Type"] = asset.content_type
+    accepted = accepted_encodings(accept_encoding)
+    for encoding in ("br", "gzip"):
+        if encoding in accepted and encoding in asset.variants:
+            headers["Content-Encoding"] = encoding
+            return 200, headers, asset.variants[encoding]
+    return 200, headers, asset.variants["identity"]
+
+def asset_response(name):
+    status, headers, body = render_asset(name, request.headers.get("If-None-Match"),
+                                         request.headers.get("Accept-Encoding"))
+    return Response(body, status=status, headers=headers)
 
 # ---------- SIMULATOR STATE ----------
 SIMULATOR_STATE = {
     "balance": 10000000.00,
-    "portfolio": {},
-    "transactions": [],
+    "portfolio": {},  # symbol -> Holding
+    "transactions": [],  # list of Transaction (hot, newest last)
+    "tx_summaries": {},  # (symbol, day) -> TransactionSummary for compacted fills
     "price_history": {}  # symbol -> deque of prices for strategy
 }
 
+TRADE_LOCK = threading.RLock()  # serializes fills so a basket applies as one unit
+
+# Bumped on every change to balance/portfolio/transactions and to STRATEGY_PARAMS;
+# used to version cached responses.
+STATE_VERSION = 0
+PARAMS_VERSION = 0
+TX_COMPACTED_AT = 0.0  # fill time that last triggered a compaction
+
+def mark_state_changed():
+    global STATE_VERSION
+    STATE_VERSION += 1
+
+def mark_params_changed():
+    global PARAMS_VERSION
+    PARAMS_VERSION += 1
+
 # ---------- Helper Functions ----------
 def login_smartapi():
     print("🔐 Logging in to SmartAPI...")
@@ -104,6 +876,7 @@ def load_or_download_tokens():
     print(f"✅ Saved {len(parsed)} NSE symbols.")
     return parsed
 
+@timed("symbol_lookup_seconds", "symbol_lookup")
 def find_symbol_token(token_data, stock_name):
     stock_name = stock_name.upper().strip()
     for item in token_data:
@@ -112,159 +885,2199 @@ def find_symbol_token(token_data, stock_name):
             return item["symbol"], item["token"]
     return None, None
 
-def fetch_ltp(obj, exchange, symbol, token):
-    try:
-        res = obj.ltpData(exchange, symbol, token)
-        if "data" in res and "ltp" in res["data"]:
-            return res["data"]["ltp"]
-    except Exception:
-        pass
+# ---------- BROKER CLIENT ----------
+class BrokerError(Exception):
+    """A failed broker call, tagged with its error class"""
+    def __init__(self, kind, message, retryable=False):
+        super().__init__(message)
+        self.kind = kind
+        self.retryable = retryable
+
+class TokenBucket:
+    """Token bucket allowing rate calls per second with bursts of up to burst"""
+    def __init__(self, rate, burst):
+        self.rate = rate
+        self.burst = burst
+        self.tokens = float(burst)
+        self.updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def _refill(self, now):
+        self.tokens = min(self.burst, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def available(self):
+        with self._lock:
+            self._refill(time.monotonic())
+            return self.tokens
+
+    def wait_spare(self, reserve, max_wait):
+        """Wait until a call would leave reserve tokens untouched; False if that takes over max_wait seconds"""
+        deadline = time.monotonic() + max_wait
+        while self.available() - 1 < reserve:
+            left = deadline - time.monotonic()
+            if left <= 0:
+                return False
+            time.sleep(min(1 / self.rate, left))
+        return True
+
+    def reserve(self, max_wait):
+        """Claim one call; returns the seconds to wait before making it, or None if that exceeds max_wait"""
+        with self._lock:
+            self._refill(time.monotonic())
+            delay = max(0.0, (1 - self.tokens) / self.rate)
+            if delay > max_wait:
+                return None
+            self.tokens -= 1
+            return delay
+
+RATE_LIMITER = TokenBucket(BROKER_RATE_LIMIT, BROKER_RATE_BURST)
+
+class BrokerClient:
+    """SmartAPI REST client with pooling, timeouts, retries and a circuit breaker.
+
+    Authentication comes from the current SmartConnect session object; the
+    HTTP calls themselves go through one pooled requests.Session, because
+    SmartConnect opens a fresh connection for every request.
+    """
+    OUTCOMES = ("ok", "timeout", "network", "rate_limited", "auth", "server",
+                "bad_response", "retried", "short_circuited", "throttled", "served_stale")
+
+    def __init__(self):
+        self.session = requests.Session()
+        adapter = requests.adapters.HTTPAdapter(pool_connections=1, pool_maxsize=BROKER_POOL_SIZE)
+        self.session.mount("https://", adapter)
+        self.counters = dict.fromkeys(self.OUTCOMES, 0)
+        self.quote_cache = {}  # token -> (ltp, fetched_at)
+        self._lock = threading.Lock()
+        self._failures = 0
+        self._opened_at = None
+        self._probing = False
+
+    def _count(self, outcome):
+        with self._lock:
+            self.counters[outcome] += 1
+
+    # ----- circuit breaker -----
+    def _allow(self):
+        """"closed" or "probe" if a call may go out, else None"""
+        with self._lock:
+            if self._opened_at is None:
+                return "closed"
+            if time.time() - self._opened_at < BREAKER_COOLDOWN or self._probing:
+                return None
+            self._probing = True  # half-open: let a single probe through
+            return "probe"
+
+    def end_probe(self):
+        """Free the half-open slot if the probe ended without reaching failed() or succeeded()"""
+        with self._lock:
+            self._probing = False
+
+    def _record(self, ok):
+        with self._lock:
+            self._probing = False
+            if ok:
+                self._failures = 0
+                self._opened_at = None
+            else:
+                self._failures += 1
+                if self._failures >= BREAKER_FAILURE_THRESHOLD or self._opened_at is not None:
+                    self._opened_at = time.time()
+
+    def breaker_state(self):
+        if self._opened_at is None:
+            return "closed"
+        if time.time() - self._opened_at < BREAKER_COOLDOWN:
+            return "open"
+        return "half-open"
+
+    # ----- requests -----
+    @staticmethod
+    def prepare(obj, route, params):
+        """Build (url, headers, body) for a SmartAPI POST"""
+        url = urljoin(obj.root, obj._routes[route])
+        headers = obj.requestHeaders()
+        if obj.access_token:
+            headers["Authorization"] = f"Bearer {obj.access_token}"
+        return url, headers, json.dumps(params)
+
+    @staticmethod
+    def decode(status_code, text):
+        """Classify a SmartAPI response, returning its JSON body or raising BrokerError"""
+        if status_code == 429 or "exceeding access rate" in text:
+            raise BrokerError("rate_limited", text[:200], retryable=True)
+        if status_code >= 500:
+            raise BrokerError("server", f"HTTP {status_code}", retryable=True)
+        try:
+            data = json.loads(text)
+        except ValueError:
+            raise BrokerError("bad_response", f"HTTP {status_code}: non-JSON body")
+        if status_code in (401, 403) or data.get("errorcode") in ("AG8001", "AG8002") \
+                or data.get("error_type") == "TokenException":
+            raise BrokerError("auth", data.get("message") or f"HTTP {status_code}")
+        if data.get("status") is not True:
+            raise BrokerError("bad_response", data.get("message") or f"HTTP {status_code}")
+        return data
+
+    def _send(self, obj, route, params):
+        url, headers, body = self.prepare(obj, route, params)
+        started = time.perf_counter()
+        try:
+            resp = self.session.post(url, data=body, headers=headers,
+                                     timeout=(BROKER_CONNECT_TIMEOUT, BROKER_READ_TIMEOUT))
+        except requests.exceptions.Timeout as e:
+            raise BrokerError("timeout", str(e), retryable=True)
+        except requests.exceptions.RequestException as e:
+            raise BrokerError("network", str(e), retryable=True)
+        finally:
+            self.observe_rtt(route, time.perf_counter() - started)
+        return self.decode(resp.status_code, resp.text)
+
+    @staticmethod
+    def observe_rtt(route, seconds):
+        METRICS.histogram("broker_request_seconds", (("route", route),)).observe(seconds)
+
+    def begin(self):
+        """Return (session object, is_probe) to call with, or raise if the call must not go out.
+
+        A probe must end with end_probe() on every exit path, so a probe that
+        is throttled or fails outside failed() cannot keep the breaker open.
+        """
+        obj = SMART_OBJ
+        if obj is None:
+            raise BrokerError("auth", "Not logged in")
+        state = self._allow()
+        if state is None:
+            self._count("short_circuited")
+            raise BrokerError("short_circuited", "Broker circuit is open")
+        return obj, state == "probe"
+
+    def throttle(self):
+        """Return the wait before the next call fits the rate limit, or raise if it is too long"""
+        delay = RATE_LIMITER.reserve(BROKER_RATE_MAX_WAIT)
+        if delay is None:
+            self._count("throttled")
+            raise BrokerError("throttled", "Broker rate limit reached")
+        return delay
+
+    def failed(self, e, attempt):
+        """Account for a failed attempt; return the backoff delay, or None to give up"""
+        self._count(e.kind)
+        if e.kind == "auth":
+            SESSION_RENEW_EVENT.set()
+        if not e.retryable:
+            # An expired session or a rejected request is not a broker outage
+            self._record(True)
+            return None
+        self._record(False)
+        if attempt >= BROKER_MAX_RETRIES or self.breaker_state() != "closed":
+            return None
+        self._count("retried")
+        return random.uniform(0, BROKER_RETRY_BASE * (2 ** (attempt + 1)))
+
+    def succeeded(self):
+        self._count("ok")
+        self._record(True)
+
+    def request(self, route, params):
+        """POST to a SmartAPI route, returning the decoded JSON body.
+
+        Raises BrokerError. Retryable errors are retried with jittered
+        exponential backoff; auth errors wake the session keeper instead.
+        """
+        with span("broker_fetch"):
+            obj, probe = self.begin()
+            try:
+                attempt = 0
+                while True:
+                    time.sleep(self.throttle())
+                    try:
+                        data = self._send(obj, route, params)
+                    except BrokerError as e:
+                        delay = self.failed(e, attempt)
+                        if delay is None:
+                            raise
+                        attempt += 1
+                        time.sleep(delay)
+                        continue
+                    self.succeeded()
+                    return data
+            finally:
+                if probe:
+                    self.end_probe()
+
+    @staticmethod
+    def ltp_params(exchange, symbol, token):
+        return {"exchange": exchange, "tradingsymbol": symbol, "symboltoken": token}
+
+    def remember_ltp(self, token, data):
+        """Cache the LTP from a successful response and return (ltp, True)"""
+        ltp = data["data"]["ltp"]
+        self.quote_cache[token] = (ltp, time.time())
+        return ltp, True
+
+    def cached_ltp(self, token):
+        """Return (ltp, False) from a recent cached quote, or (None, False)"""
+        cached = self.quote_cache.get(token)
+        if cached and time.time() - cached[1] <= QUOTE_STALE_MAX:
+            self._count("served_stale")
+            return cached[0], False
+        return None, False
+
+    def ltp(self, exchange, symbol, token):
+        """Return (ltp, fresh). Falls back to a recent cached quote on failure."""
+        try:
+            return self.remember_ltp(token, self.request("api.ltp.data", self.ltp_params(exchange, symbol, token)))
+        except (BrokerError, KeyError, TypeError):
+            return self.cached_ltp(token)
+
+    @staticmethod
+    def market_params(exchange, tokens):
+        return {"mode": "LTP", "exchangeTokens": {exchange: list(tokens)}}
+
+    def remember_batch(self, tokens, data):
+        """Cache the LTPs from a market-data response; returns token -> (ltp, fresh)"""
+        now = time.time()
+        quotes = {}
+        for row in data["data"].get("fetched") or []:
+            token = str(row.get("symbolToken"))
+            if token in tokens and row.get("ltp") is not None:
+                self.quote_cache[token] = (row["ltp"], now)
+                quotes[token] = (row["ltp"], True)
+        for token in tokens:
+            if token not in quotes:
+                quotes[token] = self.cached_ltp(token)
+        return quotes
+
+    def ltp_batch(self, exchange, tokens):
+        """Return token -> (ltp, fresh) with one market-data call per BATCH_QUOTE_MAX tokens"""
+        tokens = list(dict.fromkeys(tokens))
+        quotes = {}
+        for i in range(0, len(tokens), BATCH_QUOTE_MAX):
+            chunk = tokens[i:i + BATCH_QUOTE_MAX]
+            try:
+                quotes.update(self.remember_batch(chunk, self.request("api.market.data",
+                                                                      self.market_params(exchange, chunk))))
+            except (BrokerError, KeyError, TypeError, AttributeError):
+                quotes.update((token, self.cached_ltp(token)) for token in chunk)
+        return quotes
+
+    def stats(self):
+        with self._lock:
+            counters = dict(self.counters)
+        return {"breaker": self.breaker_state(), "consecutive_failures": self._failures, "counters": counters}
+
+BROKER = BrokerClient()
+
+def fetch_quote(exchange, symbol, token):
+    """Fetch (ltp, fresh) through the resilient broker client"""
+    return BROKER.ltp(exchange, symbol, token)
+
+# ---------- REQUEST COALESCING ----------
+class _Flight:
+    __slots__ = ("event", "result", "error")
+
+    def __init__(self):
+        self.event = threading.Event()
+        self.result = None
+        self.error = None
+
+class SingleFlight:
+    """Run one call per key at a time; concurrent callers share its result"""
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._flights = {}
+        self.leaders = 0
+        self.coalesced = 0
+
+    def do(self, key, fn, *args):
+        with self._lock:
+            flight = self._flights.get(key)
+            leader = flight is None
+            if leader:
+                flight = self._flights[key] = _Flight()
+                self.leaders += 1
+            else:
+                self.coalesced += 1
+
+        if not leader:
+            flight.event.wait()
+            if flight.error is not None:
+                raise flight.error
+            return flight.result
+
+        try:
+            flight.result = fn(*args)
+        except Exception as e:
+            flight.error = e
+            raise
+        finally:
+            with self._lock:
+                del self._flights[key]
+            flight.event.set()
+        return flight.result
+
+    def stats(self):
+        return {"leaders": self.leaders, "coalesced": self.coalesced, "in_flight": len(self._flights)}
+
+QUOTE_FLIGHTS = SingleFlight()
+
+def _fetch_and_record(symbol, token):
+    ltp, fresh = fetch_quote(EXCHANGE_WANTED, symbol, token)
+    # Cached quotes served during an outage are not new ticks
+    if fresh:
+        record_tick(symbol, token, ltp)
+    return ltp, fresh
+
+def record_tick(symbol, token, ltp):
+    SCHEDULER.ticked(token, ltp)
+    update_price_history(symbol, ltp)
+
+def poll_tick(symbol, token):
+    """Return this interval's tick for a symbol, fetching and recording it if nobody has yet"""
+    recent = SCHEDULER.recent_tick(token)
+    if recent is not None:
+        return recent, True
+    return QUOTE_FLIGHTS.do(("tick", token), _fetch_and_record, symbol, token)
+
+def peek_quote(symbol, token):
+    """Fetch a quote without recording a tick, shared by concurrent callers"""
+    recent = SCHEDULER.recent_tick(token)
+    if recent is not None:
+        return recent, True
+    return QUOTE_FLIGHTS.do(("peek", token), fetch_quote, EXCHANGE_WANTED, symbol, token)
+
+# ---------- QUOTE SCHEDULER ----------
+class Subscription:
+    """A polled symbol; requested is the class asked for by watch(), None for holdings only"""
+    __slots__ = ("symbol", "token", "requested", "klass", "expires", "last_fetch")
+
+    def __init__(self, symbol, token, requested, expires):
+        self.symbol = symbol
+        self.token = token
+        self.requested = requested
+        self.klass = requested or "position"
+        self.expires = expires
+        self.last_fetch = 0.0
+
+class QuoteScheduler:
+    """Background quote polling that stays inside the broker rate limit.
+
+    Symbols are polled in priority classes: held positions (and every
+    watched symbol while auto-trading is on), then watched charts and
+    watchlist subscriptions, then
+    scanners. Each round the planned request rate is handed out class by
+    class, so when the quota runs short the lower classes are polled less
+    often instead of calls failing. Quotes are fetched BATCH_QUOTE_MAX at a
+    time and recorded as ticks. Whatever rate is left over feeds the
+    universe scanner's rotation.
+    """
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.subs = {}         # token -> Subscription
+        self.last_ticks = {}   # token -> (ltp, recorded_at) for every recorded tick
+        self.intervals = dict.fromkeys(QUOTE_CLASSES, POLL_INTERVAL)
+        self._positions = {}   # symbol -> token, cached lookups for held symbols
+        self.next_evict = 0.0
+        self.scan_rate = 0.0   # requests per second the classes leave for the universe scanner
+        self.scan_credit = 0.0
+        self.last_scan = time.time()
+        self._thread = None
+
+    def watch(self, symbol, token, klass, ttl=QUOTE_WATCH_TTL):
+        """Poll symbol in klass for the next ttl seconds; the higher class wins"""
+        expires = time.time() + ttl
+        rank = QUOTE_CLASSES.index
+        with self._lock:
+            sub = self.subs.get(token)
+            if sub is None:
+                self.subs[token] = Subscription(symbol, token, klass, expires)
+                return
+            if sub.requested is None or rank(klass) < rank(sub.requested):
+                sub.requested = klass
+            if rank(klass) < rank(sub.klass):
+                sub.klass = klass
+            sub.expires = max(sub.expires, expires)
+
+    def unwatch(self, token):
+        with self._lock:
+            self.subs.pop(token, None)
+
+    def ticked(self, token, ltp):
+        now = time.time()
+        self.last_ticks[token] = (ltp, now)
+        sub = self.subs.get(token)
+        if sub is not None:
+            sub.last_fetch = now
+
+    def recent_tick(self, token):
+        """The LTP recorded for token within the last poll interval, or None"""
+        tick = self.last_ticks.get(token)
+        if tick is not None and time.time() - tick[1] < POLL_INTERVAL:
+            return tick[0]
+        return None
+
+    def _sync_positions(self, now):
+        held = {}
+        for symbol in set(SIMULATOR_STATE["portfolio"]) | ORDER_BOOK.symbols():
+            token = self._positions.get(symbol)
+            if token is None:
+                _, token = find_symbol_token(TOKEN_DATA, symbol)
+            if token:
+                held[symbol] = token
+        self._positions = held
+        held_tokens = set(held.values())
+        watched = {token: symbol for symbol, token in WATCHLISTS.active(now).items()}
+        auto = STRATEGY_PARAMS["auto_trade_enabled"]
+        with self._lock:
+            for symbol, token in list(held.items()) + [(s, t) for t, s in watched.items()]:
+                if token not in self.subs:
+                    self.subs[token] = Subscription(symbol, token, None, now)
+            for token, sub in list(self.subs.items()):
+                charted = token in watched or (sub.requested == "chart" and sub.expires >= now)
+                if token in held_tokens or (auto and charted):
+                    sub.klass = "position"
+                elif token in watched:
+                    sub.klass = "chart"
+                elif sub.requested is None or sub.expires < now:
+                    del self.subs[token]
+                else:
+                    sub.klass = sub.requested
+
+    def plan(self):
+        """Hand the planned request rate to each class in priority order"""
+        budget = BROKER_RATE_LIMIT * SCHEDULER_RATE_SHARE
+        counts = dict.fromkeys(QUOTE_CLASSES, 0)
+        for sub in list(self.subs.values()):
+            counts[sub.klass] += 1
+        for klass in QUOTE_CLASSES:
+            requests_per_round = math.ceil(counts[klass] / BATCH_QUOTE_MAX)
+            wanted = requests_per_round / POLL_INTERVAL
+            granted = min(wanted, budget)
+            budget -= granted
+            if not requests_per_round:
+                self.intervals[klass] = POLL_INTERVAL
+            elif granted <= 0:
+                self.intervals[klass] = QUOTE_MAX_INTERVAL
+            else:
+                self.intervals[klass] = min(requests_per_round / granted, QUOTE_MAX_INTERVAL)
+        self.scan_rate = max(budget, 0.0)
+
+    def run_round(self):
+        """Fetch every due subscription the quota allows; returns the number of requests made"""
+        now = time.time()
+        self._sync_positions(now)
+        if now >= self.next_evict:
+            self.next_evict = now + EVICT_INTERVAL
+            evict_idle_symbols({sub.symbol for sub in list(self.subs.values())}, now)
+        self.plan()
+        rank = {klass: i for i, klass in enumerate(QUOTE_CLASSES)}
+        due = [sub for sub in list(self.subs.values())
+               if now - sub.last_fetch >= self.intervals[sub.klass] - 0.05]
+        due.sort(key=lambda sub: (rank[sub.klass], sub.last_fetch))
+        requests_made = 0
+        for i in range(0, len(due), BATCH_QUOTE_MAX):
+            batch = due[i:i + BATCH_QUOTE_MAX]
+            if RATE_LIMITER.available() - 1 < QUOTE_CLASS_RESERVE[batch[0].klass]:
+                break  # leave the rest of the quota to interactive calls; lag grows instead
+            quotes = BROKER.ltp_batch(EXCHANGE_WANTED, [sub.token for sub in batch])
+            requests_made += 1
+            for sub in batch:
+                ltp, fresh = quotes.get(sub.token, (None, False))
+                if fresh:
+                    record_tick(sub.symbol, sub.token, ltp)
+        if SCANNER.enabled:
+            requests_made += self._scan(now)
+        return requests_made
+
+    def _scan(self, now):
+        """Spend the unplanned rate on the scanner's rotation; returns the number of requests made"""
+        self.scan_credit = min(self.scan_credit + self.scan_rate * (now - self.last_scan), BROKER_RATE_BURST)
+        self.last_scan = now
+        requests_made = 0
+        while self.scan_credit >= 1 and RATE_LIMITER.available() - 1 >= QUOTE_CLASS_RESERVE["scanner"]:
+            batch = SCANNER.next_batch()
+            if batch is None:
+                break
+            start, end, tokens = batch
+            SCANNER.record(start, end, BROKER.ltp_batch(EXCHANGE_WANTED, tokens))
+            self.scan_credit -= 1
+            requests_made += 1
+        return requests_made
+
+    def _run(self):
+        while True:
+            started = time.time()
+            if SMART_OBJ is not None and TOKEN_DATA is not None:
+                try:
+                    self.run_round()
+                except Exception as e:
+                    print(f"⚠️ Quote scheduler round failed: {e}")
+            time.sleep(max(POLL_INTERVAL / 4 - (time.time() - started), 0.05))
+
+    def start(self):
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._run, name="quote-scheduler", daemon=True)
+            self._thread.start()
+
+    def lag(self, sub, now):
+        """Seconds a subscription is behind its nominal once-per-poll-interval cadence"""
+        if not sub.last_fetch:
+            return None
+        return max(0.0, now - sub.last_fetch - POLL_INTERVAL)
+
+    def report(self):
+        now = time.time()
+        subs = list(self.subs.values())
+        return {
+            "rate_limit": BROKER_RATE_LIMIT,
+            "quota_available": RATE_LIMITER.available(),
+            "intervals": dict(self.intervals),
+            "symbols": [{
+                "symbol": sub.symbol,
+                "class": sub.klass,
+                "interval": self.intervals[sub.klass],
+                "age": now - sub.last_fetch if sub.last_fetch else None,
+                "lag": self.lag(sub, now)
+            } for sub in subs]
+        }
+
+SCHEDULER = QuoteScheduler()
+
+def _scheduler_metrics():
+    now = time.time()
+    worst = dict.fromkeys(QUOTE_CLASSES, 0.0)
+    counts = dict.fromkeys(QUOTE_CLASSES, 0)
+    for sub in list(SCHEDULER.subs.values()):
+        counts[sub.klass] += 1
+        worst[sub.klass] = max(worst[sub.klass], SCHEDULER.lag(sub, now) or 0.0)
+    rows = [("broker_quota_available", (), RATE_LIMITER.available())]
+    for klass in QUOTE_CLASSES:
+        labels = (("class", klass),)
+        rows.append(("quote_schedule_symbols", labels, counts[klass]))
+        rows.append(("quote_schedule_interval_seconds", labels, SCHEDULER.intervals[klass]))
+        rows.append(("quote_schedule_max_lag_seconds", labels, worst[klass]))
+    return rows
+
+METRICS.collectors.append(_scheduler_metrics)
+
+# ---------- SCANNER ----------
+class UniverseScanner:
+    """Bollinger state for every instrument in the universe, fed by a rotation
+    of batched quotes on the quota the scheduler's classes leave unplanned.
+
+    State is columnar: each instrument is a row of an (n, window) price ring
+    with running sums, so a batch of quotes is a few fancy-indexed numpy
+    updates and a ranking is one pass over the arrays. Scanned quotes are
+    not recorded as ticks, so per-symbol rings, indicators and bars stay
+    limited to the symbols somebody polls.
+    """
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.enabled = SCANNER_ENABLED
+        self.window = 0
+        self.symbols = []
+        self.tokens = []
+        self.cursor = 0          # next universe row to fetch
+        self.sweeps = 0
+        self.sweep_started = None
+        self.sweep_seconds = None
+
+    def _build(self):
+        """Allocate state for the current universe and bb_window"""
+        universe = [item for item in TOKEN_DATA if item["symbol"].upper().endswith(SCANNER_SUFFIX)]
+        n, w = len(universe), STRATEGY_PARAMS["bb_window"]
+        self.symbols = [item["symbol"] for item in universe]
+        self.tokens = [item["token"] for item in universe]
+        self.window = w
+        self.ring = np.zeros((n, w))
+        self.pos = np.zeros(n, dtype=np.int64)
+        self.count = np.zeros(n, dtype=np.int64)
+        self.sums = np.zeros(n)
+        self.sumsq = np.zeros(n)
+        self.last = np.full(n, np.nan)
+        self.updated = np.zeros(n)
+        self.cursor = 0
+        self.sweep_started = None
+
+    def next_batch(self):
+        """(start, end, tokens) of the next rows to fetch, or None before the instrument list loads"""
+        with self._lock:
+            if TOKEN_DATA is None:
+                return None
+            if not self.tokens or self.window != STRATEGY_PARAMS["bb_window"]:
+                self._build()
+                if not self.tokens:
+                    return None
+            start = self.cursor
+            if start == 0:
+                self.sweep_started = time.time()
+            end = min(start + BATCH_QUOTE_MAX, len(self.tokens))
+            self.cursor = end % len(self.tokens)
+            return start, end, self.tokens[start:end]
+
+    def record(self, start, end, quotes):
+        """Push the fresh quotes for rows start:end into the rings"""
+        now = time.time()
+        with self._lock:
+            if end > len(self.tokens):
+                return  # the universe was rebuilt while the batch was in flight
+            rows, prices = [], []
+            for row in range(start, end):
+                ltp, fresh = quotes.get(self.tokens[row], (None, False))
+                if fresh:
+                    rows.append(row)
+                    prices.append(ltp)
+            if rows:
+                self._push(np.array(rows), np.array(prices, dtype=float))
+                self.updated[rows] = now
+            if end == len(self.tokens) and self.sweep_started is not None:
+                self.sweeps += 1
+                self.sweep_seconds = now - self.sweep_started
+
+    def _push(self, rows, prices):
+        w = self.window
+        col = self.pos[rows]
+        old = np.where(self.count[rows] >= w, self.ring[rows, col], 0.0)
+        self.ring[rows, col] = prices
+        self.sums[rows] += prices - old
+        self.sumsq[rows] += prices * prices - old * old
+        self.count[rows] += 1
+        self.pos[rows] = (col + 1) % w
+        self.last[rows] = prices
+        lap = rows[self.pos[rows] == 0]
+        if len(lap):
+            # Re-add each full ring once per lap so rounding error cannot build up
+            ring = self.ring[lap]
+            self.sums[lap] = ring.sum(axis=1)
+            self.sumsq[lap] = (ring * ring).sum(axis=1)
+
+    def ranking(self, limit, side):
+        """Instruments closest to or furthest beyond their bands, by distance in standard deviations"""
+        std_dev = STRATEGY_PARAMS["std_dev_base"]
+        with self._lock:
+            w = self.window
+            ready = np.flatnonzero(self.count >= w) if self.tokens else np.zeros(0, dtype=np.int64)
+            mean = self.sums[ready] / w if len(ready) else np.zeros(0)
+            sd = np.sqrt(np.maximum(self.sumsq[ready] / w - mean * mean, 0.0)) if len(ready) else np.zeros(0)
+            last = self.last[ready] if len(ready) else np.zeros(0)
+            updated = self.updated[ready] if len(ready) else np.zeros(0)
+            symbols = self.symbols
+            info = {"universe": len(self.tokens), "ready": int(len(ready)), "sweeps": self.sweeps,
+                    "sweep_seconds": self.sweep_seconds, "cursor": self.cursor}
+        with np.errstate(divide="ignore", invalid="ignore"):
+            z = (last - mean) / sd
+        score = {"upper": z, "lower": -z, "both": np.abs(z)}[side]
+        keep = np.flatnonzero(np.isfinite(score))
+        if len(keep) > limit:
+            keep = keep[np.argpartition(-score[keep], limit - 1)[:limit]]
+        keep = keep[np.argsort(-score[keep], kind="stable")]
+        now = time.time()
+        results = [{
+            "symbol": symbols[ready[i]],
+            "ltp": float(last[i]),
+            "upper": float(mean[i] + std_dev * sd[i]),
+            "middle": float(mean[i]),
+            "lower": float(mean[i] - std_dev * sd[i]),
+            "z": float(z[i]),
+            "beyond": bool(abs(z[i]) >= std_dev),
+            "age": now - float(updated[i])
+        } for i in keep]
+        return {"enabled": self.enabled, **info, "window": w, "std_dev": std_dev, "side": side, "results": results}
+
+SCANNER = UniverseScanner()
+
+def scanner_request(arg):
+    """Validate /api/scanner query arguments read through arg(name, default); returns (payload, status)"""
+    side = arg("side", "both") or "both"
+    if side not in ("both", "upper", "lower"):
+        return {"error": "side must be both, upper or lower"}, 400
+    limit = arg("limit", None) or str(SCANNER_DEFAULT_LIMIT)
+    if not limit.isdigit() or not 1 <= int(limit) <= SCANNER_MAX_LIMIT:
+        return {"error": f"limit must be an integer between 1 and {SCANNER_MAX_LIMIT}"}, 400
+    return SCANNER.ranking(int(limit), side), 200
+
+def set_scanner(data):
+    """Turn the universe rotation on or off; returns (payload, status)"""
+    enabled = (data or {}).get("enabled")
+    if not isinstance(enabled, bool):
+        return {"error": "enabled must be true or false"}, 400
+    SCANNER.enabled = enabled
+    print(f"🔭 Universe scanner {'on' if enabled else 'off'}")
+    return {"enabled": enabled}, 200
+
+def _scanner_metrics():
+    rows = [("scanner_ready_symbols", (), int((SCANNER.count >= SCANNER.window).sum()) if SCANNER.tokens else 0)]
+    if SCANNER.sweep_seconds is not None:
+        rows.append(("scanner_sweep_seconds", (), SCANNER.sweep_seconds))
+    return rows
+
+METRICS.collectors.append(_scanner_metrics)
+
+# ---------- WATCHLISTS ----------
+class WatchlistHub:
+    """Named symbol lists kept on disk, and the leases clients hold on them.
+
+    A subscription is a lease renewed by reading the list's quotes, so a tab
+    that goes away stops counting once its lease runs out. Each symbol is
+    reference-counted across live subscriptions; the scheduler polls exactly
+    the symbols with a count above zero.
+    """
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.lists = None      # name -> {symbol: token}, loaded on first use
+        self.subs = {}         # subscription id -> (name, expires)
+        self.refs = {}         # symbol -> live subscriptions whose list holds it
+        self.tokens = {}       # symbol -> token for every symbol in refs
+
+    def _load(self):
+        if self.lists is None:
+            try:
+                with open(WATCHLIST_FILE, encoding="utf-8") as f:
+                    self.lists = json.load(f)
+            except (OSError, ValueError):
+                self.lists = {}
+
+    def _save(self):
+        tmp = f"{WATCHLIST_FILE}.{os.getpid()}.tmp"
+        with open(tmp, "w", encoding="utf-8") as f:
+            json.dump(self.lists, f, indent=1)
+        os.replace(tmp, WATCHLIST_FILE)
+
+    def _ref(self, members, n):
+        for symbol, token in members.items():
+            count = self.refs.get(symbol, 0) + n
+            if count > 0:
+                self.refs[symbol] = count
+                self.tokens[symbol] = token
+            else:
+                self.refs.pop(symbol, None)
+                self.tokens.pop(symbol, None)
+
+    def _expire(self, now):
+        for sub_id, (name, expires) in list(self.subs.items()):
+            if expires < now:
+                del self.subs[sub_id]
+                self._ref(self.lists.get(name, {}), -1)
+
+    def snapshot(self):
+        with self._lock:
+            self._load()
+            self._expire(time.time())
+            counts = {}
+            for name, _ in self.subs.values():
+                counts[name] = counts.get(name, 0) + 1
+            return {"watchlists": {name: {"symbols": list(members), "subscribers": counts.get(name, 0)}
+                                   for name, members in self.lists.items()},
+                    "watched_symbols": len(self.refs)}
+
+    def get(self, name):
+        with self._lock:
+            self._load()
+            members = self.lists.get(name)
+            return dict(members) if members is not None else None
+
+    def put(self, name, members):
+        """Create or replace a list, moving the references of its live subscriptions"""
+        with self._lock:
+            self._load()
+            if name not in self.lists and len(self.lists) >= WATCHLIST_MAX:
+                raise ValueError(f"At most {WATCHLIST_MAX} watchlists")
+            old = self.lists.get(name, {})
+            live = sum(1 for n, _ in self.subs.values() if n == name)
+            self._ref(old, -live)
+            self._ref(members, live)
+            self.lists[name] = members
+            self._save()
+
+    def delete(self, name):
+        with self._lock:
+            self._load()
+            if self.lists.pop(name, None) is None:
+                return False
+            for sub_id, (n, _) in list(self.subs.items()):
+                if n == name:
+                    del self.subs[sub_id]
+            self.refs, self.tokens = {}, {}
+            for n, _ in self.subs.values():
+                self._ref(self.lists[n], 1)
+            self._save()
+            return True
+
+    def subscribe(self, name):
+        """Lease id for a new subscription to name, or None if there is no such list"""
+        with self._lock:
+            self._load()
+            members = self.lists.get(name)
+            if members is None:
+                return None
+            sub_id = secrets.token_hex(8)
+            self.subs[sub_id] = (name, time.time() + WATCHLIST_LEASE)
+            self._ref(members, 1)
+            return sub_id
+
+    def renew(self, name, sub_id):
+        """Extend a live lease on name; False if it has expired or belongs to another list"""
+        with self._lock:
+            sub = self.subs.get(sub_id)
+            if sub is None or sub[0] != name or sub[1] < time.time():
+                return False
+            self.subs[sub_id] = (name, time.time() + WATCHLIST_LEASE)
+            return True
+
+    def unsubscribe(self, name, sub_id):
+        with self._lock:
+            sub = self.subs.get(sub_id)
+            if sub is None or sub[0] != name:
+                return False
+            del self.subs[sub_id]
+            self._ref(self.lists.get(name, {}), -1)
+            return True
+
+    def active(self, now):
+        """symbol -> token for every symbol some live subscription watches"""
+        with self._lock:
+            if self.subs:
+                self._expire(now)
+            return dict(self.tokens)
+
+WATCHLISTS = WatchlistHub()
+
+def _watchlist_metrics():
+    return [("watched_symbols", (), len(WATCHLISTS.refs))]
+
+METRICS.collectors.append(_watchlist_metrics)
+
+def evict_idle_symbols(keep, now):
+    """Drop the ring, indicators, chart history and bars of symbols outside keep
+    that have not ticked for SYMBOL_IDLE_EVICT seconds; returns how many went"""
+    current = STRATEGY_ENGINE.current
+    evicted = 0
+    with INDICATOR_LOCK:
+        for symbol in list(SIMULATOR_STATE["price_history"]):
+            series = TICK_HISTORY.get(symbol)
+            if series is None or not series.n:
+                continue  # ring created, first tick not yet recorded
+            if symbol in keep or now - series.ts[series.n - 1] < SYMBOL_IDLE_EVICT:
+                continue
+            SIMULATOR_STATE["price_history"].pop(symbol, None)
+            INDICATORS.pop(symbol, None)
+            TICK_HISTORY.pop(symbol, None)
+            BARS.pop(symbol, None)
+            BAR_INDICATORS.pop(symbol, None)
+            current.forget(symbol)
+            evicted += 1
+    if evicted:
+        METRICS.inc("symbols_evicted_total", n=evicted)
+    return evicted
+
+WATCHLIST_NAME_CHARS = set("abcdefghijklmnopqrstuvwxyzABCDEFGHIJKLMNOPQRSTUVWXYZ0123456789-_")
+
+def _watchlist_name_error(name):
+    if not name or len(name) > 40 or not set(name) <= WATCHLIST_NAME_CHARS:
+        return "Watchlist names are 1-40 letters, digits, '-' or '_'"
     return None
 
-def ensure_login():
-    global SMART_OBJ, TOKEN_DATA
-    with LOCK:
-        if SMART_OBJ is None:
-            SMART_OBJ = login_smartapi()
-        if TOKEN_DATA is None:
+def put_watchlist(name, data):
+    """Create or replace a watchlist from {"symbols": [...]}; returns (payload, status)"""
+    error = _watchlist_name_error(name)
+    if error:
+        return {"error": error}, 400
+    stocks = (data or {}).get("symbols")
+    if not isinstance(stocks, list) or not all(isinstance(s, str) and s.strip() for s in stocks):
+        return {"error": "symbols must be a list of stock names"}, 400
+    if len(stocks) > WATCHLIST_MAX_SYMBOLS:
+        return {"error": f"At most {WATCHLIST_MAX_SYMBOLS} symbols per watchlist"}, 400
+    if TOKEN_DATA is None:
+        return {"error": "Instrument list is still loading"}, 503
+    members = {}
+    for stock in stocks:
+        symbol, token = find_symbol_token(TOKEN_DATA, stock)
+        if not symbol:
+            return {"error": f"Stock '{stock}' not found"}, 404
+        members[symbol] = token
+    try:
+        WATCHLISTS.put(name, members)
+    except ValueError as e:
+        return {"error": str(e)}, 400
+    return {"name": name, "symbols": list(members)}, 200
+
+def delete_watchlist(name):
+    if not WATCHLISTS.delete(name):
+        return {"error": f"Watchlist '{name}' not found"}, 404
+    return {"deleted": name}, 200
+
+def subscribe_watchlist(name):
+    sub_id = WATCHLISTS.subscribe(name)
+    if sub_id is None:
+        return {"error": f"Watchlist '{name}' not found"}, 404
+    return {"subscription": sub_id, "lease_seconds": WATCHLIST_LEASE}, 200
+
+def unsubscribe_watchlist(name, sub_id):
+    if not WATCHLISTS.unsubscribe(name, sub_id):
+        return {"error": f"No subscription '{sub_id}' on '{name}'"}, 404
+    return {"unsubscribed": sub_id}, 200
+
+def watchlist_quotes(name, sub_id):
+    """Latest recorded quote, bands and signal of each symbol in a watchlist,
+    renewing the caller's subscription; returns (payload, status)"""
+    members = WATCHLISTS.get(name)
+    if members is None:
+        return {"error": f"Watchlist '{name}' not found"}, 404
+    renewed = bool(sub_id) and WATCHLISTS.renew(name, sub_id)
+    now = time.time()
+    quotes = []
+    for symbol, token in members.items():
+        tick = SCHEDULER.last_ticks.get(token)
+        if tick is None:
+            quotes.append({"symbol": symbol, "ltp": None, "signal": None, "bollinger": None, "stale": True})
+            continue
+        quote = ltp_response(symbol, tick[0], now - tick[1] <= QUOTE_STALE_MAX)
+        quote["age"] = now - tick[1]
+        quotes.append(quote)
+    return {"name": name, "subscribed": renewed, "quotes": quotes}, 200
+
+# ---------- BROKER SESSION ----------
+def _token_loader():
+    """Load the instrument list in the background"""
+    global TOKEN_DATA
+    delay = LOGIN_RETRY_MIN
+    while TOKEN_DATA is None:
+        try:
             TOKEN_DATA = load_or_download_tokens()
+            BROKER_STATUS["tokens_loaded"] = True
+        except Exception as e:
+            BROKER_STATUS["last_error"] = f"Instrument load failed: {e}"
+            print(f"⚠️ {BROKER_STATUS['last_error']}, retrying in {delay}s")
+            time.sleep(delay)
+            delay = min(delay * 2, LOGIN_RETRY_MAX)
+
+def _session_keeper():
+    """Log in, then keep renewing the session before it expires.
+
+    A renewed session is built on a fresh SmartConnect object and swapped in
+    with a single assignment, so in-flight requests keep using the old one.
+    """
+    global SMART_OBJ
+    delay = LOGIN_RETRY_MIN
+    while True:
+        try:
+            obj = login_smartapi()
+        except Exception as e:
+            BROKER_STATUS["last_error"] = f"Login failed: {e}"
+            print(f"⚠️ {BROKER_STATUS['last_error']}, retrying in {delay}s")
+            time.sleep(delay)
+            delay = min(delay * 2, LOGIN_RETRY_MAX)
+            continue
+
+        delay = LOGIN_RETRY_MIN
+        obj.setSessionExpiryHook(SESSION_RENEW_EVENT.set)
+        renewing = SMART_OBJ is not None
+        SMART_OBJ = obj
+        now = time.time()
+        BROKER_STATUS["logged_in"] = True
+        BROKER_STATUS["login_time"] = now
+        BROKER_STATUS["expires_at"] = now + SESSION_TTL
+        BROKER_STATUS["last_error"] = None
+        if renewing:
+            BROKER_STATUS["renewals"] += 1
+
+        # Sleep until shortly before expiry, or until the broker reports a
+        # TokenException through the session expiry hook.
+        SESSION_RENEW_EVENT.clear()
+        SESSION_RENEW_EVENT.wait(max(SESSION_TTL - SESSION_RENEW_MARGIN, 0))
+        print("🔄 Renewing SmartAPI session...")
+
+def start_background_login():
+    """Start login and instrument loading without blocking the caller"""
+    with LOCK:
+        if BROKER_STATUS["started"]:
+            return
+        BROKER_STATUS["started"] = True
+    if TOKEN_DATA is None:
+        threading.Thread(target=_token_loader, name="token-loader", daemon=True).start()
+    else:
+        BROKER_STATUS["tokens_loaded"] = True
+    threading.Thread(target=_session_keeper, name="session-keeper", daemon=True).start()
+    SCHEDULER.start()
+
+def ensure_login():
+    """Return True once the broker session and instrument list are ready"""
+    with span("login_check"):
+        if not BROKER_STATUS["started"]:
+            start_background_login()
+        return SMART_OBJ is not None and TOKEN_DATA is not None
+
+def not_ready_response():
+    return jsonify({"error": "Broker session is starting up, please retry shortly", "status": BROKER_STATUS}), 503
+
+# ---------- INDICATORS ----------
+# Every indicator is a small state machine fed one price per tick in O(1), so
+# its value is ready without rescanning history. INDICATORS holds one shared
+# instance per (symbol, kind, params): the strategy, /api/ltp and
+# /api/indicators all read the same state, and each is updated once per tick.
+class RollingWindow:
+    """Last n values with running sums, re-centred once per lap to stop float drift"""
+    __slots__ = ("n", "buf", "i", "count", "ref", "sum", "sumsq")
+
+    def __init__(self, n):
+        self.n = n
+        self.buf = [0.0] * n
+        self.i = 0
+        self.count = 0
+        self.ref = None   # sums are of (x - ref) so large prices don't cancel out in the variance
+        self.sum = 0.0
+        self.sumsq = 0.0
+
+    def push(self, x):
+        if self.ref is None:
+            self.ref = x
+        old = self.buf[self.i]
+        self.buf[self.i] = x
+        self.i += 1
+        d = x - self.ref
+        if self.count < self.n:
+            self.count += 1
+            self.sum += d
+            self.sumsq += d * d
+        else:
+            o = old - self.ref
+            self.sum += d - o
+            self.sumsq += d * d - o * o
+        if self.i == self.n:
+            self.i = 0
+            self.ref = math.fsum(self.buf) / self.n
+            self.sum = math.fsum(v - self.ref for v in self.buf)
+            self.sumsq = math.fsum((v - self.ref) ** 2 for v in self.buf)
+
+    @property
+    def full(self):
+        return self.count == self.n
+
+    def mean(self):
+        return self.ref + self.sum / self.count
+
+    def pstdev(self):
+        m = self.sum / self.count
+        return math.sqrt(max(self.sumsq / self.count - m * m, 0.0))
+
+class Indicator:
+    """Base for incremental indicators; value() is None until warmed up"""
+    __slots__ = ()
+    DEFAULTS = ()  # default parameters; their types (int period / float factor) are enforced
+
+    @classmethod
+    def normalize(cls, params):
+        """Fill defaults and coerce types; raises ValueError on bad parameters"""
+        if len(params) > len(cls.DEFAULTS):
+            raise ValueError(f"at most {len(cls.DEFAULTS)} parameters")
+        out = []
+        for given, default in zip(tuple(params) + cls.DEFAULTS[len(params):], cls.DEFAULTS):
+            try:
+                value = type(default)(float(given))
+            except (ValueError, OverflowError):
+                raise ValueError(f"parameter {given} is not a number")
+            if not value > 0 or value == math.inf or (isinstance(default, int) and value > INDICATOR_MAX_PERIOD):
+                raise ValueError(f"parameter {given} out of range")
+            out.append(value)
+        return tuple(out)
+
+    def update(self, price):
+        raise NotImplementedError
+
+    def update_bar(self, open_, high, low, close, volume):
+        """Feed one closed bar; most indicators only read its close"""
+        self.update(close)
+
+    def update_at(self, t, price):
+        """Feed one tick taken at epoch time t; only session indicators read t"""
+        self.update(price)
+
+    def update_bar_at(self, t, bar):
+        """Feed one closed (open, high, low, close, volume) bar that opened at epoch time t"""
+        self.update_bar(*bar)
+
+    def value(self):
+        raise NotImplementedError
+
+class SMA(Indicator):
+    __slots__ = ("window",)
+    DEFAULTS = (20,)
+
+    def __init__(self, period):
+        self.window = RollingWindow(period)
+
+    def update(self, price):
+        self.window.push(price)
+
+    def value(self):
+        return self.window.mean() if self.window.full else None
+
+class Bands(Indicator):
+    """Rolling mean and population standard deviation; callers pick the band width"""
+    __slots__ = ("window",)
+    DEFAULTS = (20,)
+
+    def __init__(self, period):
+        self.window = RollingWindow(period)
+
+    def update(self, price):
+        self.window.push(price)
+
+    def bands(self, std_dev):
+        if not self.window.full:
+            return None, None, None
+        ma, sd = self.window.mean(), self.window.pstdev()
+        return ma + std_dev * sd, ma, ma - std_dev * sd
+
+    def value(self):
+        if not self.window.full:
+            return None
+        return {"middle": self.window.mean(), "sd": self.window.pstdev()}
+
+class ATR(Indicator):
+    """Mean true range over period bars; on raw ticks, which carry no high/low, the tick-to-tick move"""
+    __slots__ = ("window", "prev")
+    DEFAULTS = (14,)
+
+    def __init__(self, period):
+        self.window = RollingWindow(period)
+        self.prev = None
+
+    def update(self, price):
+        if self.prev is not None:
+            self.window.push(abs(price - self.prev))
+        self.prev = price
+
+    def update_bar(self, open_, high, low, close, volume):
+        prev = self.prev
+        self.window.push(high - low if prev is None else max(high, prev) - min(low, prev))
+        self.prev = close
+
+    def value(self):
+        return self.window.mean() if self.window.full else None
+
+class EMA(Indicator):
+    """Exponential moving average seeded with the SMA of the first period ticks"""
+    __slots__ = ("period", "alpha", "count", "ema")
+    DEFAULTS = (20,)
+
+    def __init__(self, period):
+        self.period = period
+        self.alpha = 2.0 / (period + 1)
+        self.count = 0
+        self.ema = 0.0
+
+    def update(self, price):
+        if self.count < self.period:
+            self.count += 1
+            self.ema += (price - self.ema) / self.count
+        else:
+            self.ema += self.alpha * (price - self.ema)
+
+    def value(self):
+        return self.ema if self.count >= self.period else None
+
+class RSI(Indicator):
+    """Wilder's relative strength index"""
+    __slots__ = ("period", "prev", "count", "gain", "loss")
+    DEFAULTS = (14,)
+
+    def __init__(self, period):
+        self.period = period
+        self.prev = None
+        self.count = 0
+        self.gain = 0.0
+        self.loss = 0.0
+
+    def update(self, price):
+        if self.prev is not None:
+            change = price - self.prev
+            gain, loss = max(change, 0.0), max(-change, 0.0)
+            if self.count < self.period:
+                self.count += 1
+                self.gain += (gain - self.gain) / self.count
+                self.loss += (loss - self.loss) / self.count
+            else:
+                self.gain += (gain - self.gain) / self.period
+                self.loss += (loss - self.loss) / self.period
+        self.prev = price
+
+    def value(self):
+        if self.count < self.period:
+            return None
+        if self.loss == 0:
+            return 100.0 if self.gain else 50.0
+        return 100.0 - 100.0 / (1.0 + self.gain / self.loss)
+
+class MACD(Indicator):
+    __slots__ = ("fast", "slow", "signal")
+    DEFAULTS = (12, 26, 9)
+
+    def __init__(self, fast, slow, signal):
+        self.fast = EMA(fast)
+        self.slow = EMA(slow)
+        self.signal = EMA(signal)
+
+    def update(self, price):
+        self.fast.update(price)
+        self.slow.update(price)
+        slow = self.slow.value()
+        if slow is not None:
+            self.signal.update(self.fast.ema - slow)
+
+    def value(self):
+        slow = self.slow.value()
+        if slow is None:
+            return None
+        macd = self.fast.ema - slow
+        signal = self.signal.value()
+        return {"macd": macd, "signal": signal,
+                "histogram": None if signal is None else macd - signal}
+
+class VWAP(Indicator):
+    """Session volume-weighted average price, restarted on each local day of
+    the tick or bar times fed through update_at / update_bar_at.
+
+    LTP quotes carry no traded volume, so ticks recorded without one weigh 1
+    and the value is the session's tick-weighted average price.
+    """
+    __slots__ = ("day", "pv", "volume")
+    DEFAULTS = ()
+
+    def __init__(self):
+        self.day = None
+        self.pv = 0.0
+        self.volume = 0.0
+
+    def session(self, t):
+        """Start a new session when t falls on a later day; late ticks stay in the current one"""
+        day = int((t - time.timezone) // 86400)
+        if self.day is None or day > self.day:
+            self.day, self.pv, self.volume = day, 0.0, 0.0
+
+    def update(self, price, volume=1.0):
+        self.pv += price * volume
+        self.volume += volume
+
+    def update_at(self, t, price):
+        self.session(t)
+        self.update(price)
+
+    def update_bar(self, open_, high, low, close, volume):
+        self.update((high + low + close) / 3, volume)
+
+    def update_bar_at(self, t, bar):
+        self.session(t)
+        self.update_bar(*bar)
+
+    def value(self):
+        return self.pv / self.volume if self.volume else None
+
+class Keltner(Indicator):
+    """EMA middle line with bands multiplier x ATR either side"""
+    __slots__ = ("ema", "atr", "multiplier")
+    DEFAULTS = (20, 10, 2.0)
+
+    def __init__(self, period, atr_period, multiplier):
+        self.ema = EMA(period)
+        self.atr = ATR(atr_period)
+        self.multiplier = multiplier
+
+    def update(self, price):
+        self.ema.update(price)
+        self.atr.update(price)
+
+    def update_bar(self, open_, high, low, close, volume):
+        self.ema.update(close)
+        self.atr.update_bar(open_, high, low, close, volume)
+
+    def value(self):
+        middle, atr = self.ema.value(), self.atr.value()
+        if middle is None or atr is None:
+            return None
+        width = self.multiplier * atr
+        return {"upper": middle + width, "middle": middle, "lower": middle - width}
+
+INDICATOR_TYPES = {
+    "sma": SMA, "ema": EMA, "rsi": RSI, "macd": MACD, "vwap": VWAP,
+    "keltner": Keltner, "bollinger": Bands, "atr": ATR
+}
+INDICATORS = {}  # symbol -> {(kind, params): Indicator}, in registration order
+# Taken around appending a tick and updating the symbol's indicators, so a new
+# indicator warmed from price history never sees a tick twice or misses one.
+INDICATOR_LOCK = threading.Lock()
+
+def indicator(symbol, kind, *params):
+    """Shared indicator for symbol, registered and warmed from price history on first use"""
+    cls = INDICATOR_TYPES[kind]
+    key = (kind, cls.normalize(params))
+    registered = INDICATORS.get(symbol)
+    ind = registered.get(key) if registered else None
+    if ind is not None:
+        return ind
+    with INDICATOR_LOCK:
+        registered = INDICATORS.setdefault(symbol, {})
+        ind = registered.get(key)
+        if ind is None:
+            if len(registered) >= INDICATOR_MAX_PER_SYMBOL:
+                raise ValueError(f"at most {INDICATOR_MAX_PER_SYMBOL} indicators per symbol")
+            ind = cls(*key[1])
+            for t, price in recent_ticks(symbol, len(SIMULATOR_STATE["price_history"].get(symbol, ()))):
+                ind.update_at(t, price)
+            registered[key] = ind
+        return ind
+
+def update_indicators(symbol, t, price):
+    """Feed one tick taken at t to every indicator registered on symbol; call with INDICATOR_LOCK held"""
+    registered = INDICATORS.get(symbol)
+    if registered:
+        for ind in registered.values():
+            ind.update_at(t, price)
+        METRICS.inc("indicator_updates_total", n=len(registered))
+
+def parse_indicator_specs(text):
+    """Parse 'ema:20,rsi,macd:12:26:9' into [(name, kind, params)]; raises ValueError"""
+    specs = []
+    for name in filter(None, (part.strip().lower() for part in text.split(","))):
+        kind, *params = name.split(":")
+        if kind not in INDICATOR_TYPES:
+            raise ValueError(f"unknown indicator '{kind}'")
+        specs.append((name, kind, INDICATOR_TYPES[kind].normalize(params)))
+    return specs
+
+def indicators_request(arg):
+    """Validate /api/indicators query arguments read through arg(name, default); returns (payload, status)"""
+    stock = (arg("stock", "") or "").strip()
+    if not stock:
+        return {"error": "Stock name required"}, 400
+    if TOKEN_DATA is None:
+        return {"error": "Instrument list is still loading"}, 503
+    symbol, _ = find_symbol_token(TOKEN_DATA, stock)
+    if not symbol:
+        return {"error": f"Stock '{stock}' not found"}, 404
+    try:
+        specs = parse_indicator_specs(arg("names", None) or INDICATOR_DEFAULT_NAMES)
+        values = {name: indicator(symbol, kind, *params).value() for name, kind, params in specs}
+    except ValueError as e:
+        return {"error": str(e)}, 400
+    history = SIMULATOR_STATE["price_history"].get(symbol)
+    return {"symbol": symbol, "ltp": history[-1] if history else None, "indicators": values}, 200
+
+def _indicator_metrics():
+    return [("indicators_registered", (), sum(len(r) for r in list(INDICATORS.values())))]
+
+METRICS.collectors.append(_indicator_metrics)
+
+# ---------- BARS ----------
+# OHLCV bars for every timeframe in BAR_TIMEFRAMES, built from the same ticks
+# as the price ring. LTP quotes carry no traded volume, so a bar's volume is
+# its tick count.
+class BarSeries:
+    """Closed bars of one timeframe, oldest first, in columnar numpy buffers, plus the bar being built"""
+    __slots__ = ("tf", "t", "cols", "n", "start", "open", "high", "low", "close", "volume")
+    OPEN, HIGH, LOW, CLOSE, VOLUME = range(5)  # rows of cols
+
+    def __init__(self, tf):
+        self.tf = tf
+        self.t = np.empty(64)
+        self.cols = np.empty((5, 64))
+        self.n = 0
+        self.start = None  # open time of the bar being built
+        self.open = self.high = self.low = self.close = self.volume = 0.0
+
+    def add(self, t, price, volume):
+        """Fold a tick into the open bar; returns True when it closed the previous one"""
+        start = t - t % self.tf
+        if self.start is not None and start <= self.start:
+            # Same bar, or a tick that lost a race with a newer one
+            if price > self.high:
+                self.high = price
+            elif price < self.low:
+                self.low = price
+            self.close = price
+            self.volume += volume
+            return False
+        closed = self.start is not None
+        if closed:
+            self._store()
+        self.start = start
+        self.open = self.high = self.low = self.close = price
+        self.volume = volume
+        return closed
+
+    def add_bar(self, t, open_, high, low, close, volume):
+        """Fold a finer bar that opened at t into the open bar, as add() folds a tick"""
+        start = t - t % self.tf
+        if self.start is not None and start <= self.start:
+            self.high = max(self.high, high)
+            self.low = min(self.low, low)
+            self.close = close
+            self.volume += volume
+            return
+        if self.start is not None:
+            self._store()
+        self.start = start
+        self.open, self.high, self.low, self.close, self.volume = open_, high, low, close, volume
+
+    def _store(self):
+        n = self.n
+        if n == len(self.t):
+            if n >= 2 * BAR_HISTORY_MAX:
+                keep = BAR_HISTORY_MAX
+                self.t[:keep] = self.t[n - keep:n]
+                self.cols[:, :keep] = self.cols[:, n - keep:n]
+                n = keep
+            else:
+                size = min(2 * n, 2 * BAR_HISTORY_MAX)
+                t, cols = np.empty(size), np.empty((5, size))
+                t[:n], cols[:, :n] = self.t[:n], self.cols[:, :n]
+                self.t, self.cols = t, cols
+        self.t[n] = self.start
+        self.cols[:, n] = (self.open, self.high, self.low, self.close, self.volume)
+        self.n = n + 1
+
+    def last(self):
+        """(open, high, low, close, volume) of the newest closed bar"""
+        return tuple(self.cols[:, self.n - 1].tolist())
+
+    def closes(self):
+        return self.cols[self.CLOSE, :self.n]
+
+    def current(self):
+        if self.start is None:
+            return None
+        return {"t": self.start, "open": self.open, "high": self.high, "low": self.low,
+                "close": self.close, "volume": self.volume}
+
+BARS = {}            # symbol -> {timeframe: BarSeries}
+BAR_INDICATORS = {}  # symbol -> {timeframe: {(kind, params): Indicator}} fed on bar close
+# Callables run as listener(symbol, series) after a bar of series.tf closes,
+# once its bar indicators are updated
+BAR_LISTENERS = []
+
+def record_bars(symbol, t, price):
+    """Fold a tick into every timeframe; returns the series whose bar closed. Call with INDICATOR_LOCK held"""
+    frames = BARS.get(symbol)
+    if frames is None:
+        frames = BARS[symbol] = {tf: BarSeries(tf) for tf in BAR_TIMEFRAMES}
+    closed = []
+    for series in frames.values():
+        if series.add(t, price, 1.0):
+            closed.append(series)
+            registered = BAR_INDICATORS.get(symbol, {}).get(series.tf)
+            if registered:
+                bar, opened = series.last(), float(series.t[series.n - 1])
+                for ind in registered.values():
+                    ind.update_bar_at(opened, bar)
+    return closed
+
+def bar_indicator(symbol, tf, kind, *params):
+    """Shared indicator over symbol's tf-second bars, registered and warmed from stored bars on first use"""
+    if tf not in BAR_TIMEFRAMES:
+        raise ValueError(f"timeframe must be one of {', '.join(map(str, BAR_TIMEFRAMES))}")
+    cls = INDICATOR_TYPES[kind]
+    key = (kind, cls.normalize(params))
+    registered = BAR_INDICATORS.get(symbol, {}).get(tf)
+    ind = registered.get(key) if registered else None
+    if ind is not None:
+        return ind
+    with INDICATOR_LOCK:
+        registered = BAR_INDICATORS.setdefault(symbol, {}).setdefault(tf, {})
+        ind = registered.get(key)
+        if ind is None:
+            if len(registered) >= INDICATOR_MAX_PER_SYMBOL:
+                raise ValueError(f"at most {INDICATOR_MAX_PER_SYMBOL} indicators per symbol and timeframe")
+            ind = cls(*key[1])
+            series = BARS.get(symbol, {}).get(tf)
+            if series is not None:
+                for t, bar in zip(series.t[:series.n].tolist(), series.cols[:, :series.n].T.tolist()):
+                    ind.update_bar_at(t, bar)
+            registered[key] = ind
+        return ind
+
+def bars_request(arg):
+    """Validate /api/bars query arguments read through arg(name, default); returns (payload, status)"""
+    stock = (arg("stock", "") or "").strip()
+    if not stock:
+        return {"error": "Stock name required"}, 400
+    if TOKEN_DATA is None:
+        return {"error": "Instrument list is still loading"}, 503
+    symbol, _ = find_symbol_token(TOKEN_DATA, stock)
+    if not symbol:
+        return {"error": f"Stock '{stock}' not found"}, 404
+    try:
+        tf = int(arg("timeframe", None) or 60)
+        limit = int(arg("limit", None) or BAR_DEFAULT_LIMIT)
+    except ValueError:
+        return {"error": "timeframe and limit must be integers"}, 400
+    if tf not in BAR_TIMEFRAMES:
+        return {"error": f"timeframe must be one of {', '.join(map(str, BAR_TIMEFRAMES))}"}, 400
+    limit = min(max(limit, 1), BAR_HISTORY_MAX)
+    payload = {"symbol": symbol, "timeframe": tf, "t": [], "open": [], "high": [], "low": [],
+               "close": [], "volume": [], "current": None}
+    with INDICATOR_LOCK:
+        series = BARS.get(symbol, {}).get(tf)
+        if series is None:
+            return payload, 200
+        lo = max(series.n - limit, 0)
+        t, cols = series.t[lo:series.n].tolist(), series.cols[:, lo:series.n].tolist()
+        payload["current"] = series.current()
+    payload.update(t=t, open=cols[0], high=cols[1], low=cols[2], close=cols[3], volume=cols[4])
+    return payload, 200
+
+def _bar_close_metrics(symbol, series):
+    METRICS.inc("bars_closed_total", (("timeframe", str(series.tf)),))
+
+BAR_LISTENERS.append(_bar_close_metrics)
+
+# ---------- EXECUTION MODEL ----------
+class ExecutionModel:
+    """Turns an order at its quoted price into a filled quantity and price.
+
+    fill() prices one live order with float math; fill_many() applies the
+    same formulas to numpy arrays of orders for batch backtests. side is +1
+    for a buy and -1 for a sell. PARAMS compile like a Strategy's.
+    """
+    name = None
+    PARAMS = ()
+
+    def __init_subclass__(cls, **kwargs):
+        super().__init_subclass__(**kwargs)
+        cls.Params = namedtuple(cls.__name__ + "Params", [key for key, *_ in cls.PARAMS])
+
+    def __init__(self, params):
+        self.p = self.Params(*compile_params(self.PARAMS, params))
+
+    def fill(self, side, qty, price, symbol=None):
+        """(filled qty, fill price); a filled qty of 0 means no fill"""
+        raise NotImplementedError
+
+    def fill_many(self, side, qty, price, volume=None, sigma=None, rng=None):
+        """(filled qty, fill price) arrays for order arrays; the price is NaN where nothing filled"""
+        raise NotImplementedError
+
+class FlatSlippage(ExecutionModel):
+    """Fills the whole order at once, slippage_pct away from the quote"""
+    name = "flat"
+    PARAMS = (("slippage_pct", float, 0.0, 1.0),)
+
+    def fill(self, side, qty, price, symbol=None):
+        return qty, price * (1 + side * self.p.slippage_pct)
+
+    def fill_many(self, side, qty, price, volume=None, sigma=None, rng=None):
+        qty = np.asarray(qty, dtype=np.int64)
+        return qty, np.asarray(price, dtype=float) * (1 + np.asarray(side) * self.p.slippage_pct)
+
+class MarketImpact(ExecutionModel):
+    """Crosses half the spread plus square-root market impact on the share of
+    liquidity taken, fills at most max_participation of that liquidity and
+    drops the rest, and lets the price drift for latency_ms before the fill.
+
+    The quote feed carries no volume, so live fills assume liquidity_shares
+    are available; fill_many() takes per-order volume when a backtest has it.
+    Latency drift is a random walk scaled by the symbol's recent tick-to-tick
+    volatility (sigma, per POLL_INTERVAL).
+    """
+    name = "impact"
+    PARAMS = (
+        ("spread_pct", float, 0.0, 0.1),
+        ("impact_coef", float, 0.0, 10.0),
+        ("liquidity_shares", int, 1, 10 ** 12),
+        ("max_participation", float, 0.0, 1.0),
+        ("latency_ms", int, 0, 60000)
+    )
+
+    def __init__(self, params):
+        super().__init__(params)
+        self.half_spread = self.p.spread_pct / 2
+        self.latency_scale = math.sqrt(self.p.latency_ms / 1000 / POLL_INTERVAL)
+        self.max_qty = int(self.p.max_participation * self.p.liquidity_shares)
+
+    def fill(self, side, qty, price, symbol=None):
+        filled = min(qty, self.max_qty)
+        if filled <= 0:
+            return 0, None
+        if self.latency_scale and symbol:
+            sigma = tick_volatility(symbol)
+            if sigma:
+                price *= 1 + sigma * self.latency_scale * EXECUTION_RNG.gauss(0.0, 1.0)
+        cost = self.half_spread + self.p.impact_coef * math.sqrt(filled / self.p.liquidity_shares)
+        return filled, price * (1 + side * cost)
+
+    def fill_many(self, side, qty, price, volume=None, sigma=None, rng=None):
+        qty = np.asarray(qty, dtype=np.int64)
+        price = np.asarray(price, dtype=float)
+        if volume is None:
+            liquidity, cap = float(self.p.liquidity_shares), self.max_qty
+        else:
+            liquidity = np.asarray(volume, dtype=float)
+            cap = np.floor(self.p.max_participation * liquidity).astype(np.int64)
+        filled = np.minimum(qty, cap)
+        if self.latency_scale and sigma is not None:
+            rng = rng or np.random.default_rng()
+            price = price * (1 + np.asarray(sigma) * self.latency_scale * rng.standard_normal(price.shape))
+        with np.errstate(divide="ignore", invalid="ignore"):
+            cost = self.half_spread + self.p.impact_coef * np.sqrt(filled / liquidity)
+        fill_price = np.where(filled > 0, price * (1 + np.asarray(side) * cost), np.nan)
+        return filled, fill_price
+
+EXECUTION_MODELS = {cls.name: cls for cls in (FlatSlippage, MarketImpact)}
+EXECUTION_RNG = random.Random()
+VOLATILITY_TICKS = 50  # recent ticks tick_volatility() reads
+
+def tick_volatility(symbol):
+    """Standard deviation of the symbol's recent tick-to-tick log returns, or None"""
+    prices = SIMULATOR_STATE["price_history"].get(symbol)
+    if not prices or len(prices) < 3:
+        return None
+    recent = np.fromiter(itertools.islice(reversed(prices), VOLATILITY_TICKS), dtype=float)
+    return float(np.std(np.diff(np.log(recent))))
+
+# ---------- STRATEGY ENGINE ----------
+def compile_params(spec, params):
+    """Values of params for spec [(key, type, low, high)], coerced and range-checked; raises ValueError"""
+    values = []
+    for key, kind, low, high in spec:
+        value = params.get(key)
+        if isinstance(value, bool) or not isinstance(value, (int, float)):
+            raise ValueError(f"{key} must be {'an integer' if kind is int else 'a number'}")
+        if isinstance(value, float) and not math.isfinite(value):
+            raise ValueError(f"{key} must be between {low} and {high}")
+        if kind is int and value != int(value):
+            raise ValueError(f"{key} must be an integer")
+        value = kind(value)
+        if not low <= value <= high:
+            raise ValueError(f"{key} must be between {low} and {high}")
+        values.append(value)
+    return values
+
+TRADING_PARAMS = (
+    ("slippage_pct", float, 0.0, 1.0),
+    ("risk_per_trade_pct", float, 0.0, 1.0),
+    ("stop_loss_pct", float, 0.0, 1.0),
+    ("atr_multiplier", float, 0.0, 100.0),
+    ("max_var_pct", float, 0.0, 1.0),
+    ("max_position_pct", float, 0.0, 1.0)
+)
+STOP_LOSS_MODES = ("ATR", "PERCENT")
+
+class Strategy:
+    """Signal plugin evaluated against a symbol's shared indicators.
+
+    PARAMS lists (key, type, low, high) read from STRATEGY_PARAMS. They are
+    validated and compiled once into the namedtuple self.p, so evaluate()
+    never looks up the params dict on the tick path.
+    """
+    name = None
+    PARAMS = ()
+    REASONS = {}   # action -> reason text carried by the Signal
+
+    def __init_subclass__(cls, **kwargs):
+        super().__init_subclass__(**kwargs)
+        cls.Params = namedtuple(cls.__name__ + "Params", [key for key, *_ in cls.PARAMS])
+
+    def __init__(self, params, timeframe=0):
+        self.p = self.compile(params)
+        self.timeframe = timeframe  # 0 reads tick indicators, else those of bars this many seconds long
+        self.handles = {}  # symbol -> indicators from bind(), looked up once per symbol
+
+    @classmethod
+    def compile(cls, params):
+        """Validated Params from a STRATEGY_PARAMS-shaped dict; raises ValueError"""
+        p = cls.Params(*compile_params(cls.PARAMS, params))
+        cls.check(p)
+        return p
+
+    @classmethod
+    def check(cls, p):
+        """Cross-parameter validation; raise ValueError to reject p"""
+
+    def specs(self):
+        """[(indicator kind, params)] evaluate() reads, in bind() order"""
+        raise NotImplementedError
+
+    def history_needed(self):
+        """Recent prices evaluate() reads besides its indicators"""
+        return 0
+
+    def bind(self, symbol):
+        handles = self.handles.get(symbol)
+        if handles is None:
+            if self.timeframe:
+                handles = tuple(bar_indicator(symbol, self.timeframe, kind, *params) for kind, params in self.specs())
+            else:
+                handles = tuple(indicator(symbol, kind, *params) for kind, params in self.specs())
+            self.handles[symbol] = handles
+        return handles
+
+    def evaluate(self, symbol, price, prices):
+        """Signal for the tick (or bar close) just recorded at price, or None; prices
+        holds the recent ticks (or bar closes), newest last"""
+        raise NotImplementedError
+
+    def signal(self, action, price, bands=(None, None, None), atr=None):
+        lower, middle, upper = bands
+        return Signal(action, self.REASONS[action], price, lower, middle, upper, atr, self.name)
+
+class BollingerReversion(Strategy):
+    """Buy below the lower band and sell above the upper one, widening the bands in volatile markets"""
+    name = "bollinger"
+    PARAMS = (
+        ("bb_window", int, 2, INDICATOR_MAX_PERIOD),
+        ("std_dev_base", float, 0.0, 10.0),
+        ("std_dev_alt", float, 0.0, 10.0),
+        ("std_dev_switch_vol_atr", float, 0.0, math.inf),
+        ("atr_period", int, 1, INDICATOR_MAX_PERIOD),
+        ("confirmation_ticks", int, 0, 1000)
+    )
+    REASONS = {"BUY": "Price below lower Bollinger Band", "SELL": "Price above upper Bollinger Band"}
+
+    def specs(self):
+        return [("bollinger", (self.p.bb_window,)), ("atr", (self.p.atr_period,))]
+
+    def history_needed(self):
+        return self.p.confirmation_ticks + 1
+
+    def bands(self, symbol):
+        """(upper, middle, lower, atr) with the band width chosen by volatility"""
+        bands, atr = self.bind(symbol)
+        p = self.p
+        atr = atr.value()
+        std_dev = p.std_dev_alt if atr is not None and atr > p.std_dev_switch_vol_atr else p.std_dev_base
+        return (*bands.bands(std_dev), atr)
+
+    def evaluate(self, symbol, price, prices):
+        upper, ma, lower, atr = self.bands(symbol)
+        if upper is None:
+            return None
+        if price < lower:
+            action, beyond = "BUY", lambda x: x < lower
+        elif price > upper:
+            action, beyond = "SELL", lambda x: x > upper
+        else:
+            return None
+        conf = self.p.confirmation_ticks
+        if conf and (len(prices) < conf + 1 or not all(map(beyond, itertools.islice(reversed(prices), conf)))):
+            return None
+        return self.signal(action, price, (lower, ma, upper), atr)
+
+class RSIReversion(Strategy):
+    """Buy when RSI is oversold and sell when it is overbought"""
+    name = "rsi"
+    PARAMS = (
+        ("rsi_period", int, 2, INDICATOR_MAX_PERIOD),
+        ("rsi_oversold", float, 0.0, 100.0),
+        ("rsi_overbought", float, 0.0, 100.0),
+        ("atr_period", int, 1, INDICATOR_MAX_PERIOD)
+    )
+    REASONS = {"BUY": "RSI below oversold level", "SELL": "RSI above overbought level"}
+
+    @classmethod
+    def check(cls, p):
+        if p.rsi_oversold >= p.rsi_overbought:
+            raise ValueError("rsi_oversold must be below rsi_overbought")
+
+    def specs(self):
+        return [("rsi", (self.p.rsi_period,)), ("atr", (self.p.atr_period,))]
+
+    def evaluate(self, symbol, price, prices):
+        rsi, atr = self.bind(symbol)
+        value = rsi.value()
+        if value is None:
+            return None
+        if value < self.p.rsi_oversold:
+            return self.signal("BUY", price, atr=atr.value())
+        if value > self.p.rsi_overbought:
+            return self.signal("SELL", price, atr=atr.value())
+        return None
+
+STRATEGY_TYPES = {cls.name: cls for cls in (BollingerReversion, RSIReversion)}
+
+class StrategySet:
+    """One compiled generation of STRATEGY_PARAMS; only bar_signals changes once built"""
+    __slots__ = ("version", "enabled", "timeframe", "active", "display", "keys", "history_len", "bar_signals",
+                 "execution")
+
+    def __init__(self, params, version):
+        """Validate params, storing them back coerced to their declared types; raises ValueError"""
+        names = params.get("strategies")
+        if not isinstance(names, list) or not all(name in STRATEGY_TYPES for name in names):
+            raise ValueError(f"strategies must be a list drawn from {sorted(STRATEGY_TYPES)}")
+        for key in ("enabled", "auto_trade_enabled", "protective_orders"):
+            if not isinstance(params.get(key), bool):
+                raise ValueError(f"{key} must be true or false")
+        if params.get("stop_loss_mode") not in STOP_LOSS_MODES:
+            raise ValueError(f"stop_loss_mode must be one of {', '.join(STOP_LOSS_MODES)}")
+        if params.get("bar_timeframe") not in (0,) + BAR_TIMEFRAMES or isinstance(params["bar_timeframe"], bool):
+            raise ValueError(f"bar_timeframe must be 0 or one of {', '.join(map(str, BAR_TIMEFRAMES))}")
+        if params.get("execution_model") not in EXECUTION_MODELS:
+            raise ValueError(f"execution_model must be one of {', '.join(EXECUTION_MODELS)}")
+        params.update(zip((key for key, *_ in TRADING_PARAMS), compile_params(TRADING_PARAMS, params)))
+        for cls in STRATEGY_TYPES.values():
+            params.update(cls.compile(params)._asdict())
+        for cls in EXECUTION_MODELS.values():
+            params.update(cls(params).p._asdict())
+        self.execution = EXECUTION_MODELS[params["execution_model"]](params)
+
+        self.version = version
+        self.enabled = params["enabled"]
+        self.timeframe = int(params["bar_timeframe"])
+        self.bar_signals = {}  # symbol -> Signal or None from the latest bar close, when timeframe is set
+        strategies = [STRATEGY_TYPES[name](params, self.timeframe) for name in dict.fromkeys(names)]
+        self.active = tuple((s, METRICS.histogram("strategy_seconds", (("strategy", s.name),)))
+                            for s in strategies)
+        # The chart shows tick Bollinger bands whether or not that strategy trades
+        self.display = next((s for s in strategies if s.name == "bollinger" and not s.timeframe), None) \
+            or BollingerReversion(params)
+        if self.timeframe:
+            strategies = []  # bar indicators warm from stored bars on first use
+        strategies.append(self.display)
+        self.keys = list(dict.fromkeys((kind, INDICATOR_TYPES[kind].normalize(p))
+                                       for s in strategies for kind, p in s.specs()))
+        needed = [n for _, p in self.keys for n in p if isinstance(n, int)]
+        needed += [s.history_needed() for s in strategies]
+        self.history_len = max(needed) + HISTORY_MARGIN
+
+    def forget(self, symbol):
+        """Drop symbol's cached indicator handles and bar signal"""
+        for strategy, _ in self.active:
+            strategy.handles.pop(symbol, None)
+        self.display.handles.pop(symbol, None)
+        self.bar_signals.pop(symbol, None)
+
+class StrategyEngine:
+    """Runs the enabled strategies over a symbol in priority order, timing each one"""
+    def __init__(self):
+        self.current = None      # StrategySet the tick path evaluates
+        self.history_len = 0     # ring size for new symbols; ahead of current while a rebuild runs
+
+    def load(self, strategies):
+        """Make strategies current at once; their indicators warm lazily"""
+        self.history_len = strategies.history_len
+        self.current = strategies
+
+    def evaluate(self, symbol, price):
+        """Signal for symbol now: from the latest bar close when strategies run on
+        bars, else from running them on this tick"""
+        current = self.current
+        if not current.enabled:
+            return None
+        if current.timeframe:
+            return current.bar_signals.get(symbol)
+        prices = SIMULATOR_STATE["price_history"].get(symbol)
+        if not prices:
+            return None
+        return self._run(current, symbol, price, prices)
+
+    def on_bar(self, symbol, series):
+        """Bar listener: evaluate once per close of the strategies' timeframe"""
+        current = self.current
+        if current.enabled and series.tf == current.timeframe:
+            closes = series.closes()
+            current.bar_signals[symbol] = self._run(current, symbol, float(closes[-1]), closes)
+
+    @staticmethod
+    def _run(current, symbol, price, prices):
+        """Run every active strategy; the first signal in priority order wins"""
+        signal = None
+        for strategy, hist in current.active:
+            started = time.perf_counter()
+            result = strategy.evaluate(symbol, price, prices)
+            hist.observe(time.perf_counter() - started)
+            if signal is None:
+                signal = result
+        return signal
+
+    def report(self):
+        current = self.current
+        active = {s.name: (s, hist) for s, hist in current.active}
+        rows = []
+        for name, cls in STRATEGY_TYPES.items():
+            strategy, hist = active.get(name, (None, None))
+            p = strategy.p if strategy else cls.compile(STRATEGY_PARAMS)
+            rows.append({
+                "name": name,
+                "active": strategy is not None,
+                "params": p._asdict(),
+                "evaluations": hist.count if hist else 0,
+                "mean_us": round(hist.sum / hist.count * 1e6, 2) if hist and hist.count else None
+            })
+        return {"enabled": current.enabled, "timeframe": current.timeframe, "version": current.version, "params_version": PARAMS_VERSION,
+                "rebuilding": current.version != PARAMS_VERSION, "last_rebuild": REBUILDER.last,
+                "strategies": rows}
+
+STRATEGY_ENGINE = StrategyEngine()
+STRATEGY_ENGINE.load(StrategySet(STRATEGY_PARAMS, PARAMS_VERSION))
+BAR_LISTENERS.append(STRATEGY_ENGINE.on_bar)
+PARAMS_LOCK = threading.Lock()  # serializes params updates so versions apply in order
+
+class IndicatorRebuilder:
+    """Brings price rings and indicators in line with a new StrategySet off the
+    tick path, then makes it current.
+
+    Each symbol's ring and missing indicators are rebuilt from a snapshot of
+    its recorded ticks without holding INDICATOR_LOCK; the lock is only taken
+    to copy the snapshot and, at the end, to replay the few ticks that arrived
+    meanwhile and swap the results in.
+    """
+    def __init__(self):
+        self._cond = threading.Condition()
+        self._pending = None
+        self._thread = None
+        self.last = None  # {"version", "symbols", "seconds"} of the latest finished rebuild
+
+    def submit(self, strategies):
+        STRATEGY_ENGINE.history_len = strategies.history_len
+        with self._cond:
+            self._pending = strategies
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name="params-rebuild", daemon=True)
+                self._thread.start()
+            self._cond.notify()
+
+    def _run(self):
+        while True:
+            with self._cond:
+                while self._pending is None:
+                    self._cond.wait()
+                strategies, self._pending = self._pending, None
+            started = time.perf_counter()
+            try:
+                rebuilt = self.rebuild(strategies)
+            except Exception as e:
+                print(f"⚠️ Indicator rebuild failed, indicators will warm on first use: {e}")
+                rebuilt = 0
+            previous, STRATEGY_ENGINE.current = STRATEGY_ENGINE.current, strategies
+            self.prune(previous, strategies)
+            self.last = {"version": strategies.version, "symbols": rebuilt,
+                         "seconds": round(time.perf_counter() - started, 4)}
+            print(f"🔧 Strategy params v{strategies.version} live after rebuilding {rebuilt} symbols")
+
+    def rebuild(self, strategies):
+        size, rebuilt = strategies.history_len, 0
+        for symbol in list(SIMULATOR_STATE["price_history"]):
+            with INDICATOR_LOCK:
+                ring = SIMULATOR_STATE["price_history"].get(symbol)
+                series = TICK_HISTORY.get(symbol)
+                if ring is None or series is None:
+                    continue
+                registered = INDICATORS.get(symbol, {})
+                missing = [key for key in strategies.keys if key not in registered]
+                if ring.maxlen == size and not missing:
+                    continue
+                seen = series.total
+                lo = max(series.n - size, 0)
+                times, prices = series.ts[lo:series.n].tolist(), series.px[lo:series.n].tolist()
+
+            new_ring = deque(prices, maxlen=size) if ring.maxlen != size else None
+            fresh = [(key, INDICATOR_TYPES[key[0]](*key[1])) for key in missing]
+            for _, ind in fresh:
+                for t, price in zip(times, prices):
+                    ind.update_at(t, price)
+
+            with INDICATOR_LOCK:
+                if SIMULATOR_STATE["price_history"].get(symbol) is not ring or TICK_HISTORY.get(symbol) is not series:
+                    continue  # reset while rebuilding
+                arrived = series.total - seen
+                for t, price in recent_ticks(symbol, arrived) if arrived else ():
+                    if new_ring is not None:
+                        new_ring.append(price)
+                    for _, ind in fresh:
+                        ind.update_at(t, price)
+                if new_ring is not None:
+                    SIMULATOR_STATE["price_history"][symbol] = new_ring
+                registered = INDICATORS.setdefault(symbol, {})
+                for key, ind in fresh:
+                    registered.setdefault(key, ind)
+            rebuilt += 1
+        return rebuilt
+
+    @staticmethod
+    def prune(previous, current):
+        """Drop indicators only the replaced StrategySet used; API consumers re-register on demand"""
+        stale = set(previous.keys) - set(current.keys)
+        if not stale:
+            return
+        with INDICATOR_LOCK:
+            for registered in INDICATORS.values():
+                for key in stale:
+                    registered.pop(key, None)
+
+REBUILDER = IndicatorRebuilder()
+
+# ---------- WARM START ----------
+# A new symbol's strategies would stay silent until bb_window ticks had
+# arrived. Instead its ring, indicators and chart history are prefilled from
+# recent candle closes, cached on disk per symbol and interval so a repeat
+# warm-up reads a file instead of calling the broker. The fetch runs on a
+# background pool; live ticks that arrive meanwhile are kept after the candles.
+IST = timezone(timedelta(hours=5, minutes=30))
+
+def candle_cache_path(symbol, interval):
+    name = "".join(ch if ch.isalnum() or ch in "-_" else "_" for ch in symbol)
+    return os.path.join(CANDLE_CACHE_DIR, f"{name}.{interval}.json")
+
+def load_cached_candles(symbol, interval):
+    """(fetched_at, candles) from the disk cache, or (0, [])"""
+    try:
+        with open(candle_cache_path(symbol, interval), encoding="utf-8") as f:
+            data = json.load(f)
+        return data["fetched"], data["candles"]
+    except (OSError, ValueError, KeyError, TypeError):
+        return 0, []
+
+def save_cached_candles(symbol, interval, fetched, candles):
+    path = candle_cache_path(symbol, interval)
+    os.makedirs(CANDLE_CACHE_DIR, exist_ok=True)
+    tmp = f"{path}.{os.getpid()}.tmp"
+    with open(tmp, "w", encoding="utf-8") as f:
+        json.dump({"symbol": symbol, "interval": interval, "fetched": fetched, "candles": candles}, f)
+    os.replace(tmp, path)
+
+def fetch_candles(token, interval, since):
+    """[[epoch, open, high, low, close, volume]] from the broker's candle API, starting
+    at since (or CANDLE_LOOKBACK_DAYS back); raises BrokerError"""
+    now = datetime.now(IST)
+    start = now - timedelta(days=CANDLE_LOOKBACK_DAYS)
+    if since:
+        start = max(start, datetime.fromtimestamp(since, IST))
+    data = BROKER.request("api.candle.data", {
+        "exchange": EXCHANGE_WANTED,
+        "symboltoken": token,
+        "interval": interval,
+        "fromdate": start.strftime("%Y-%m-%d %H:%M"),
+        "todate": now.strftime("%Y-%m-%d %H:%M")
+    })
+    return [[datetime.fromisoformat(row[0]).timestamp(), *map(float, row[1:6])] for row in data.get("data") or []]
+
+def warm_candles(symbol, interval=CANDLE_INTERVAL):
+    """Recent candles for symbol, oldest first: from the disk cache while it is
+    fresh, else topped up from the broker and written back"""
+    fetched, candles = load_cached_candles(symbol, interval)
+    now = time.time()
+    if candles and now - fetched < CANDLE_CACHE_MAX_AGE:
+        METRICS.inc("warm_starts_total", (("source", "cache"),))
+        return candles
+    _, token = find_symbol_token(TOKEN_DATA, symbol) if TOKEN_DATA else (None, None)
+    if not token or SMART_OBJ is None:
+        METRICS.inc("warm_starts_total", (("source", "stale_cache" if candles else "none"),))
+        return candles
+    last = candles[-1][0] if candles else 0
+    # Warm-ups are background work, so they only spend quota above the scanner's reserve
+    if not RATE_LIMITER.wait_spare(QUOTE_CLASS_RESERVE["scanner"], WARM_START_MAX_WAIT):
+        METRICS.inc("warm_starts_total", (("source", "stale_cache" if candles else "none"),))
+        return candles
+    try:
+        fresh = fetch_candles(token, interval, last)
+    except (BrokerError, KeyError, TypeError, ValueError, AttributeError) as e:
+        print(f"⚠️ Candle fetch for {symbol} failed, warming from {len(candles)} cached candles: {e}")
+        METRICS.inc("warm_starts_total", (("source", "stale_cache" if candles else "none"),))
+        return candles
+    candles = (candles + [c for c in fresh if c[0] > last])[-CANDLE_CACHE_MAX:]
+    save_cached_candles(symbol, interval, now, candles)
+    METRICS.inc("warm_starts_total", (("source", "broker"),))
+    return candles
 
 # ---------- STRATEGY FUNCTIONS ----------
+WARM_POOL = ThreadPoolExecutor(WARM_START_WORKERS, thread_name_prefix="warm-start")
+WARMING = set()  # symbols with a warm-up queued or running; guarded by INDICATOR_LOCK
+
+def warm_start(symbol):
+    """Seed symbol's bars, on every timeframe the candles divide, and their bar
+    indicators with the candles that predate its first live bar; runs on WARM_POOL.
+    The tick ring and chart keep live ticks only."""
+    try:
+        candles = warm_candles(symbol)
+    except Exception as e:
+        print(f"⚠️ Warm start for {symbol} failed, it will warm from live ticks: {e}")
+        candles = []
+    with INDICATOR_LOCK:
+        WARMING.discard(symbol)
+        if symbol not in SIMULATOR_STATE["price_history"] or not candles:
+            return  # reset or evicted while fetching, or nothing to seed
+        frames = BARS.setdefault(symbol, {tf: BarSeries(tf) for tf in BAR_TIMEFRAMES})
+        for tf, live in frames.items():
+            if tf % CANDLE_SECONDS:
+                continue
+            first = live.t[0] if live.n else live.start
+            seeded = BarSeries(tf)
+            for t, *bar in candles:
+                if first is None or t - t % tf < first:
+                    seeded.add_bar(t, *bar)
+            if seeded.start is None:
+                continue
+            for t, bar in zip(live.t[:live.n].tolist(), live.cols[:, :live.n].T.tolist()):
+                seeded.add_bar(t, *bar)
+            if live.start is not None:
+                seeded.add_bar(live.start, live.open, live.high, live.low, live.close, live.volume)
+            frames[tf] = seeded
+            registered = BAR_INDICATORS.get(symbol, {}).get(tf, {})
+            for key in registered:
+                ind = registered[key] = INDICATOR_TYPES[key[0]](*key[1])
+                for t, bar in zip(seeded.t[:seeded.n].tolist(), seeded.cols[:, :seeded.n].T.tolist()):
+                    ind.update_bar_at(t, bar)
+        STRATEGY_ENGINE.current.forget(symbol)
+
 def init_price_history(symbol):
-    """Initialize price history for a symbol"""
-    if symbol not in SIMULATOR_STATE["price_history"]:
-        max_len = max(STRATEGY_PARAMS["bb_window"], STRATEGY_PARAMS["atr_period"]) + 50
-        SIMULATOR_STATE["price_history"][symbol] = deque(maxlen=max_len)
+    """Initialize price history for a symbol and queue its bars' warm start from recent candles"""
+    if symbol in SIMULATOR_STATE["price_history"]:
+        return
+    with INDICATOR_LOCK:
+        if symbol in SIMULATOR_STATE["price_history"]:
+            return
+        SIMULATOR_STATE["price_history"][symbol] = deque(maxlen=STRATEGY_ENGINE.history_len)
+        if not WARM_START_ENABLED or symbol in BARS or symbol in WARMING:
+            return  # its bars already hold live ticks the candles would predate
+        WARMING.add(symbol)
+    WARM_POOL.submit(warm_start, symbol)
+
+# Callables run as listener(symbol, price) after every recorded tick
+TICK_LISTENERS = []
 
 def update_price_history(symbol, price):
-    """Add price to history"""
-    init_price_history(symbol)
-    SIMULATOR_STATE["price_history"][symbol].append(float(price))
-
+    """Add price to history and notify tick listeners"""
+    with span("history_update"):
+        init_price_history(symbol)
+        price = float(price)
+        now = time.time()
+        with INDICATOR_LOCK:
+            SIMULATOR_STATE["price_history"][symbol].append(price)
+            record_history(symbol, now, price)
+            update_indicators(symbol, now, price)
+            closed = record_bars(symbol, now, price)
+        METRICS.inc("ticks_total")
+        for listener in TICK_LISTENERS:
+            listener(symbol, price)
+        for series in closed:
+            for listener in BAR_LISTENERS:
+                listener(symbol, series)
+
+@timed("indicator_seconds", "bollinger", indicator="bollinger")
 def compute_bollinger(symbol, std_dev):
-    """Calculate Bollinger Bands"""
+    """Calculate Bollinger Bands from the symbol's shared rolling window"""
     if symbol not in SIMULATOR_STATE["price_history"]:
         return None, None, None
-    
-    prices = list(SIMULATOR_STATE["price_history"][symbol])
-    window = STRATEGY_PARAMS["bb_window"]
-    
-    if len(prices) < window:
-        return None, None, None
-    
-    recent = prices[-window:]
-    ma = statistics.mean(recent)
-    sd = statistics.pstdev(recent)
-    upper = ma + std_dev * sd
-    lower = ma - std_dev * sd
-    
-    return upper, ma, lower
+    bands, _ = STRATEGY_ENGINE.current.display.bind(symbol)
+    return bands.bands(std_dev)
 
+@timed("indicator_seconds", "atr", indicator="atr")
 def compute_atr(symbol):
-    """Calculate ATR"""
+    """Calculate ATR from the symbol's shared rolling window"""
     if symbol not in SIMULATOR_STATE["price_history"]:
         return None
-    
-    prices = list(SIMULATOR_STATE["price_history"][symbol])
-    period = STRATEGY_PARAMS["atr_period"]
-    
-    if len(prices) < period + 1:
-        return None
-    
-    tr_values = []
-    for i in range(1, period + 1):
-        tr = abs(prices[-i] - prices[-i-1])
-        tr_values.append(tr)
-    
-    return statistics.mean(tr_values)
+    _, atr = STRATEGY_ENGINE.current.display.bind(symbol)
+    return atr.value()
 
+@timed("indicator_seconds", "signal", indicator="signal")
 def check_strategy_signal(symbol, current_price):
-    """Check if strategy signals a buy or sell"""
-    if not STRATEGY_PARAMS["enabled"]:
-        return None
-    
-    if symbol not in SIMULATOR_STATE["price_history"]:
-        return None
-    
-    prices = list(SIMULATOR_STATE["price_history"][symbol])
-    if len(prices) < STRATEGY_PARAMS["bb_window"]:
-        return None
-    
-    # Determine std_dev based on ATR
-    atr = compute_atr(symbol)
-    std_dev = STRATEGY_PARAMS["std_dev_base"]
-    if atr is not None and atr > STRATEGY_PARAMS["std_dev_switch_vol_atr"]:
-        std_dev = STRATEGY_PARAMS["std_dev_alt"]
-    
-    upper, ma, lower = compute_bollinger(symbol, std_dev)
-    
-    if upper is None or ma is None or lower is None:
-        return None
-    
-    # Check for signals
-    signal = None
-    
-    # BUY signal: price below lower band (mean reversion)
-    if current_price < lower:
-        # Confirmation check
-        conf_ticks = STRATEGY_PARAMS["confirmation_ticks"]
-        if conf_ticks > 0 and len(prices) >= conf_ticks + 1:
-            confirmed = all(p < lower for p in prices[-conf_ticks:])
-            if confirmed:
-                signal = {
-                    "action": "BUY",
-                    "reason": "Price below lower Bollinger Band",
-                    "price": current_price,
-                    "lower_band": lower,
-                    "middle_band": ma,
-                    "upper_band": upper,
-                    "atr": atr
-                }
-        elif conf_ticks == 0:
-            signal = {
-                "action": "BUY",
-                "reason": "Price below lower Bollinger Band",
-                "price": current_price,
-                "lower_band": lower,
-                "middle_band": ma,
-                "upper_band": upper,
-                "atr": atr
-            }
-    
-    # SELL signal: price above upper band
-    elif current_price > upper:
-        conf_ticks = STRATEGY_PARAMS["confirmation_ticks"]
-        if conf_ticks > 0 and len(prices) >= conf_ticks + 1:
-            confirmed = all(p > upper for p in prices[-conf_ticks:])
-            if confirmed:
-                signal = {
-                    "action": "SELL",
-                    "reason": "Price above upper Bollinger Band",
-                    "price": current_price,
-                    "lower_band": lower,
-                    "middle_band": ma,
-                    "upper_band": upper,
-                    "atr": atr
-                }
-        elif conf_ticks == 0:
-            signal = {
-                "action": "SELL",
-                "reason": "Price above upper Bollinger Band",
-                "price": current_price,
-                "lower_band": lower,
-                "middle_band": ma,
-                "upper_band": upper,
-                "atr": atr
-            }
-    
-    return signal
+    """Check if any enabled strategy signals a buy or sell"""
+    return STRATEGY_ENGINE.evaluate(symbol, current_price)
 
 def calculate_position_size(entry_price, atr):
     """Calculate position size based on risk parameters"""
-    if STRATEGY_PARAMS["stop_loss_mode"] == "ATR" and atr:
-        stop_dist = atr * STRATEGY_PARAMS["atr_multiplier"]
-    else:
-        stop_dist = entry_price * STRATEGY_PARAMS["stop_loss_pct"]
+    stop_dist = stop_distance(entry_price, atr)
     
     if stop_dist <= 0:
         return 1
@@ -274,77 +3087,290 @@ def calculate_position_size(entry_price, atr):
     
     return qty
 
+# ---------- TICK HISTORY ----------
+class TickSeries:
+    """One symbol's tick times and prices, oldest first, in growable numpy buffers"""
+    __slots__ = ("ts", "px", "n", "total")
+
+    def __init__(self):
+        self.ts = np.empty(1024)
+        self.px = np.empty(1024)
+        self.n = 0
+        self.total = 0  # ticks ever appended, including trimmed ones
+
+    def append(self, t, price):
+        n = self.n
+        if n == len(self.ts):
+            if n >= 2 * TICK_HISTORY_MAX:
+                # Slide the newest TICK_HISTORY_MAX ticks to the front; amortized O(1)
+                keep = TICK_HISTORY_MAX
+                self.ts[:keep] = self.ts[n - keep:n]
+                self.px[:keep] = self.px[n - keep:n]
+                n = keep
+            else:
+                size = min(2 * n, 2 * TICK_HISTORY_MAX)
+                ts, px = np.empty(size), np.empty(size)
+                ts[:n], px[:n] = self.ts[:n], self.px[:n]
+                self.ts, self.px = ts, px
+        self.ts[n] = t
+        self.px[n] = price
+        self.n = n + 1
+        self.total += 1
+
+    def span(self, start, end):
+        """Index range [lo, hi) of the ticks with start <= t <= end"""
+        ts = self.ts[:self.n]
+        return int(np.searchsorted(ts, start, "left")), int(np.searchsorted(ts, end, "right"))
+
+TICK_HISTORY = {}  # symbol -> TickSeries
+
+def record_history(symbol, t, price):
+    """Append a tick to the symbol's series; called with INDICATOR_LOCK held"""
+    series = TICK_HISTORY.get(symbol)
+    if series is None:
+        series = TICK_HISTORY[symbol] = TickSeries()
+    series.append(t, price)
+
+def recent_ticks(symbol, count):
+    """(t, price) of the symbol's last count ticks, oldest first; call with INDICATOR_LOCK held"""
+    series = TICK_HISTORY.get(symbol)
+    if series is None:
+        return ()
+    lo = max(series.n - count, 0)
+    return zip(series.ts[lo:series.n].tolist(), series.px[lo:series.n].tolist())
+
+def lttb(ts, px, points):
+    """Indices picked by Largest-Triangle-Three-Buckets to draw (ts, px) with points points"""
+    n = len(ts)
+    if points >= n or points < 3:
+        return np.arange(n)
+    idx = np.empty(points, dtype=np.int64)
+    idx[0], idx[-1] = 0, n - 1
+    # points - 2 buckets between the fixed first and last points
+    edges = (np.arange(points - 1) * ((n - 2) / (points - 2))).astype(np.int64) + 1
+    a = 0
+    for i in range(points - 2):
+        lo, hi = edges[i], edges[i + 1]
+        nxt_hi = edges[i + 2] if i + 2 < points - 1 else n
+        avg_t = ts[hi:nxt_hi].mean()
+        avg_p = px[hi:nxt_hi].mean()
+        area = np.abs((ts[a] - avg_t) * (px[lo:hi] - px[a]) - (ts[a] - ts[lo:hi]) * (avg_p - px[a]))
+        a = lo + int(area.argmax())
+        idx[i + 1] = a
+    return idx
+
+def _nullable(values):
+    return [None if v != v else v for v in values.tolist()]
+
+def history_response(symbol, start, end, points, std_dev=None):
+    """Downsampled ticks of symbol in [start, end] with Bollinger bands at the kept points"""
+    payload = {"symbol": symbol, "start": start, "end": end, "raw_points": 0,
+               "t": [], "price": [], "upper": [], "middle": [], "lower": []}
+    series = TICK_HISTORY.get(symbol)
+    if series is None:
+        return payload
+    lo, hi = series.span(start, end)
+    payload["raw_points"] = hi - lo
+    if hi <= lo:
+        return payload
+
+    ts, px = series.ts[lo:hi], series.px[lo:hi]
+    keep = lttb(ts, px, points)
+
+    # Bands come from the raw ticks, including the window before start, via
+    # prefix sums evaluated only at the kept points.
+    window = STRATEGY_PARAMS["bb_window"]
+    std_dev = STRATEGY_PARAMS["std_dev_base"] if std_dev is None else std_dev
+    base = max(lo - window + 1, 0)
+    raw = series.px[base:hi]
+    ref = raw[0]
+    c1 = np.concatenate(([0.0], np.cumsum(raw - ref)))
+    c2 = np.concatenate(([0.0], np.cumsum((raw - ref) ** 2)))
+    end_at = keep + (lo - base) + 1           # prefix index just past each kept tick
+    full = end_at >= window
+    start_at = np.where(full, end_at - window, 0)
+    mean = (c1[end_at] - c1[start_at]) / window
+    var = np.maximum((c2[end_at] - c2[start_at]) / window - mean ** 2, 0.0)
+    sd = np.sqrt(var)
+    middle = np.where(full, ref + mean, np.nan)
+
+    payload.update(
+        t=ts[keep].tolist(),
+        price=px[keep].tolist(),
+        upper=_nullable(middle + std_dev * sd),
+        middle=_nullable(middle),
+        lower=_nullable(middle - std_dev * sd)
+    )
+    return payload
+
+def history_request(arg):
+    """Validate /api/history query arguments read through arg(name, default); returns (payload, status)"""
+    stock = (arg("stock", "") or "").strip()
+    if not stock:
+        return {"error": "Stock name required"}, 400
+    if TOKEN_DATA is None:
+        return {"error": "Instrument list is still loading"}, 503
+    symbol, _ = find_symbol_token(TOKEN_DATA, stock)
+    if not symbol:
+        return {"error": f"Stock '{stock}' not found"}, 404
+    try:
+        end = float(arg("end", None) or time.time())
+        start = float(arg("start", None) or end - HISTORY_DEFAULT_SPAN)
+        points = int(arg("points", None) or HISTORY_DEFAULT_POINTS)
+    except ValueError:
+        return {"error": "start, end and points must be numbers"}, 400
+    if start > end:
+        return {"error": "start must not be after end"}, 400
+    points = min(max(points, 3), HISTORY_MAX_POINTS)
+    return history_response(symbol, start, end, points), 200
+
 # ---------- SIMULATOR FUNCTIONS ----------
-def get_current_price(stock_name):
-    """Get current live price for a stock"""
+def get_current_price(stock_name, allow_stale=True, record=False):
+    """Get current live price for a stock, optionally recording it as a tick"""
+    if TOKEN_DATA is None or SMART_OBJ is None:
+        return None, None
     symbol, token = find_symbol_token(TOKEN_DATA, stock_name)
     if not symbol:
         return None, None
-    ltp = fetch_ltp(SMART_OBJ, EXCHANGE_WANTED, symbol, token)
+    if record:
+        ltp, fresh = poll_tick(symbol, token)
+    else:
+        ltp, fresh = peek_quote(symbol, token)
+    if not fresh and not allow_stale:
+        return symbol, None
     return symbol, ltp
 
+def record_transaction(tx):
+    """Append a fill to the hot history, compacting old fills when needed"""
+    global TX_COMPACTED_AT
+    hot = SIMULATOR_STATE["transactions"]
+    hot.append(tx)
+    # The TX_HOT_MIN_KEEP newest fills stay hot however old they are, so the
+    # age trigger is rate limited or it would fire on every later fill.
+    if len(hot) > TX_HOT_MAX_COUNT + TX_COMPACT_BATCH or (hot[0].timestamp < tx.timestamp - TX_HOT_MAX_AGE
+                                                           and tx.timestamp - TX_COMPACTED_AT >= TX_COMPACT_INTERVAL):
+        TX_COMPACTED_AT = tx.timestamp
+        compact_transactions(tx.timestamp)
+
+def compact_transactions(now=None):
+    """Roll old fills into per-symbol, per-day summaries and archive the raw fills"""
+    hot = SIMULATOR_STATE["transactions"]
+    now = time.time() if now is None else now
+    limit = len(hot) - TX_HOT_MIN_KEEP
+    if limit <= 0:
+        return 0
+
+    # Fills are appended in time order, so everything before the first
+    # young fill is past the age cutoff.
+    cutoff = now - TX_HOT_MAX_AGE
+    n = max(len(hot) - TX_HOT_MAX_COUNT, 0)
+    while n < limit and hot[n].timestamp < cutoff:
+        n += 1
+    n = min(n, limit)
+    if n == 0:
+        return 0
+
+    rows = []
+    summaries = SIMULATOR_STATE["tx_summaries"]
+    for tx in hot[:n]:
+        row = tx.to_dict()
+        row["realized_pnl"] = tx.realized_pnl
+        rows.append(row)
+        day = time.strftime("%Y-%m-%d", time.localtime(tx.timestamp))
+        key = (tx.symbol, day)
+        summary = summaries.get(key)
+        if summary is None:
+            summary = summaries[key] = TransactionSummary(tx.symbol, day)
+        summary.add(tx)
+    del hot[:n]
+    # Callers hold TRADE_LOCK; the disk write must not hold up other fills
+    TX_ARCHIVE_WRITER.submit(append_archive, rows)
+    return n
+
+# One thread, so archive appends and the reset's removal stay in order
+TX_ARCHIVE_WRITER = ThreadPoolExecutor(1, thread_name_prefix="tx-archive")
+
+def append_archive(rows):
+    try:
+        with open(TX_ARCHIVE_FILE, "a", encoding="utf-8") as f:
+            f.writelines(json.dumps(row) + "\n" for row in rows)
+    except OSError as e:
+        print(f"⚠️ Could not archive {len(rows)} compacted fills: {e}")
+
+def remove_archive():
+    try:
+        os.remove(TX_ARCHIVE_FILE)
+    except FileNotFoundError:
+        pass
+
 def execute_buy(stock_name, qty, auto_trade=False):
     """Execute a fake buy order"""
-    symbol, price = get_current_price(stock_name)
+    symbol, price = get_current_price(stock_name, allow_stale=False, record=True)
     if not symbol or price is None:
         return {"success": False, "error": f"Stock '{stock_name}' not found or price unavailable"}
-    
-    # Update price history
-    update_price_history(symbol, price)
-    
+    return fill_buy(symbol, price, qty, auto_trade)
+
+def fill_buy(symbol, price, qty, auto_trade=False):
+    """Fill a buy at an already recorded live price"""
+    with TRADE_LOCK, span("execution"):
+        return _fill_buy(symbol, price, qty, auto_trade)
+
+def _fill_buy(symbol, price, qty, auto_trade, execution=None):
     # Check strategy signal if auto_trade
     signal_info = None
     if auto_trade and STRATEGY_PARAMS["auto_trade_enabled"]:
         signal = check_strategy_signal(symbol, price)
-        if signal and signal["action"] == "BUY":
+        if signal and signal.action == "BUY":
             signal_info = signal
             # Recalculate quantity based on risk parameters
-            atr = signal.get("atr")
+            atr = signal.atr
             qty = calculate_position_size(price, atr)
-        elif signal and signal["action"] != "BUY":
+        elif signal and signal.action != "BUY":
             return {"success": False, "error": "Strategy does not signal BUY at current price"}
         elif not signal:
             return {"success": False, "error": "Insufficient data or no clear signal"}
     
-    qty = int(qty)
-    entry_price = price * (1 + STRATEGY_PARAMS["slippage_pct"])
+    requested = int(qty)
+    qty, entry_price = execution or STRATEGY_ENGINE.current.execution.fill(1, requested, price, symbol)
+    if not qty:
+        return {"success": False, "error": "No liquidity for this order"}
     total_cost = entry_price * qty
     
     if SIMULATOR_STATE["balance"] < total_cost:
         return {"success": False, "error": "Insufficient balance"}
+    if execution is None:  # basket legs were checked on its shadow ledger
+        error = RISK.pre_trade(symbol, total_cost)
+        if error:
+            return {"success": False, "error": error}
     
     # Deduct balance
     SIMULATOR_STATE["balance"] -= total_cost
     
     # Update portfolio
-    if symbol in SIMULATOR_STATE["portfolio"]:
-        holding = SIMULATOR_STATE["portfolio"][symbol]
-        old_qty = holding["qty"]
-        old_avg = holding["avg_price"]
-        new_qty = old_qty + qty
-        new_avg = ((old_qty * old_avg) + (qty * entry_price)) / new_qty
-        SIMULATOR_STATE["portfolio"][symbol] = {"qty": new_qty, "avg_price": new_avg}
+    holding = SIMULATOR_STATE["portfolio"].get(symbol)
+    if holding is not None:
+        new_qty = holding.qty + qty
+        holding.avg_price = ((holding.qty * holding.avg_price) + (qty * entry_price)) / new_qty
+        holding.qty = new_qty
     else:
-        SIMULATOR_STATE["portfolio"][symbol] = {"qty": qty, "avg_price": entry_price}
+        SIMULATOR_STATE["portfolio"][symbol] = Holding(symbol, qty, entry_price)
     
     # Record transaction
-    tx = {
-        "type": "BUY",
-        "symbol": symbol,
-        "qty": qty,
-        "price": entry_price,
-        "total": total_cost,
-        "timestamp": time.time()
-    }
-    
-    if signal_info:
-        tx["strategy_signal"] = signal_info
-    
-    SIMULATOR_STATE["transactions"].append(tx)
+    RISK.on_fill(symbol, qty, entry_price)
+    tx = Transaction("BUY", symbol, qty, entry_price, total_cost, time.time(), signal_info)
+    record_transaction(tx)
+    mark_state_changed()
+    METRICS.inc("trades_total", (("side", "buy"),))
+    if qty < requested:
+        METRICS.inc("partial_fills_total", (("side", "buy"),))
+    if signal_info and STRATEGY_PARAMS["protective_orders"]:
+        protect_position(symbol, qty, entry_price, signal_info)
     
     return {
         "success": True,
         "message": f"Bought {qty} shares of {symbol} at ₹{entry_price:.2f}",
+        "filled_qty": qty,
+        "requested_qty": requested,
         "balance": SIMULATOR_STATE["balance"],
         "portfolio": SIMULATOR_STATE["portfolio"],
         "signal": signal_info
@@ -352,102 +3378,732 @@ def execute_buy(stock_name, qty, auto_trade=False):
 
 def execute_sell(stock_name, qty, auto_trade=False):
     """Execute a fake sell order"""
-    symbol, price = get_current_price(stock_name)
+    symbol, price = get_current_price(stock_name, allow_stale=False, record=True)
     if not symbol or price is None:
         return {"success": False, "error": f"Stock '{stock_name}' not found or price unavailable"}
-    
-    # Update price history
-    update_price_history(symbol, price)
-    
+    return fill_sell(symbol, price, qty, auto_trade)
+
+def fill_sell(symbol, price, qty, auto_trade=False):
+    """Fill a sell at an already recorded live price"""
+    with TRADE_LOCK, span("execution"):
+        return _fill_sell(symbol, price, qty, auto_trade)
+
+def _fill_sell(symbol, price, qty, auto_trade, execution=None):
     # Check strategy signal if auto_trade
     signal_info = None
     if auto_trade and STRATEGY_PARAMS["auto_trade_enabled"]:
         signal = check_strategy_signal(symbol, price)
-        if signal and signal["action"] == "SELL":
+        if signal and signal.action == "SELL":
             signal_info = signal
             # Recalculate quantity based on risk parameters
-            atr = signal.get("atr")
+            atr = signal.atr
             qty = calculate_position_size(price, atr)
-        elif signal and signal["action"] != "SELL":
+        elif signal and signal.action != "SELL":
             return {"success": False, "error": "Strategy does not signal SELL at current price"}
         elif not signal:
             return {"success": False, "error": "Insufficient data or no clear signal"}
     
-    qty = int(qty)
+    requested = qty = int(qty)
     
     # Check if user has this stock
     if symbol not in SIMULATOR_STATE["portfolio"]:
         return {"success": False, "error": f"You don't own any shares of {symbol}"}
     
     holding = SIMULATOR_STATE["portfolio"][symbol]
-    if holding["qty"] < qty:
-        return {"success": False, "error": f"Insufficient quantity. You only have {holding['qty']} shares"}
+    if holding.qty < qty:
+        return {"success": False, "error": f"Insufficient quantity. You only have {holding.qty} shares"}
     
     # Calculate proceeds
-    exit_price = price * (1 - STRATEGY_PARAMS["slippage_pct"])
+    qty, exit_price = execution or STRATEGY_ENGINE.current.execution.fill(-1, qty, price, symbol)
+    if not qty:
+        return {"success": False, "error": "No liquidity for this order"}
     total_proceeds = exit_price * qty
     
     # Add to balance
     SIMULATOR_STATE["balance"] += total_proceeds
     
     # Update portfolio
-    holding["qty"] -= qty
-    if holding["qty"] == 0:
+    holding.qty -= qty
+    if holding.qty == 0:
         del SIMULATOR_STATE["portfolio"][symbol]
     
+    RISK.on_fill(symbol, -qty, exit_price)
     # Record transaction
-    tx = {
-        "type": "SELL",
-        "symbol": symbol,
-        "qty": qty,
-        "price": exit_price,
-        "total": total_proceeds,
-        "timestamp": time.time()
-    }
-    
-    if signal_info:
-        tx["strategy_signal"] = signal_info
-    
-    SIMULATOR_STATE["transactions"].append(tx)
+    realized_pnl = (exit_price - holding.avg_price) * qty
+    tx = Transaction("SELL", symbol, qty, exit_price, total_proceeds, time.time(), signal_info, realized_pnl)
+    record_transaction(tx)
+    mark_state_changed()
+    METRICS.inc("trades_total", (("side", "sell"),))
+    if qty < requested:
+        METRICS.inc("partial_fills_total", (("side", "sell"),))
     
     return {
         "success": True,
         "message": f"Sold {qty} shares of {symbol} at ₹{exit_price:.2f}",
+        "filled_qty": qty,
+        "requested_qty": requested,
         "balance": SIMULATOR_STATE["balance"],
         "portfolio": SIMULATOR_STATE["portfolio"],
         "signal": signal_info
     }
 
-# ---------- API ENDPOINTS ----------
-@app.route("/api/ltp")
-def api_ltp():
-    ensure_login()
-    stock = request.args.get("stock", "").strip()
+def fill_basket(legs, quotes):
+    """Fill a basket of (stock, side, qty, symbol, token) legs all-or-nothing.
+
+    quotes maps token -> (ltp, fresh) from one batched fetch. Sells go before
+    buys so their proceeds can fund the buys. The whole basket is checked on
+    a shadow ledger first, with each buy's risk priced on top of the legs
+    before it; if any leg would fail, nothing is filled.
+    """
+    recorded = set()
+    for _, _, _, symbol, token in legs:
+        ltp, fresh = quotes.get(token, (None, False))
+        if symbol and fresh and token not in recorded:
+            update_price_history(symbol, ltp)
+            recorded.add(token)
+
+    order = sorted(range(len(legs)), key=lambda i: legs[i][1] != "SELL")
+    model = STRATEGY_ENGINE.current.execution
+    fills = [None] * len(legs)
+    results = [None] * len(legs)
+    with TRADE_LOCK, span("execution"):
+        balance = SIMULATOR_STATE["balance"]
+        held = {s: h.qty for s, h in SIMULATOR_STATE["portfolio"].items()}
+        pending = {}  # symbol -> position value change of the legs accepted so far
+        ok = True
+        for i in order:
+            stock, side, qty, symbol, token = legs[i]
+            ltp, fresh = quotes.get(token, (None, False))
+            result = results[i] = {"index": i, "stock": stock, "side": side, "qty": qty, "symbol": symbol}
+            if symbol and fresh:
+                filled, price = fills[i] = model.fill(1 if side == "BUY" else -1, qty, ltp, symbol)
+            if not symbol or not fresh:
+                result["error"] = f"Stock '{stock}' not found or price unavailable"
+            elif filled < qty:
+                result["error"] = f"Only {filled} of {qty} shares available"
+            elif side == "BUY":
+                total = price * qty
+                error = "Insufficient balance" if balance < total else RISK.pre_trade(symbol, total, pending)
+                if error:
+                    result["error"] = error
+                else:
+                    balance -= total
+                    held[symbol] = held.get(symbol, 0) + qty
+                    pending[symbol] = pending.get(symbol, 0.0) + total
+            else:
+                total = price * qty
+                if held.get(symbol, 0) < qty:
+                    result["error"] = f"Insufficient quantity. You only have {held.get(symbol, 0)} shares"
+                else:
+                    balance += total
+                    held[symbol] -= qty
+                    pending[symbol] = pending.get(symbol, 0.0) - total
+            if "error" in result:
+                ok = False
+                result["success"] = False
+            else:
+                result.update(success=True, price=price, total=total)
+
+        if not ok:
+            failed = sum(1 for r in results if not r["success"])
+            return {"success": False, "error": f"Basket rejected: {failed} of {len(legs)} legs failed",
+                    "results": results}
+
+        for i in order:
+            stock, side, qty, symbol, token = legs[i]
+            fill = _fill_buy if side == "BUY" else _fill_sell
+            results[i]["message"] = fill(symbol, quotes[token][0], qty, False, fills[i])["message"]
+
+    return {
+        "success": True,
+        "results": results,
+        "balance": SIMULATOR_STATE["balance"],
+        "portfolio": SIMULATOR_STATE["portfolio"]
+    }
+
+# ---------- ORDER BOOK ----------
+# Resting orders wait in per-symbol heaps keyed by trigger price, so a tick
+# touches only the orders it crosses: O(log n) each, one comparison per heap
+# when nothing crosses. Cancelled orders stay in the heaps until they surface
+# or until compaction, once they outnumber the live ones.
+ORDER_TYPES = ("limit", "stop", "take_profit", "trailing_stop")
+
+class RestingOrder:
+    """An order waiting for its trigger price"""
+    __slots__ = ("id", "symbol", "side", "type", "qty", "price", "trail", "oco", "status",
+                 "created", "closed", "trigger_price", "error")
+
+    def __init__(self, id, symbol, side, type, qty, price=None, trail=None):
+        self.id = id
+        self.symbol = sys.intern(symbol)
+        self.side = sys.intern(side)
+        self.type = sys.intern(type)
+        self.qty = qty
+        self.price = price    # trigger level; None for trailing stops
+        self.trail = trail    # trailing distance in rupees
+        self.oco = None       # id of the order cancelled when this one fills
+        self.status = "open"  # open -> triggered -> filled/rejected, or cancelled
+        self.created = time.time()
+        self.closed = None
+        self.trigger_price = None
+        self.error = None
+
+    def falls(self):
+        """True if the order triggers when the price falls to its level, False on a rise"""
+        if self.type in ("stop", "trailing_stop"):
+            return self.side == "SELL"
+        return self.side == "BUY"
+
+    def to_dict(self):
+        return {
+            "id": self.id,
+            "symbol": self.symbol,
+            "side": self.side,
+            "type": self.type,
+            "qty": self.qty,
+            "price": self.price,
+            "trail": self.trail,
+            "oco": self.oco,
+            "status": self.status,
+            "created": self.created,
+            "closed": self.closed,
+            "trigger_price": self.trigger_price,
+            "error": self.error
+        }
+
+class TrailGroup:
+    __slots__ = ("peak", "trails", "version")
+
+    def __init__(self, peak):
+        self.peak = peak
+        self.trails = []  # min-heap of (trail, id, order)
+        self.version = 0
+
+class TrailingBook:
+    """Trailing stops on one side of a symbol.
+
+    Works on x, the price for sells and minus the price for buys, so a stop
+    always triggers once x falls its trail below the peak x seen since it
+    was placed. Orders that have seen the same peak share a group. Groups
+    form a stack whose peaks never rise toward the top, so a new high only
+    merges groups off the top. Each group sits in a max-heap of stop levels
+    (peak - smallest trail) that changes only when the group does.
+    """
+    __slots__ = ("stack", "levels", "seq")
+
+    def __init__(self):
+        self.stack = []
+        self.levels = []  # max-heap as (-level, seq, group, group version); stale versions are skipped
+        self.seq = 0
+
+    def _relevel(self, group):
+        group.version += 1
+        if group.trails:
+            self.seq += 1
+            heapq.heappush(self.levels, (group.trails[0][0] - group.peak, self.seq, group, group.version))
+
+    def _raise(self, x):
+        stack = self.stack
+        if not stack or stack[-1].peak >= x:
+            return
+        merged = stack.pop()
+        while stack and stack[-1].peak <= x:
+            group = stack.pop()
+            if len(group.trails) > len(merged.trails):
+                group, merged = merged, group
+            for entry in group.trails:
+                heapq.heappush(merged.trails, entry)
+            group.version += 1
+        merged.peak = x
+        stack.append(merged)
+        self._relevel(merged)
+
+    def add(self, order, x):
+        self._raise(x)
+        entry = (order.trail, order.id, order)
+        if self.stack and self.stack[-1].peak == x:
+            group = self.stack[-1]
+            heapq.heappush(group.trails, entry)
+            if group.trails[0] is not entry:
+                return
+        else:
+            group = TrailGroup(x)
+            group.trails.append(entry)
+            self.stack.append(group)
+        self._relevel(group)
+
+    def crossed(self, x):
+        """Pop every order whose stop x has reached, open or not"""
+        self._raise(x)
+        out = []
+        levels = self.levels
+        while levels and -levels[0][0] >= x:
+            _, _, group, version = heapq.heappop(levels)
+            if version != group.version:
+                continue
+            while group.trails and group.peak - group.trails[0][0] >= x:
+                out.append(heapq.heappop(group.trails)[2])
+            self._relevel(group)
+            if not group.trails and self.stack and self.stack[-1] is group:
+                self.stack.pop()
+        return out
+
+    def compact(self):
+        for group in self.stack:
+            group.trails = [e for e in group.trails if e[2].status == "open"]
+            heapq.heapify(group.trails)
+        self.stack = [g for g in self.stack if g.trails]
+        self.levels = []
+        for group in self.stack:
+            self._relevel(group)
+
+class SymbolBook:
+    """Resting orders of one symbol"""
+    __slots__ = ("falls", "rises", "trail_sells", "trail_buys", "live", "dead")
+
+    def __init__(self):
+        self.falls = []   # max-heap as (-level, id, order): triggers once price <= level
+        self.rises = []   # min-heap as (level, id, order): triggers once price >= level
+        self.trail_sells = TrailingBook()
+        self.trail_buys = TrailingBook()
+        self.live = 0
+        self.dead = 0     # cancelled orders still sitting in the heaps
+
+    def add(self, order, last_price):
+        if order.type == "trailing_stop":
+            if order.side == "SELL":
+                self.trail_sells.add(order, last_price)
+            else:
+                self.trail_buys.add(order, -last_price)
+        elif order.falls():
+            heapq.heappush(self.falls, (-order.price, order.id, order))
+        else:
+            heapq.heappush(self.rises, (order.price, order.id, order))
+        self.live += 1
+
+    def crossed(self, price):
+        """Pop the open orders price triggers, marking them triggered"""
+        popped = []
+        falls, rises = self.falls, self.rises
+        while falls and -falls[0][0] >= price:
+            popped.append(heapq.heappop(falls)[2])
+        while rises and rises[0][0] <= price:
+            popped.append(heapq.heappop(rises)[2])
+        if self.trail_sells.levels:
+            popped += self.trail_sells.crossed(price)
+        if self.trail_buys.levels:
+            popped += self.trail_buys.crossed(-price)
+        out = []
+        for order in popped:
+            if order.status == "open":
+                order.status = "triggered"
+                order.trigger_price = price
+                self.live -= 1
+                out.append(order)
+            else:
+                self.dead -= 1
+        return out
+
+    def cancelled(self):
+        self.live -= 1
+        self.dead += 1
+        if self.dead > max(self.live, ORDER_COMPACT_MIN):
+            self.falls = [e for e in self.falls if e[2].status == "open"]
+            self.rises = [e for e in self.rises if e[2].status == "open"]
+            heapq.heapify(self.falls)
+            heapq.heapify(self.rises)
+            self.trail_sells.compact()
+            self.trail_buys.compact()
+            self.dead = 0
+
+class OrderBook:
+    """Every resting order, matched against each recorded tick of its symbol"""
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.books = {}    # symbol -> SymbolBook
+        self.open = {}     # id -> RestingOrder still open or triggered
+        self.closed = deque(maxlen=ORDER_CLOSED_KEEP)
+        self._ids = itertools.count(1)
+
+    def place(self, legs, last_price):
+        """Rest legs [(symbol, side, type, qty, price, trail)]; two legs are placed as an OCO pair"""
+        with self._lock:
+            if len(self.open) + len(legs) > ORDER_MAX_OPEN:
+                raise ValueError(f"At most {ORDER_MAX_OPEN} resting orders")
+            orders = [RestingOrder(next(self._ids), *leg) for leg in legs]
+            if len(orders) == 2:
+                orders[0].oco, orders[1].oco = orders[1].id, orders[0].id
+            for order in orders:
+                book = self.books.get(order.symbol)
+                if book is None:
+                    book = self.books[order.symbol] = SymbolBook()
+                book.add(order, last_price)
+                self.open[order.id] = order
+        METRICS.inc("resting_orders_total", (("event", "placed"),), len(orders))
+        return orders
+
+    def cancel(self, order_id):
+        """Cancel an open order; returns it, or None if it is not open"""
+        with self._lock:
+            order = self.open.get(order_id)
+            if order is None or order.status != "open":
+                return None
+            self._cancel(order)
+            return order
+
+    def _cancel(self, order):
+        resting = order.status == "open"
+        order.status = "cancelled"
+        self._close(order)
+        if resting:
+            self.books[order.symbol].cancelled()
+        METRICS.inc("resting_orders_total", (("event", "cancelled"),))
+
+    def _close(self, order):
+        order.closed = time.time()
+        self.open.pop(order.id, None)
+        self.closed.append(order)
+
+    def on_tick(self, symbol, price):
+        """Tick listener: fill every order this price crosses"""
+        book = self.books.get(symbol)
+        if book is None or not book.live:
+            return
+        with self._lock:
+            triggered = book.crossed(price)
+        for order in triggered:
+            self._execute(order, price)
+
+    def _execute(self, order, price):
+        with self._lock:
+            if order.status != "triggered":  # its OCO sibling filled first
+                return
+        fill = fill_buy if order.side == "BUY" else fill_sell
+        result = fill(order.symbol, price, order.qty)
+        with self._lock:
+            if result["success"]:
+                order.status = "filled"
+                sibling = self.open.get(order.oco)
+                if sibling is not None:
+                    self._cancel(sibling)
+            else:
+                order.status = "rejected"
+                order.error = result["error"]
+            self._close(order)
+        METRICS.inc("resting_orders_total", (("event", order.status),))
+        print(f"📌 {order.type} {order.side} #{order.id} {order.symbol} x{order.qty} {order.status} at ₹{price:.2f}")
+
+    def symbols(self):
+        return {symbol for symbol, book in list(self.books.items()) if book.live}
+
+    def listing(self, symbol=None, status="open", limit=ORDER_LIST_MAX):
+        """Newest orders first, open ones or recently closed ones"""
+        with self._lock:
+            pool = list(self.open.values()) if status == "open" else list(self.closed)
+        rows = [o for o in reversed(pool) if not symbol or o.symbol == symbol]
+        return {"count": len(rows), "orders": rows[:limit]}
+
+    def reset(self):
+        with self._lock:
+            self.books.clear()
+            self.open.clear()
+            self.closed.clear()
+
+ORDER_BOOK = OrderBook()
+TICK_LISTENERS.append(ORDER_BOOK.on_tick)
+
+def _order_metrics():
+    return [("resting_orders_open", (), len(ORDER_BOOK.open))]
+
+METRICS.collectors.append(_order_metrics)
+
+def stop_distance(entry_price, atr):
+    """Stop-loss distance from ATR or stop_loss_pct, per stop_loss_mode"""
+    if STRATEGY_PARAMS["stop_loss_mode"] == "ATR" and atr:
+        return atr * STRATEGY_PARAMS["atr_multiplier"]
+    return entry_price * STRATEGY_PARAMS["stop_loss_pct"]
+
+def protect_position(symbol, qty, entry_price, signal):
+    """Rest an OCO stop-loss / take-profit pair behind an auto-traded buy"""
+    stop = entry_price - stop_distance(entry_price, signal.atr)
+    legs = []
+    if stop > 0:
+        legs.append((symbol, "SELL", "stop", qty, stop, None))
+    if signal.middle_band is not None and signal.middle_band > entry_price:
+        legs.append((symbol, "SELL", "take_profit", qty, signal.middle_band, None))
+    return ORDER_BOOK.place(legs, entry_price) if legs else []
+
+def _positive_number(value):
+    return not isinstance(value, bool) and isinstance(value, (int, float)) and value > 0 and math.isfinite(value)
+
+def parse_resting_leg(data, symbol, last_price):
+    """Validate one resting order body into a place() leg, returning (leg, error)"""
+    side = str(data.get("side", "")).upper()
+    if side not in ("BUY", "SELL"):
+        return None, "side must be BUY or SELL"
+    kind = data.get("type")
+    if kind not in ORDER_TYPES:
+        return None, f"type must be one of {', '.join(ORDER_TYPES)}"
+    qty = data.get("qty", 1)
+    if isinstance(qty, bool) or not isinstance(qty, int) or qty <= 0:
+        return None, "qty must be a positive integer"
+    if kind != "trailing_stop":
+        price = data.get("price")
+        if not _positive_number(price):
+            return None, f"A {kind} order needs a positive price"
+        return (symbol, side, kind, qty, float(price), None), None
+    trail, trail_pct = data.get("trail"), data.get("trail_pct")
+    if trail_pct is not None:
+        # A percentage trail is fixed in rupees at the placement price
+        if not _positive_number(trail_pct) or trail_pct >= 1:
+            return None, "trail_pct must be between 0 and 1"
+        trail = trail_pct * last_price
+    if not _positive_number(trail):
+        return None, "A trailing_stop needs a positive trail or trail_pct"
+    return (symbol, side, kind, qty, None, float(trail)), None
+
+def parse_resting_order(data):
+    """Split a resting order body into (stock, leg bodies, error); {"stock", "oco": [leg, leg]} rests an OCO pair"""
+    data = data or {}
+    stock = str(data.get("stock", "")).strip()
     if not stock:
-        return jsonify({"error": "Stock name required"}), 400
-    symbol, token = find_symbol_token(TOKEN_DATA, stock)
-    if not symbol:
-        return jsonify({"error": f"Stock '{stock}' not found"}), 404
-    ltp = fetch_ltp(SMART_OBJ, EXCHANGE_WANTED, symbol, token)
-    if ltp is None:
-        return jsonify({"error": "Failed to fetch price"}), 500
-    
-    # Update price history
-    update_price_history(symbol, ltp)
-    
+        return None, None, "Stock name required"
+    bodies = data.get("oco")
+    if bodies is None:
+        return stock, [data], None
+    if not isinstance(bodies, list) or len(bodies) != 2 or not all(isinstance(b, dict) for b in bodies):
+        return None, None, "oco must be a list of two orders"
+    return stock, bodies, None
+
+def place_resting_order(symbol, bodies, price):
+    """Validate and rest the legs for symbol at its latest price; returns (payload, status)"""
+    history = SIMULATOR_STATE["price_history"].get(symbol)
+    last_price = history[-1] if history else price
+    legs = []
+    for body in bodies:
+        leg, error = parse_resting_leg(body, symbol, last_price)
+        if error:
+            return {"error": error}, 400
+        legs.append(leg)
+    try:
+        orders = ORDER_BOOK.place(legs, last_price)
+    except ValueError as e:
+        return {"error": str(e)}, 400
+    return {"success": True, "orders": orders}, 200
+
+def cancel_resting_order(order_id):
+    order = ORDER_BOOK.cancel(order_id)
+    if order is None:
+        return {"error": f"Order {order_id} is not open"}, 404
+    return {"success": True, "order": order}, 200
+
+# ---------- RISK ENGINE ----------
+class RiskEngine:
+    """Portfolio risk over the held symbols, kept current as ticks and fills arrive.
+
+    Ticks only store the symbol's latest price. Every RISK_SAMPLE_SECONDS the
+    log returns since the previous sample update an exponentially weighted
+    covariance and a ring of return vectors for historical VaR. Fills adjust
+    the position values and C @ v in O(n), so pre_trade() prices the VaR of a
+    buy from cached state in O(1), or a basket's combined legs in O(k^2).
+    """
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.decay = 0.5 ** (1 / RISK_HALFLIFE)
+        self.horizon = math.sqrt(RISK_VAR_HORIZON / RISK_SAMPLE_SECONDS)  # sample -> horizon scale
+        self.z = NormalDist().inv_cdf(RISK_CONFIDENCE)
+        self.reset()
+
+    def reset(self):
+        with self._lock:
+            self.index = {}             # symbol -> column
+            self.symbols = []
+            self.qty = np.zeros(0)
+            self.last = np.zeros(0)     # latest tick per symbol
+            self.prev = np.zeros(0)     # price at the previous sample
+            self.cov = np.zeros((0, 0))
+            self.history = np.zeros((RISK_HISTORY, 0))
+            self.samples = 0
+            self.added = np.zeros(0, dtype=np.int64)  # samples taken before each symbol was tracked
+            self.next_sample = 0.0
+            self.value = np.zeros(0)    # qty * price at the last sample or fill
+            self.cv = np.zeros(0)       # cov @ value
+            self.variance = 0.0         # value @ cov @ value, per sample interval
+            self.exposure = 0.0
+
+    def _add(self, symbol, price):
+        """Track a new symbol, seeding its variance from recent tick volatility"""
+        i = len(self.symbols)
+        self.index[symbol] = i
+        self.symbols.append(symbol)
+        self.qty = np.append(self.qty, 0.0)
+        self.last = np.append(self.last, price)
+        self.prev = np.append(self.prev, price)
+        self.value = np.append(self.value, 0.0)
+        self.cv = np.append(self.cv, 0.0)
+        self.cov = np.pad(self.cov, ((0, 1), (0, 1)))
+        sigma = tick_volatility(symbol)
+        if sigma:
+            self.cov[i, i] = sigma * sigma * RISK_SAMPLE_SECONDS / POLL_INTERVAL
+        self.history = np.pad(self.history, ((0, 0), (0, 1)))
+        self.added = np.append(self.added, self.samples)
+        return i
+
+    def _drop_flat(self):
+        """Stop tracking symbols no longer held"""
+        keep = np.flatnonzero(self.qty != 0)
+        if len(keep) == len(self.symbols):
+            return
+        self.symbols = [self.symbols[i] for i in keep]
+        self.index = {s: i for i, s in enumerate(self.symbols)}
+        for name in ("qty", "last", "prev", "value", "added"):
+            setattr(self, name, getattr(self, name)[keep])
+        self.cov = self.cov[np.ix_(keep, keep)]
+        self.history = self.history[:, keep]
+
+    def _revalue(self):
+        self.value = self.qty * self.last
+        self.cv = self.cov @ self.value
+        self.variance = float(self.value @ self.cv)
+        self.exposure = float(self.value.sum())
+
+    def on_tick(self, symbol, price):
+        """Tick listener"""
+        now = time.time()
+        with self._lock:
+            i = self.index.get(symbol)
+            if i is None:
+                return
+            self.last[i] = price
+            if now >= self.next_sample:
+                self.next_sample = now + RISK_SAMPLE_SECONDS
+                self._sample()
+
+    def _sample(self):
+        if self.samples or self.symbols:
+            r = np.log(self.last / self.prev)
+            self.cov *= self.decay
+            self.cov += (1 - self.decay) * np.outer(r, r)
+            self.history[self.samples % RISK_HISTORY] = r
+            self.samples += 1
+            self.prev = self.last.copy()
+        self._drop_flat()
+        self._revalue()
+
+    def on_fill(self, symbol, qty, price):
+        """Apply a fill of qty shares (negative to sell) at price; called under TRADE_LOCK"""
+        with self._lock:
+            i = self.index.get(symbol)
+            if i is None:
+                i = self._add(symbol, price)
+            self.qty[i] += qty
+            self.last[i] = price
+            delta = qty * price
+            self.variance += 2 * delta * self.cv[i] + delta * delta * self.cov[i, i]
+            self.cv += self.cov[:, i] * delta
+            self.value[i] += delta
+            self.exposure += delta
+
+    def _var(self, variance):
+        return self.z * math.sqrt(max(variance, 0.0)) * self.horizon
+
+    def pre_trade(self, symbol, cost, pending=None):
+        """Error if buying cost more of symbol would breach the risk limits, else None.
+        pending maps symbol -> value change already accepted earlier in the same basket."""
+        changes = dict(pending or ())
+        changes[symbol] = changes.get(symbol, 0.0) + cost
+        with self._lock:
+            equity = SIMULATOR_STATE["balance"] + self.exposure
+            i = self.index.get(symbol)
+            position = changes[symbol] + (self.value[i] if i is not None else 0.0)
+            held = [(self.index[s], d) for s, d in changes.items() if s in self.index]
+            variance = self.variance
+            if held:
+                idx = np.array([j for j, _ in held])
+                d = np.array([d for _, d in held])
+                variance += 2 * float(d @ self.cv[idx]) + float(d @ self.cov[np.ix_(idx, idx)] @ d)
+        if equity <= 0:
+            return None
+        for s, d in changes.items():
+            if s not in self.index:
+                sigma = tick_volatility(s) or 0.0
+                variance += d * d * sigma * sigma * RISK_SAMPLE_SECONDS / POLL_INTERVAL
+        if position > STRATEGY_PARAMS["max_position_pct"] * equity:
+            return (f"Position would be {position / equity:.1%} of equity, "
+                    f"above the {STRATEGY_PARAMS['max_position_pct']:.1%} limit")
+        var = self._var(variance)
+        if var > STRATEGY_PARAMS["max_var_pct"] * equity:
+            return f"Portfolio VaR would be {var / equity:.2%} of equity, above the {STRATEGY_PARAMS['max_var_pct']:.2%} limit"
+        return None
+
+    def report(self):
+        """Exposure, concentration and VaR from the cached state"""
+        with self._lock:
+            symbols, value, cv = list(self.symbols), self.value.copy(), self.cv.copy()
+            variance, samples = self.variance, self.samples
+            # Rows from before a symbol was tracked hold a zero return for it, which
+            # would understate the VaR, so only the window every symbol spans is used
+            window = min(samples - int(self.added.max()), RISK_HISTORY) if len(self.added) else 0
+            returns = self.history[(samples - 1 - np.arange(window)) % RISK_HISTORY]
+        gross = float(np.abs(value).sum())
+        net = float(value.sum())
+        equity = SIMULATOR_STATE["balance"] + net
+        var = self._var(variance)
+        historical = None
+        if len(returns) >= RISK_MIN_SAMPLES:
+            pnl = returns @ value
+            historical = float(-np.quantile(pnl, 1 - RISK_CONFIDENCE)) * self.horizon
+        sd = math.sqrt(variance) if variance > 0 else 0.0
+        weights = value / gross if gross else value
+        positions = [{
+            "symbol": symbol,
+            "value": float(value[i]),
+            "weight": float(weights[i]),
+            "var_contribution": float(self.z * value[i] * cv[i] / sd * self.horizon) if sd else 0.0
+        } for i, symbol in enumerate(symbols)]
+        return {
+            "equity": equity,
+            "gross_exposure": gross,
+            "net_exposure": net,
+            "leverage": gross / equity if equity > 0 else None,
+            "concentration": {
+                "max_weight": float(np.abs(weights).max()) if len(weights) else 0.0,
+                "hhi": float(weights @ weights)
+            },
+            "var": {
+                "confidence": RISK_CONFIDENCE,
+                "horizon_seconds": RISK_VAR_HORIZON,
+                "parametric": var,
+                "historical": historical,
+                "historical_samples": len(returns),
+                "pct_of_equity": var / equity if equity > 0 else None
+            },
+            "samples": samples,
+            "limits": {"max_var_pct": STRATEGY_PARAMS["max_var_pct"],
+                       "max_position_pct": STRATEGY_PARAMS["max_position_pct"]},
+            "positions": positions
+        }
+
+RISK = RiskEngine()
+TICK_LISTENERS.append(RISK.on_tick)
+
+def _risk_metrics():
+    return [("portfolio_var", (), RISK._var(RISK.variance)),
+            ("portfolio_exposure", (), RISK.exposure)]
+
+METRICS.collectors.append(_risk_metrics)
+
+# ---------- RESPONSE BUILDERS ----------
+# Shared by the Flask views below and the asyncio server in async_server.py.
+def ltp_response(symbol, ltp, fresh):
+    """Build the /api/ltp payload for a tick that has already been recorded"""
     # Check for strategy signal
-    signal = None
-    if STRATEGY_PARAMS["enabled"]:
-        signal = check_strategy_signal(symbol, ltp)
+    signal = check_strategy_signal(symbol, ltp)
     
     # Calculate Bollinger Bands for display
     bb_data = None
     if symbol in SIMULATOR_STATE["price_history"]:
-        atr = compute_atr(symbol)
-        std_dev = STRATEGY_PARAMS["std_dev_base"]
-        if atr is not None and atr > STRATEGY_PARAMS["std_dev_switch_vol_atr"]:
-            std_dev = STRATEGY_PARAMS["std_dev_alt"]
-        upper, ma, lower = compute_bollinger(symbol, std_dev)
+        upper, ma, lower, atr = STRATEGY_ENGINE.current.display.bands(symbol)
         if upper is not None:
             bb_data = {
                 "upper": upper,
@@ -456,1378 +4112,560 @@ def api_ltp():
                 "atr": atr
             }
     
-    return jsonify({
+    return {
         "symbol": symbol,
         "ltp": ltp,
         "signal": signal,
-        "bollinger": bb_data
-    })
+        "bollinger": bb_data,
+        "stale": not fresh
+    }
 
-@app.route("/api/buy", methods=["POST"])
-def api_buy():
-    ensure_login()
-    data = request.get_json()
+def parse_order(data):
+    """Validate a buy/sell body, returning (stock, qty, auto_trade, error)"""
+    data = data or {}
     stock = data.get("stock", "").strip()
     qty = data.get("qty", 1)
     auto_trade = data.get("auto_trade", False)
     
     if not stock:
-        return jsonify({"error": "Stock name required"}), 400
+        return None, None, None, "Stock name required"
     
     try:
         qty = int(qty)
         if qty <= 0:
-            return jsonify({"error": "Quantity must be positive"}), 400
+            return None, None, None, "Quantity must be positive"
     except:
-        return jsonify({"error": "Invalid quantity"}), 400
+        return None, None, None, "Invalid quantity"
     
-    result = execute_buy(stock, qty, auto_trade)
-    
-    if result["success"]:
-        return jsonify(result), 200
+    return stock, qty, auto_trade, None
+
+def holding_row(holding, current_price):
+    """One /api/status portfolio row, valued at cost when there is no live price"""
+    qty = holding.qty
+    avg_price = holding.avg_price
+    invested = qty * avg_price
+    if current_price:
+        current_value = qty * current_price
+        pnl = current_value - invested
+        pnl_pct = (pnl / invested) * 100 if invested > 0 else 0
     else:
-        return jsonify(result), 400
+        current_price, current_value, pnl, pnl_pct = avg_price, invested, 0, 0
+    return {
+        "qty": qty,
+        "avg_price": avg_price,
+        "current_price": current_price,
+        "invested": invested,
+        "current_value": current_value,
+        "pnl": pnl,
+        "pnl_pct": pnl_pct
+    }
 
-@app.route("/api/sell", methods=["POST"])
-def api_sell():
-    ensure_login()
-    data = request.get_json()
-    stock = data.get("stock", "").strip()
-    qty = data.get("qty", 1)
-    auto_trade = data.get("auto_trade", False)
-    
+class StatusJournal:
+    """Versioned view of the /api/status payload.
+
+    Each poll folds the latest prices and simulator state in, recomputing
+    only the rows whose holding or price moved, and stamps every changed row,
+    removal, fill and total with a new version. A client that sends back the
+    version it last saw gets only what was stamped after it.
+    """
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.version = 0
+        self.floor = 0           # deltas are complete for any since >= floor
+        self.state_version = None
+        self.params_version = None
+        self.prices = {}
+        self.rows = {}           # symbol -> (version, row), least recently changed first
+        self.removed = {}        # symbol -> version it left the portfolio
+        self.fills = deque(maxlen=TX_HOT_MIN_KEEP)  # (version, Transaction), newest last
+        self.last_fill = None
+        self.totals = {}
+        self.totals_at = 0
+        self.params_at = 0
+
+    def reset(self):
+        """Forget everything; clients older than this get a full snapshot"""
+        with self.lock:
+            self.version += 1
+            self.floor = self.version
+            self.state_version = None
+            self.prices = {}
+            self.rows = {}
+            self.removed = {}
+            self.fills.clear()
+            self.last_fill = None
+            self.totals = {}
+
+    def sync(self, prices):
+        """Fold in the current state and prices; returns the status version"""
+        with self.lock:
+            state_changed = self.state_version != STATE_VERSION
+            params_changed = self.params_version != PARAMS_VERSION
+            if not state_changed and not params_changed and prices == self.prices:
+                return self.version
+
+            version = self.version + 1
+            changed = False
+            portfolio = SIMULATOR_STATE["portfolio"]
+            if state_changed:
+                moved = list(portfolio)
+            else:
+                moved = [s for s, price in prices.items() if self.prices.get(s) != price]
+            for symbol in moved:
+                holding = portfolio.get(symbol)
+                if holding is None:
+                    continue
+                row = holding_row(holding, prices.get(symbol))
+                entry = self.rows.get(symbol)
+                if entry is not None and entry[1] == row:
+                    continue
+                # Re-inserting keeps rows ordered by version for delta()
+                self.rows.pop(symbol, None)
+                self.rows[symbol] = (version, row)
+                self.removed.pop(symbol, None)
+                changed = True
+
+            if state_changed:
+                for symbol in [s for s in self.rows if s not in portfolio]:
+                    del self.rows[symbol]
+                    self.removed[symbol] = version
+                    changed = True
+                new = []
+                truncated = False
+                for tx in reversed(SIMULATOR_STATE["transactions"]):
+                    if tx is self.last_fill:
+                        break
+                    if len(new) == self.fills.maxlen:
+                        truncated = True
+                        break
+                    new.append(tx)
+                if new:
+                    # Fills pushed out of the deque are gone from every later
+                    # delta, so clients that had not seen them need a snapshot
+                    overflow = len(self.fills) + len(new) - self.fills.maxlen
+                    if truncated or overflow > len(self.fills):
+                        self.floor = version
+                    elif overflow > 0:
+                        self.floor = max(self.floor, self.fills[overflow - 1][0])
+                    self.last_fill = new[0]
+                    self.fills.extend((version, tx) for tx in reversed(new))
+                    changed = True
+
+            balance = SIMULATOR_STATE["balance"]
+            if changed or balance != self.totals.get("balance"):
+                total_invested = sum(row["invested"] for _, row in self.rows.values())
+                total_current_value = sum(row["current_value"] for _, row in self.rows.values())
+                overall_pnl = total_current_value - total_invested
+                totals = {
+                    "balance": balance,
+                    "total_invested": total_invested,
+                    "total_current_value": total_current_value,
+                    "overall_pnl": overall_pnl,
+                    "overall_pnl_pct": (overall_pnl / total_invested) * 100 if total_invested > 0 else 0
+                }
+                if totals != self.totals:
+                    self.totals = totals
+                    self.totals_at = version
+                    changed = True
+            if params_changed:
+                self.params_at = version
+                changed = True
+
+            self.state_version = STATE_VERSION
+            self.params_version = PARAMS_VERSION
+            self.prices = dict(prices)
+            if changed:
+                self.version = version
+                if self.removed:
+                    self.floor = max(self.floor, version - STATUS_DELTA_HISTORY)
+                    self.removed = {s: v for s, v in self.removed.items() if v >= self.floor}
+            return self.version
+
+    def snapshot(self):
+        with self.lock:
+            rows = self.rows
+            payload = {
+                "version": self.version,
+                "delta": False,
+                "portfolio": {s: rows[s][1] for s in SIMULATOR_STATE["portfolio"] if s in rows},
+                "transactions": [tx for _, tx in self.fills],
+                "strategy_params": params_payload()
+            }
+            payload.update(self.totals)
+            return payload
+
+    def delta(self, since):
+        """Changes stamped after since, or None when they are no longer known"""
+        with self.lock:
+            if since < self.floor or since > self.version:
+                return None
+            portfolio = {}
+            for symbol, (version, row) in reversed(self.rows.items()):
+                if version <= since:
+                    break
+                portfolio[symbol] = row
+            transactions = []
+            for version, tx in reversed(self.fills):
+                if version <= since:
+                    break
+                transactions.append(tx)
+            payload = {
+                "version": self.version,
+                "delta": True,
+                "since": since,
+                "portfolio": portfolio,
+                "removed": [s for s, version in self.removed.items() if version > since],
+                "transactions": transactions[::-1]
+            }
+            if self.totals_at > since:
+                payload.update(self.totals)
+            if self.params_at > since:
+                payload["strategy_params"] = params_payload()
+            return payload
+
+STATUS_JOURNAL = StatusJournal()
+
+def parse_basket(data):
+    """Validate a basket body, returning (legs, error); legs are (stock, side, qty)"""
+    legs = (data or {}).get("legs")
+    if not isinstance(legs, list) or not legs:
+        return None, "At least one leg required"
+    if len(legs) > BASKET_MAX_LEGS:
+        return None, f"At most {BASKET_MAX_LEGS} legs per basket"
+    parsed = []
+    for i, leg in enumerate(legs):
+        if not isinstance(leg, dict):
+            return None, f"Leg {i}: must be an object"
+        side = str(leg.get("side", "")).upper()
+        if side not in ("BUY", "SELL"):
+            return None, f"Leg {i}: side must be BUY or SELL"
+        stock, qty, _, error = parse_order(leg)
+        if error:
+            return None, f"Leg {i}: {error}"
+        parsed.append((stock, side, qty))
+    return parsed, None
+
+def resolve_basket(legs):
+    """Attach (symbol, token) to each parsed leg; unknown stocks get (None, None)"""
+    return [(stock, side, qty) + find_symbol_token(TOKEN_DATA, stock) for stock, side, qty in legs]
+
+def status_response(prices):
+    """Build the full /api/status payload; prices maps symbol -> live price or None"""
+    STATUS_JOURNAL.sync(prices)
+    return STATUS_JOURNAL.snapshot()
+
+def status_delta(prices, since):
+    """Build the /api/status?since= payload, falling back to a full snapshot"""
+    STATUS_JOURNAL.sync(prices)
+    return STATUS_JOURNAL.delta(since) or STATUS_JOURNAL.snapshot()
+
+def status_version(prices):
+    """Monotonic version of everything the /api/status payload depends on"""
+    return STATUS_JOURNAL.sync(prices)
+
+def params_payload():
+    return {**STRATEGY_PARAMS, "version": PARAMS_VERSION}
+
+def update_strategy_params(data):
+    """Validate and apply a params update; returns (payload, status).
+
+    A body carrying "version" is rejected with 409 unless it matches the
+    current PARAMS_VERSION. Accepted params are visible at once; the
+    strategies switch over once their indicators are rebuilt.
+    """
+    data = data or {}
+    if not isinstance(data, dict):
+        return {"success": False, "error": "Params must be an object"}, 400
+    with PARAMS_LOCK:
+        version = data.get("version")
+        if version is not None and version != PARAMS_VERSION:
+            return {"success": False, "error": f"Params changed since version {version}",
+                    "version": PARAMS_VERSION}, 409
+        params = dict(STRATEGY_PARAMS)
+        for key, value in data.items():
+            if key in params:
+                params[key] = value
+        try:
+            strategies = StrategySet(params, PARAMS_VERSION + 1)
+        except ValueError as e:
+            return {"success": False, "error": str(e)}, 400
+        STRATEGY_PARAMS.update(params)
+        mark_params_changed()
+        REBUILDER.submit(strategies)
+        return {"success": True, "params": STRATEGY_PARAMS, "version": PARAMS_VERSION}, 200
+
+def reset_simulator():
+    """Reset the simulator to initial state"""
+    # Under TRADE_LOCK so no fill or compaction straddles the reset
+    with TRADE_LOCK:
+        SIMULATOR_STATE["balance"] = 10000000.00
+        SIMULATOR_STATE["portfolio"] = {}
+        SIMULATOR_STATE["transactions"] = []
+        SIMULATOR_STATE["tx_summaries"] = {}
+        TX_ARCHIVE_WRITER.submit(remove_archive)
+        with INDICATOR_LOCK:
+            SIMULATOR_STATE["price_history"] = {}
+            INDICATORS.clear()
+            TICK_HISTORY.clear()
+            BARS.clear()
+            BAR_INDICATORS.clear()
+            WARMING.clear()
+        SCHEDULER.last_ticks.clear()
+        STRATEGY_ENGINE.load(StrategySet(dict(STRATEGY_PARAMS), PARAMS_VERSION))
+        mark_state_changed()
+        STATUS_JOURNAL.reset()
+        ORDER_BOOK.reset()
+        RISK.reset()
+    return {"message": "Simulator reset successfully", "balance": 10000000.00}
+
+def health_response():
+    ready = ensure_login()
+    return {"ready": ready, **BROKER_STATUS, "broker": BROKER.stats(),
+            "quote_flights": QUOTE_FLIGHTS.stats()}
+
+# ---------- API ENDPOINTS ----------
+@app.before_request
+def _start_request():
+    route = request.url_rule.rule if request.url_rule else "unmatched"
+    request.environ["sim.trace"] = begin_request(request.method, route)
+
+@app.after_request
+def _record_request(response):
+    request.environ["sim.status"] = response.status_code
+    return response
+
+@app.teardown_request
+def _finish_request(exc):
+    token = request.environ.pop("sim.trace", None)
+    if token is not None:
+        end_request(token, request.environ.get("sim.status", 500))
+
+@app.route("/metrics")
+def metrics():
+    """Prometheus scrape endpoint"""
+    return Response(metrics_text(), mimetype="text/plain; version=0.0.4")
+
+@app.route("/api/admin/profiler", methods=["GET", "POST"])
+def api_admin_profiler():
+    """Start/stop the sampling profiler, or download its folded stacks"""
+    denied = admin_error(request.headers.get("X-Admin-Token"))
+    if denied:
+        return jsonify(denied[0]), denied[1]
+    if request.method == "POST":
+        payload, status = profiler_control(request.get_json(silent=True))
+        return jsonify(payload), status
+    if request.args.get("format") == "status":
+        return jsonify(PROFILER.status())
+    return Response(PROFILER.folded(), mimetype="text/plain",
+                    headers={"Content-Disposition": "attachment; filename=profile.folded"})
+
+@app.route("/api/admin/traces")
+def api_admin_traces():
+    """Return the most recent slow request traces"""
+    denied = admin_error(request.headers.get("X-Admin-Token"))
+    if denied:
+        return jsonify(denied[0]), denied[1]
+    return jsonify({"threshold_ms": SLOW_REQUEST_SECONDS * 1000, "traces": list(SLOW_TRACES)})
+
+@app.route("/api/ltp")
+def api_ltp():
+    if not ensure_login():
+        return not_ready_response()
+    stock = request.args.get("stock", "").strip()
     if not stock:
         return jsonify({"error": "Stock name required"}), 400
+    symbol, token = find_symbol_token(TOKEN_DATA, stock)
+    if not symbol:
+        return jsonify({"error": f"Stock '{stock}' not found"}), 404
+    SCHEDULER.watch(symbol, token, "chart")
+    ltp, fresh = poll_tick(symbol, token)
+    if ltp is None:
+        return jsonify({"error": "Failed to fetch price", "broker": BROKER.breaker_state()}), 503
+    return jsonify(ltp_response(symbol, ltp, fresh))
+
+@app.route("/api/buy", methods=["POST"])
+def api_buy():
+    if not ensure_login():
+        return not_ready_response()
+    stock, qty, auto_trade, error = parse_order(request.get_json())
+    if error:
+        return jsonify({"error": error}), 400
     
-    try:
-        qty = int(qty)
-        if qty <= 0:
-            return jsonify({"error": "Quantity must be positive"}), 400
-    except:
-        return jsonify({"error": "Invalid quantity"}), 400
+    result = execute_buy(stock, qty, auto_trade)
+    return jsonify(result), 200 if result["success"] else 400
+
+@app.route("/api/sell", methods=["POST"])
+def api_sell():
+    if not ensure_login():
+        return not_ready_response()
+    stock, qty, auto_trade, error = parse_order(request.get_json())
+    if error:
+        return jsonify({"error": error}), 400
     
     result = execute_sell(stock, qty, auto_trade)
-    
-    if result["success"]:
-        return jsonify(result), 200
+    return jsonify(result), 200 if result["success"] else 400
+
+@app.route("/api/orders", methods=["POST"])
+def api_orders():
+    """Fill a basket of buy/sell legs all-or-nothing, priced with one batched quote fetch"""
+    if not ensure_login():
+        return not_ready_response()
+    legs, error = parse_basket(request.get_json())
+    if error:
+        return jsonify({"error": error}), 400
+    legs = resolve_basket(legs)
+    quotes = BROKER.ltp_batch(EXCHANGE_WANTED, [token for *_, token in legs if token])
+    result = fill_basket(legs, quotes)
+    return jsonify(result), 200 if result["success"] else 400
+
+@app.route("/api/orders/resting", methods=["GET", "POST"])
+def api_resting_orders():
+    """List resting orders (?status=closed for recent fills/cancels) or place one or an OCO pair"""
+    if request.method == "GET":
+        symbol = request.args.get("symbol", "").strip().upper()
+        return jsonify(ORDER_BOOK.listing(symbol, request.args.get("status", "open")))
+    if not ensure_login():
+        return not_ready_response()
+    stock, bodies, error = parse_resting_order(request.get_json(silent=True))
+    if error:
+        return jsonify({"error": error}), 400
+    symbol, price = get_current_price(stock, record=True)
+    if not symbol:
+        return jsonify({"error": f"Stock '{stock}' not found"}), 404
+    if price is None:
+        return jsonify({"error": "Failed to fetch price", "broker": BROKER.breaker_state()}), 503
+    payload, status = place_resting_order(symbol, bodies, price)
+    return jsonify(payload), status
+
+@app.route("/api/orders/resting/<int:order_id>", methods=["DELETE"])
+def api_cancel_resting_order(order_id):
+    payload, status = cancel_resting_order(order_id)
+    return jsonify(payload), status
+
+@app.route("/api/risk")
+def api_risk():
+    """Exposure, concentration and parametric/historical VaR of the portfolio"""
+    return jsonify(RISK.report())
+
+@app.route("/api/scanner", methods=["GET", "POST"])
+def api_scanner():
+    """Rank the universe by distance beyond its Bollinger bands, or turn the scanner on/off"""
+    if request.method == "POST":
+        payload, status = set_scanner(request.get_json(silent=True))
+    else:
+        payload, status = scanner_request(request.args.get)
+    return jsonify(payload), status
+
+@app.route("/api/watchlists")
+def api_watchlists():
+    """Every watchlist with its symbols and live subscriber count"""
+    return jsonify(WATCHLISTS.snapshot())
+
+@app.route("/api/watchlists/<name>", methods=["PUT", "DELETE"])
+def api_watchlist(name):
+    if request.method == "DELETE":
+        payload, status = delete_watchlist(name)
     else:
-        return jsonify(result), 400
+        payload, status = put_watchlist(name, request.get_json(silent=True))
+    return jsonify(payload), status
+
+@app.route("/api/watchlists/<name>/subscriptions", methods=["POST"])
+def api_watchlist_subscribe(name):
+    """Lease a subscription; read the list's quotes within lease_seconds to keep it"""
+    payload, status = subscribe_watchlist(name)
+    return jsonify(payload), status
+
+@app.route("/api/watchlists/<name>/subscriptions/<sub_id>", methods=["DELETE"])
+def api_watchlist_unsubscribe(name, sub_id):
+    payload, status = unsubscribe_watchlist(name, sub_id)
+    return jsonify(payload), status
+
+@app.route("/api/watchlists/<name>/quotes")
+def api_watchlist_quotes(name):
+    payload, status = watchlist_quotes(name, request.args.get("subscription"))
+    return jsonify(payload), status
+
+@app.route("/api/health")
+def api_health():
+    """Report readiness of the broker session and instrument list"""
+    health = health_response()
+    return jsonify(health), 200 if health["ready"] else 503
 
 @app.route("/api/status")
 def api_status():
-    """Return current simulator status with live P&L"""
-    portfolio_with_pnl = {}
-    total_invested = 0
-    total_current_value = 0
-    
-    for symbol, info in SIMULATOR_STATE["portfolio"].items():
-        qty = info["qty"]
-        avg_price = info["avg_price"]
-        invested = qty * avg_price
-        
-        _, current_price = get_current_price(symbol)
-        if current_price:
-            current_value = qty * current_price
-            pnl = current_value - invested
-            pnl_pct = (pnl / invested) * 100 if invested > 0 else 0
-            
-            portfolio_with_pnl[symbol] = {
-                "qty": qty,
-                "avg_price": avg_price,
-                "current_price": current_price,
-                "invested": invested,
-                "current_value": current_value,
-                "pnl": pnl,
-                "pnl_pct": pnl_pct
-            }
-            
-            total_invested += invested
-            total_current_value += current_value
-        else:
-            portfolio_with_pnl[symbol] = {
-                "qty": qty,
-                "avg_price": avg_price,
-                "current_price": avg_price,
-                "invested": invested,
-                "current_value": invested,
-                "pnl": 0,
-                "pnl_pct": 0
-            }
-            total_invested += invested
-            total_current_value += invested
-    
-    overall_pnl = total_current_value - total_invested
-    overall_pnl_pct = (overall_pnl / total_invested) * 100 if total_invested > 0 else 0
-    
-    return jsonify({
-        "balance": SIMULATOR_STATE["balance"],
-        "portfolio": portfolio_with_pnl,
-        "transactions": SIMULATOR_STATE["transactions"][-50:],
-        "total_invested": total_invested,
-        "total_current_value": total_current_value,
-        "overall_pnl": overall_pnl,
-        "overall_pnl_pct": overall_pnl_pct,
-        "strategy_params": STRATEGY_PARAMS
-    })
+    """Return current simulator status with live P&L, or only what changed with ?since=<version>"""
+    since = request.args.get("since", type=int)
+    prices = {}
+    for symbol in list(SIMULATOR_STATE["portfolio"]):
+        _, prices[symbol] = get_current_price(symbol)
+    if since is not None:
+        return jsonify(status_delta(prices, since))
+    return versioned_response("status", status_version(prices), lambda: status_response(prices))
 
 @app.route("/api/strategy/params", methods=["GET", "POST"])
 def api_strategy_params():
     """Get or update strategy parameters"""
     if request.method == "GET":
-        return jsonify(STRATEGY_PARAMS)
-    
-    data = request.get_json()
-    for key, value in data.items():
-        if key in STRATEGY_PARAMS:
-            STRATEGY_PARAMS[key] = value
-    
-    return jsonify({"success": True, "params": STRATEGY_PARAMS})
+        return versioned_response("params", PARAMS_VERSION, params_payload)
+    payload, status = update_strategy_params(request.get_json())
+    return jsonify(payload), status
+
+@app.route("/api/strategies")
+def api_strategies():
+    """List the strategy plugins with their compiled params and evaluation cost"""
+    return jsonify(STRATEGY_ENGINE.report())
+
+@app.route("/api/history")
+def api_history():
+    """Return a symbol's tick history for a time range, downsampled with bands"""
+    payload, status = history_request(request.args.get)
+    return jsonify(payload), status
+
+@app.route("/api/indicators")
+def api_indicators():
+    """Return current values of a symbol's indicators, registering any not yet tracked"""
+    payload, status = indicators_request(request.args.get)
+    return jsonify(payload), status
+
+@app.route("/api/bars")
+def api_bars():
+    """Return a symbol's recent OHLCV bars for one timeframe, columnar"""
+    payload, status = bars_request(request.args.get)
+    return jsonify(payload), status
+
+@app.route("/api/quotes/schedule")
+def api_quote_schedule():
+    """Report the quote scheduler's classes, intervals and per-symbol lag"""
+    return jsonify(SCHEDULER.report())
+
+@app.route("/api/transactions/summary")
+def api_transactions_summary():
+    """Return rolled-up summaries of compacted fills"""
+    symbol = request.args.get("symbol", "").strip().upper()
+    summaries = [s for s in SIMULATOR_STATE["tx_summaries"].values() if not symbol or s.symbol == symbol]
+    return jsonify({
+        "summaries": summaries,
+        "hot_count": len(SIMULATOR_STATE["transactions"])
+    })
 
 @app.route("/api/reset", methods=["POST"])
 def api_reset():
     """Reset the simulator to initial state"""
-    SIMULATOR_STATE["balance"] = 10000000.00
-    SIMULATOR_STATE["portfolio"] = {}
-    SIMULATOR_STATE["transactions"] = []
-    SIMULATOR_STATE["price_history"] = {}
-    return jsonify({"message": "Simulator reset successfully", "balance": 10000000.00})
+    return jsonify(reset_simulator())
 
 # ---------- Frontend ----------
-HTML_PAGE = """
-<!DOCTYPE html>
-<html>
-<head>
-  <meta charset="utf-8" />
-  <title>Live Stock Price & Trading Simulator with Bollinger Strategy</title>
-  <script src="https://cdn.jsdelivr.net/npm/chart.js@4.4.0/dist/chart.umd.min.js"></script>
-  <meta name="viewport" content="width=device-width,initial-scale=1" />
-
-  <link rel="icon" type="image/png" href="./static/Favicon.png">
-  <style>
-    :root{
-  --bg: #f5f7fa;
-  --card: #ffffff;
-  --accent: #06b6d4;
-  --muted: #4b5563;
-  --success: #16a34a;
-  --danger: #ef4444;
-  --glass: rgba(0, 0, 0, 0.03);
-  --card-radius: 14px;
-}
-
-html, body {
-  height: 100%;
-  margin: 0;
-  font-family: Inter, system-ui, -apple-system, "Segoe UI", Roboto, "Helvetica Neue", Arial;
-}
-
-body {
-  background: linear-gradient(180deg, #e2e8f0 0%, #edf2f7 100%);
-  color: #1f2937;
-  -webkit-font-smoothing: antialiased;
-  -moz-osx-font-smoothing: grayscale;
-  padding: 18px;
-  box-sizing: border-box;
-  display: flex;
-  justify-content: center;
-}
-
-.container {
-  width: 100%;
-  max-width: 1100px;
-  margin: 18px;
-}
-
-header {
-  text-align: center;
-  margin-bottom: 14px;
-}
-
-header h1 {
-  margin: 0;
-  font-size: 22px;
-  display: inline-flex;
-  align-items: center;
-  gap: 8px;
-  background: linear-gradient(90deg, #c7f9ff, #7de3f4);
-  -webkit-background-clip: text;
-  background-clip: text;
-  color: black;
-}
-
-header p {
-  margin: 6px 0 0;
-  color: var(--muted);
-  font-size: 13px;
-}
-
-.card {
-  background: var(--card);
-  border-radius: var(--card-radius);
-  padding: 14px;
-  box-shadow: 0 4px 18px rgba(2, 6, 23, 0.1);
-  margin-bottom: 14px;
-}
-
-.controls {
-  display: flex;
-  gap: 8px;
-  flex-wrap: wrap;
-  align-items: center;
-  justify-content: center;
-}
-
-.controls input[type="text"] {
-  min-width: 220px;
-  padding: 10px 12px;
-  border-radius: 10px;
-  border: 1px solid rgba(0, 0, 0, 0.1);
-  background: var(--glass);
-  color: inherit;
-  font-size: 15px;
-}
-
-.controls button {
-  padding: 10px 14px;
-  border-radius: 10px;
-  border: 0;
-  background: linear-gradient(90deg, var(--accent), #3dd3c9);
-  color: #042029;
-  font-weight: 600;
-  cursor: pointer;
-  font-size: 14px;
-}
-
-.controls .small {
-  padding: 8px 10px;
-  font-size: 13px;
-  background: transparent;
-  border: 1px solid rgba(0, 0, 0, 0.1);
-  color: var(--muted);
-}
-
-.layout {
-  display: grid;
-  grid-template-columns: 1fr 360px;
-  gap: 12px;
-}
-
-@media (max-width: 920px) {
-  .layout {
-    grid-template-columns: 1fr;
-  }
-}
-
-.chart-wrap {
-  padding: 8px;
-}
-
-#priceBox {
-  display: flex;
-  align-items: center;
-  justify-content: space-between;
-  gap: 12px;
-  margin-bottom: 8px;
-  flex-wrap: wrap;
-}
-
-.price-current {
-  font-size: 20px;
-  font-weight: 700;
-}
-
-.price-change {
-  font-size: 13px;
-  padding: 6px 8px;
-  border-radius: 8px;
-  background: rgba(0, 0, 0, 0.03);
-  color: var(--muted);
-}
-
-.trade-card {
-  display: flex;
-  flex-direction: column;
-  gap: 10px;
-}
-
-.trade-row {
-  display: flex;
-  gap: 8px;
-  align-items: center;
-}
-
-.trade-row input[type="number"] {
-  width: 100%;
-  padding: 8px 10px;
-  border-radius: 8px;
-  border: 1px solid rgba(0, 0, 0, 0.1);
-  background: var(--glass);
-  color: inherit;
-}
-
-.trade-actions {
-  display: flex;
-  gap: 8px;
-}
-
-.buy-btn {
-  background: linear-gradient(180deg, #10b981, #059669);
-  color: white;
-  border: 0;
-  padding: 10px 12px;
-  border-radius: 10px;
-  cursor: pointer;
-  font-weight: 600;
-  flex: 1;
-}
-
-.sell-btn {
-  background: linear-gradient(180deg, #ef4444, #dc2626);
-  color: white;
-  border: 0;
-  padding: 10px 12px;
-  border-radius: 10px;
-  cursor: pointer;
-  font-weight: 600;
-  flex: 1;
-}
-
-.info-row {
-  display: flex;
-  justify-content: space-between;
-  gap: 8px;
-  font-size: 14px;
-  color: var(--muted);
-  margin-top: 6px;
-}
-
-.grid-2 {
-  display: grid;
-  grid-template-columns: 1fr 1fr;
-  gap: 12px;
-  margin-top: 12px;
-}
-
-@media (max-width: 640px) {
-  .grid-2 {
-    grid-template-columns: 1fr;
-  }
-}
-
-table {
-  width: 100%;
-  border-collapse: collapse;
-  font-size: 13px;
-}
-
-th,
-td {
-  padding: 8px;
-  text-align: left;
-  border-bottom: 1px dashed rgba(0, 0, 0, 0.1);
-}
-
-th {
-  font-weight: 600;
-  color: var(--muted);
-  font-size: 12px;
-}
-
-.muted {
-  color: var(--muted);
-  font-size: 13px;
-}
-
-.pos {
-  color: var(--success);
-  font-weight: 700;
-}
-
-.neg {
-  color: var(--danger);
-  font-weight: 700;
-}
-
-.small-muted {
-  color: var(--muted);
-  font-size: 12px;
-}
-
-.balance {
-  display: flex;
-  gap: 12px;
-  align-items: center;
-  justify-content: space-between;
-  padding: 8px;
-  border-radius: 10px;
-  background: linear-gradient(180deg, rgba(0, 0, 0, 0.02), transparent);
-}
-
-.tx-list {
-  max-height: 220px;
-  overflow: auto;
-  padding-right: 6px;
-}
-
-.pnl-item {
-  background: rgba(0, 0, 0, 0.015);
-  border-radius: 8px;
-  padding: 8px 10px;
-  margin-bottom: 6px;
-  border-left: 3px solid transparent;
-}
-
-.pnl-item.profit {
-  border-left-color: var(--success);
-}
-
-.pnl-item.loss {
-  border-left-color: var(--danger);
-}
-
-.pnl-item-header {
-  display: flex;
-  justify-content: space-between;
-  align-items: center;
-  margin-bottom: 4px;
-}
-
-.pnl-item-symbol {
-  font-weight: 700;
-  font-size: 14px;
-}
-
-.pnl-item-value {
-  font-weight: 700;
-  font-size: 14px;
-}
-
-.pnl-item-details {
-  display: flex;
-  justify-content: space-between;
-  font-size: 12px;
-  color: var(--muted);
-  margin-top: 4px;
-}
-
-.param-grid {
-  display: grid;
-  grid-template-columns: repeat(auto-fit, minmax(200px, 1fr));
-  gap: 10px;
-  margin-top: 10px;
-}
-
-.param-item label {
-  display: block;
-  font-size: 12px;
-  color: var(--muted);
-  margin-bottom: 4px;
-}
-
-.param-item input,
-.param-item select {
-  width: 100%;
-  padding: 8px;
-  border-radius: 8px;
-  border: 1px solid rgba(0, 0, 0, 0.1);
-  background: var(--glass);
-  color: inherit;
-  font-size: 14px;
-}
-
-.param-item input[type="checkbox"] {
-  width: auto;
-  margin-right: 6px;
-}
-
-.toggle-section {
-  cursor: pointer;
-  user-select: none;
-  display: flex;
-  justify-content: space-between;
-  align-items: center;
-  padding: 8px;
-  border-radius: 8px;
-  background: rgba(0, 0, 0, 0.02);
-  margin-bottom: 10px;
-}
-
-.toggle-section:hover {
-  background: rgba(0, 0, 0, 0.04);
-}
-
-.collapsible-content {
-  max-height: 0;
-  overflow: hidden;
-  transition: max-height 0.3s ease;
-}
-
-.collapsible-content.open {
-  max-height: 2000px;
-}
-
- .signal-indicator {
-      padding: 8px 12px;
-      border-radius: 8px;
-      font-size: 13px;
-      font-weight: 600;
-      text-align: center;
-      margin-top: 8px;
-    }
-
-    .signal-buy {
-      background: linear-gradient(90deg, #10b981, #059669);
-      color: white;
-    }
-
-    .signal-sell {
-      background: linear-gradient(90deg, #ef4444, #dc2626);
-      color: white;
-    }
-
-    .signal-neutral {
-      background: rgba(0, 0, 0, 0.05);
-      color: var(--muted);
-    }
-
-    .bb-bands {
-      font-size: 12px;
-      color: var(--muted);
-      margin-top: 6px;
-      padding: 6px;
-      background: rgba(0, 0, 0, 0.05);
-      border-radius: 6px;
-    }
-
-    @media (max-width: 520px) {
-      header h1 {
-        font-size: 18px;
-      }
-
-      .controls input[type="text"] {
-        min-width: 140px;
-      }
-
-      .layout {
-        gap: 10px;
-      }
-    }
-  </style>
-</head>
-<body>
-  <div class="container">
-
-    <header>
-      <h1>📈 Live Stock Price Viewer & Trading Simulator</h1>
-      <p>Enter a symbol, view live price + chart, use Bollinger Band strategy for automated signals.</p>
-    </header>
-
-    <div class="card">
-      <div class="controls" role="region" aria-label="Stock controls">
-        <input id="stockInput" placeholder="Enter stock (e.g. RELIANCE, TCS)" aria-label="Stock symbol" />
-        <button id="getPriceBtn">Get Price</button>
-        <button id="stopBtn" class="small">Stop Updates</button>
-        <button id="resetBtn" class="small">Reset Simulator</button>
-      </div>
-    </div>
-
-    <div class="layout">
-      <!-- left: chart -->
-      <div class="card chart-wrap">
-        <div id="priceBox">
-          <div>
-            <div id="currentSymbol" class="muted">—</div>
-            <div class="price-current" id="currentPrice">₹ -</div>
-            <div class="price-change" id="priceChange">—</div>
-          </div>
-          <div style="min-width:220px;">
-            <div class="muted small-muted">Bank balance</div>
-            <div class="balance" id="balanceBox">
-              <div style="font-weight:700" id="balanceAmt">₹ 10,000,000.00</div>
-              <div class="small-muted" id="cashAvailable">available</div>
-            </div>
-          </div>
-        </div>
-
-        <div id="signalIndicator" class="signal-indicator signal-neutral">No active signal</div>
-        
-        <div id="bollingerBands" class="bb-bands" style="display:none;">
-          <div><strong>Bollinger Bands:</strong></div>
-          <div>Upper: <span id="bbUpper">-</span></div>
-          <div>Middle: <span id="bbMiddle">-</span></div>
-          <div>Lower: <span id="bbLower">-</span></div>
-          <div>ATR: <span id="bbATR">-</span></div>
-        </div>
-
-        <canvas id="chart" height="160" style="width:100%;max-height:420px"></canvas>
-
-        <div style="display:flex;justify-content:space-between;align-items:center;margin-top:8px;">
-          <div class="small-muted">Live updates every 1s (when active)</div>
-          <div class="small-muted" id="lastUpdated">—</div>
-        </div>
-
-        <div class="grid-2" style="margin-top:12px;">
-          <div class="card" style="padding:10px;">
-            <div style="font-weight:700;margin-bottom:6px">Portfolio</div>
-            <div id="portfolioContainer"></div>
-          </div>
-
-          <div class="card" style="padding:10px;">
-            <div style="font-weight:700;margin-bottom:6px">Transactions</div>
-            <div class="tx-list" id="transactionsContainer"></div>
-          </div>
-        </div>
-      </div>
-
-      <!-- right: trading panel -->
-      <div class="card trade-card">
-        <!-- Strategy Parameters Section -->
-        <div class="toggle-section" id="paramsToggle">
-          <div style="font-weight:700; font-size:16px;">⚙️ Strategy Parameters</div>
-          <div style="font-size:20px;">▼</div>
-        </div>
-        
-        <div id="paramsContent" class="collapsible-content">
-          <div class="param-item">
-            <label>
-              <input type="checkbox" id="strategyEnabled" />
-              Enable Strategy Signals
-            </label>
-          </div>
-          
-          <div class="param-item">
-            <label>
-              <input type="checkbox" id="autoTradeEnabled" />
-              Enable Auto-Trading (Execute on signals)
-            </label>
-          </div>
-
-          <div class="param-grid">
-            <div class="param-item">
-              <label>BB Window (Periods)</label>
-              <input type="number" id="bbWindow" min="5" max="100" step="1" value="20" />
-            </div>
-
-            <div class="param-item">
-              <label>Std Dev (Base)</label>
-              <input type="number" id="stdDevBase" min="1" max="5" step="0.1" value="2.5" />
-            </div>
-
-            <div class="param-item">
-              <label>Std Dev (High Vol)</label>
-              <input type="number" id="stdDevAlt" min="1" max="5" step="0.1" value="2.8" />
-            </div>
-
-            <div class="param-item">
-              <label>ATR Period</label>
-              <input type="number" id="atrPeriod" min="5" max="50" step="1" value="14" />
-            </div>
-
-            <div class="param-item">
-              <label>ATR Multiplier</label>
-              <input type="number" id="atrMultiplier" min="0.5" max="5" step="0.1" value="1.5" />
-            </div>
-
-            <div class="param-item">
-              <label>Confirmation Ticks</label>
-              <input type="number" id="confirmationTicks" min="0" max="10" step="1" value="1" />
-            </div>
-
-            <div class="param-item">
-              <label>Stop Loss Mode</label>
-              <select id="stopLossMode">
-                <option value="ATR">ATR</option>
-                <option value="PERCENT">Percent</option>
-              </select>
-            </div>
-
-            <div class="param-item">
-              <label>Stop Loss % (Fallback)</label>
-              <input type="number" id="stopLossPct" min="0.01" max="0.5" step="0.01" value="0.07" />
-            </div>
-
-            <div class="param-item">
-              <label>Risk Per Trade %</label>
-              <input type="number" id="riskPerTrade" min="0.001" max="0.1" step="0.001" value="0.01" />
-            </div>
-
-            <div class="param-item">
-              <label>Slippage %</label>
-              <input type="number" id="slippagePct" min="0" max="0.1" step="0.001" value="0.02" />
-            </div>
-          </div>
-
-          <button id="saveParamsBtn" style="width:100%;margin-top:10px;padding:10px;border-radius:10px;border:0;background:linear-gradient(90deg,var(--accent),#3dd3c9);color:#042029;font-weight:600;cursor:pointer;">
-            Save Parameters
-          </button>
-        </div>
-
-        <hr style="border:none;border-top:1px dashed rgba(255,255,255,0.03);margin:8px 0"/>
-
-        <div style="font-weight:700; font-size:16px;">Trading Panel</div>
-        <div class="muted small-muted">Symbol</div>
-        <div><input id="tradeSymbol" type="text" placeholder="Symbol" /></div>
-
-        <div class="trade-row">
-          <div style="flex:1">
-            <div class="muted small-muted">Quantity</div>
-            <input id="tradeQty" type="number" min="1" step="1" value="1" />
-          </div>
-          <div style="width:120px">
-            <div class="muted small-muted">Order Type</div>
-            <select id="orderType" style="width:100%;padding:8px;border-radius:8px;background:var(--glass);border:1px solid rgba(255,255,255,0.04);">
-              <option value="market">Market</option>
-            </select>
-          </div>
-        </div>
-
-        <div class="trade-row">
-          <div style="flex:1">
-            <div class="muted small-muted">Estimated Value</div>
-            <div id="estValue">₹ 0.00</div>
-          </div>
-          <div style="flex:1">
-            <div class="muted small-muted">Position Qty</div>
-            <div id="posQty">0</div>
-          </div>
-        </div>
-
-        <div class="trade-actions">
-          <button class="buy-btn" id="buyBtn">Buy</button>
-          <button class="sell-btn" id="sellBtn">Sell</button>
-        </div>
-
-        <div class="info-row">
-          <div class="muted small-muted">Price used: <span id="usedPrice">—</span></div>
-          <div class="muted small-muted">Available Cash: <span id="availCash">—</span></div>
-        </div>
-
-        <hr style="border:none;border-top:1px dashed rgba(255,255,255,0.03);margin:8px 0"/>
-
-        <div style="font-weight:700">Holdings</div>
-        <div id="holdingsList" style="margin-top:8px"></div>
-
-        <hr style="border:none;border-top:1px dashed rgba(255,255,255,0.03);margin:8px 0"/>
-
-        <div style="font-weight:700">Profit & Loss</div>
-        <div id="pnlSection" style="margin-top:8px">
-          <div style="background:linear-gradient(180deg,rgba(255,255,255,0.02),transparent);border-radius:10px;padding:10px;">
-            <div style="display:flex;justify-content:space-between;margin-bottom:8px;">
-              <span class="muted small-muted">Total Invested</span>
-              <span id="totalInvested" style="font-weight:600">₹ 0.00</span>
-            </div>
-            <div style="display:flex;justify-content:space-between;margin-bottom:8px;">
-              <span class="muted small-muted">Current Value</span>
-              <span id="currentValue" style="font-weight:600">₹ 0.00</span>
-            </div>
-            <div style="height:1px;background:rgba(255,255,255,0.05);margin:8px 0"></div>
-            <div style="display:flex;justify-content:space-between;align-items:center;">
-              <span style="font-weight:700;font-size:15px">Overall P&L</span>
-              <div style="text-align:right">
-                <div id="overallPnl" style="font-weight:700;font-size:16px">₹ 0.00</div>
-                <div id="overallPnlPct" class="small-muted">(0.00%)</div>
-              </div>
-            </div>
-          </div>
-          
-          <div style="margin-top:12px" id="stockPnlList"></div>
-        </div>
-
-      </div>
-    </div>
-  </div>
-
-  <script>
-  (function(){
-    const API_LTP = "/api/ltp";
-    const API_BUY = "/api/buy";
-    const API_SELL = "/api/sell";
-    const API_STATUS = "/api/status";
-    const API_RESET = "/api/reset";
-    const API_PARAMS = "/api/strategy/params";
-    const POLL_MS = 1000;
-    const MAX_POINTS = 120;
-
-    const state = {
-      symbol: null,
-      price: null,
-      prevPrice: null,
-      priceHistory: [],
-      timestamps: [],
-      running: false,
-      lastUpdated: null,
-      balance: 10000000.00,
-      holdings: {},
-      transactions: [],
-      strategyParams: {},
-      currentSignal: null,
-      bollingerData: null
-    };
-
-    const stockInput = document.getElementById("stockInput");
-    const getPriceBtn = document.getElementById("getPriceBtn");
-    const stopBtn = document.getElementById("stopBtn");
-    const resetBtn = document.getElementById("resetBtn");
-    const currentSymbolEl = document.getElementById("currentSymbol");
-    const currentPriceEl = document.getElementById("currentPrice");
-    const priceChangeEl = document.getElementById("priceChange");
-    const lastUpdatedEl = document.getElementById("lastUpdated");
-    const balanceAmtEl = document.getElementById("balanceAmt");
-    const tradeSymbolEl = document.getElementById("tradeSymbol");
-    const tradeQtyEl = document.getElementById("tradeQty");
-    const estValueEl = document.getElementById("estValue");
-    const posQtyEl = document.getElementById("posQty");
-    const usedPriceEl = document.getElementById("usedPrice");
-    const availCashEl = document.getElementById("availCash");
-    const portfolioContainer = document.getElementById("portfolioContainer");
-    const holdingsList = document.getElementById("holdingsList");
-    const transactionsContainer = document.getElementById("transactionsContainer");
-    const buyBtn = document.getElementById("buyBtn");
-    const sellBtn = document.getElementById("sellBtn");
-    const signalIndicator = document.getElementById("signalIndicator");
-    const bollingerBands = document.getElementById("bollingerBands");
-
-    let pollTimer = null;
-
-    const ctx = document.getElementById('chart').getContext('2d');
-    const chartData = {
-      labels: state.timestamps,
-      datasets: [{
-        label: 'Price',
-        data: state.priceHistory,
-        tension: 0.25,
-        borderWidth: 2,
-        pointRadius: 0,
-        fill: true,
-        backgroundColor: 'rgba(63, 196, 255, 0.06)',
-        borderColor: '#3dd3c9'
-      }]
-    };
-    const chartOpts = {
-      animation: false,
-      responsive: true,
-      maintainAspectRatio: false,
-      scales: {
-        x: { display: false },
-        y: {
-          ticks: { callback: v => '₹' + Number(v).toLocaleString() },
-          grid: { color: 'rgba(255,255,255,0.03)' }
-        }
-      },
-      plugins: {
-        legend: { display: false }
-      }
-    };
-    const priceChart = new Chart(ctx, {
-      type: 'line',
-      data: chartData,
-      options: chartOpts
-    });
-
-    function formatCurrency(v){ return '₹ ' + Number(v).toLocaleString(undefined, {minimumFractionDigits:2, maximumFractionDigits:2}); }
-    function nowTime(){ return new Date().toLocaleTimeString(); }
-
-    function pushPrice(p){
-      state.prevPrice = state.price;
-      state.price = p;
-      state.lastUpdated = Date.now();
-
-      state.priceHistory.push(p);
-      state.timestamps.push(new Date().toLocaleTimeString());
-
-      if (state.priceHistory.length > MAX_POINTS){
-        state.priceHistory.shift();
-        state.timestamps.shift();
-      }
-      priceChart.data.labels = state.timestamps.slice();
-      priceChart.data.datasets[0].data = state.priceHistory.slice();
-      priceChart.update();
-
-      currentPriceEl.textContent = formatCurrency(p);
-      currentSymbolEl.textContent = state.symbol || '—';
-
-      if (state.prevPrice != null){
-        const diff = p - state.prevPrice;
-        const pct = (diff / state.prevPrice) * 100;
-        const sign = diff >= 0 ? '+' : '-';
-        priceChangeEl.innerHTML = `${sign} ₹${Math.abs(diff).toFixed(2)} (${sign}${Math.abs(pct).toFixed(2)}%)`;
-        priceChangeEl.className = diff >= 0 ? 'price-change pos' : 'price-change neg';
-      } else {
-        priceChangeEl.textContent = '—';
-        priceChangeEl.className = 'price-change';
-      }
-      lastUpdatedEl.textContent = `Updated ${nowTime()}`;
-      usedPriceEl.textContent = formatCurrency(p);
-      updateEstValue();
-      calculateAndRenderPnL();
-    }
-
-    function updateSignalDisplay(signal, bbData){
-      state.currentSignal = signal;
-      state.bollingerData = bbData;
-
-      if (signal && signal.action) {
-        if (signal.action === "BUY") {
-          signalIndicator.className = "signal-indicator signal-buy";
-          signalIndicator.textContent = `🔵 BUY SIGNAL: ${signal.reason}`;
-        } else if (signal.action === "SELL") {
-          signalIndicator.className = "signal-indicator signal-sell";
-          signalIndicator.textContent = `🔴 SELL SIGNAL: ${signal.reason}`;
-        }
-      } else {
-        signalIndicator.className = "signal-indicator signal-neutral";
-        signalIndicator.textContent = "No active signal";
-      }
-
-      if (bbData && bbData.upper !== undefined) {
-        bollingerBands.style.display = "block";
-        document.getElementById("bbUpper").textContent = formatCurrency(bbData.upper);
-        document.getElementById("bbMiddle").textContent = formatCurrency(bbData.middle);
-        document.getElementById("bbLower").textContent = formatCurrency(bbData.lower);
-        document.getElementById("bbATR").textContent = bbData.atr ? bbData.atr.toFixed(4) : "N/A";
-      } else {
-        bollingerBands.style.display = "none";
-      }
-    }
-
-    function setRunning(flag){
-      state.running = flag;
-      if (!flag){
-        if (pollTimer) { clearInterval(pollTimer); pollTimer = null; }
-        stopBtn.textContent = 'Start Updates';
-      } else {
-        stopBtn.textContent = 'Stop Updates';
-      }
-    }
-
-    function safeFetchJson(url, opts){
-      return fetch(url, opts).then(async r => {
-        const ct = r.headers.get('content-type') || '';
-        if (!r.ok) {
-          let text = await r.text();
-          throw new Error(text || r.statusText || ('HTTP ' + r.status));
-        }
-        if (ct.indexOf('application/json') !== -1) return r.json();
-        return JSON.parse(await r.text());
-      });
-    }
-
-    async function fetchLtpFor(stock){
-      const url = `${API_LTP}?stock=${encodeURIComponent(stock)}`;
-      try {
-        const data = await safeFetchJson(url, { method: 'GET' });
-        if (data && (data.ltp !== undefined && data.symbol)) {
-          return data;
-        }
-        throw new Error('Unexpected LTP response');
-      } catch (err){
-        throw err;
-      }
-    }
-
-    async function fetchStatus(){
-      try {
-        const data = await safeFetchJson(API_STATUS);
-        if (data) {
-          state.balance = Number(data.balance ?? state.balance);
-          state.holdings = data.portfolio ?? {};
-          state.transactions = data.transactions ?? [];
-          if (data.strategy_params) {
-            state.strategyParams = data.strategy_params;
-          }
-          updateStatusUI();
-        }
-      } catch (err){
-        console.warn('Status fetch failed', err);
-      }
-    }
-
-    async function fetchStrategyParams(){
-      try {
-        const data = await safeFetchJson(API_PARAMS);
-        if (data) {
-          state.strategyParams = data;
-          loadParamsToUI();
-        }
-      } catch (err){
-        console.warn('Params fetch failed', err);
-      }
-    }
-
-    async function saveStrategyParams(){
-      const params = {
-        enabled: document.getElementById("strategyEnabled").checked,
-        auto_trade_enabled: document.getElementById("autoTradeEnabled").checked,
-        bb_window: parseInt(document.getElementById("bbWindow").value),
-        std_dev_base: parseFloat(document.getElementById("stdDevBase").value),
-        std_dev_alt: parseFloat(document.getElementById("stdDevAlt").value),
-        atr_period: parseInt(document.getElementById("atrPeriod").value),
-        atr_multiplier: parseFloat(document.getElementById("atrMultiplier").value),
-        confirmation_ticks: parseInt(document.getElementById("confirmationTicks").value),
-        stop_loss_mode: document.getElementById("stopLossMode").value,
-        stop_loss_pct: parseFloat(document.getElementById("stopLossPct").value),
-        risk_per_trade_pct: parseFloat(document.getElementById("riskPerTrade").value),
-        slippage_pct: parseFloat(document.getElementById("slippagePct").value)
-      };
-
-      try {
-        const res = await safeFetchJson(API_PARAMS, {
-          method: 'POST',
-          headers: { 'Content-Type': 'application/json' },
-          body: JSON.stringify(params)
-        });
-        alert('Strategy parameters saved successfully!');
-        state.strategyParams = res.params;
-      } catch (err){
-        alert('Failed to save parameters: ' + err.message);
-      }
-    }
-
-    function loadParamsToUI(){
-      const p = state.strategyParams;
-      document.getElementById("strategyEnabled").checked = p.enabled || false;
-      document.getElementById("autoTradeEnabled").checked = p.auto_trade_enabled || false;
-      document.getElementById("bbWindow").value = p.bb_window || 20;
-      document.getElementById("stdDevBase").value = p.std_dev_base || 2.5;
-      document.getElementById("stdDevAlt").value = p.std_dev_alt || 2.8;
-      document.getElementById("atrPeriod").value = p.atr_period || 14;
-      document.getElementById("atrMultiplier").value = p.atr_multiplier || 1.5;
-      document.getElementById("confirmationTicks").value = p.confirmation_ticks || 1;
-      document.getElementById("stopLossMode").value = p.stop_loss_mode || "ATR";
-      document.getElementById("stopLossPct").value = p.stop_loss_pct || 0.07;
-      document.getElementById("riskPerTrade").value = p.risk_per_trade_pct || 0.01;
-      document.getElementById("slippagePct").value = p.slippage_pct || 0.02;
-    }
-
-    async function placeBuy(stock, qty, autoTrade){
-      try {
-        const res = await safeFetchJson(API_BUY, {
-          method: 'POST',
-          headers: { 'Content-Type': 'application/json' },
-          body: JSON.stringify({ stock, qty, auto_trade: autoTrade })
-        });
-        await fetchStatus();
-        if (res.message) alert(res.message);
-        if (res.signal) {
-          console.log('Trade executed on signal:', res.signal);
-        }
-        return res;
-      } catch (err){
-        alert('Buy failed: ' + (err.message || err));
-        throw err;
-      }
-    }
-
-    async function placeSell(stock, qty, autoTrade){
-      try {
-        const res = await safeFetchJson(API_SELL, {
-          method: 'POST',
-          headers: { 'Content-Type': 'application/json' },
-          body: JSON.stringify({ stock, qty, auto_trade: autoTrade })
-        });
-        await fetchStatus();
-        if (res.message) alert(res.message);
-        if (res.signal) {
-          console.log('Trade executed on signal:', res.signal);
-        }
-        return res;
-      } catch (err){
-        alert('Sell failed: ' + (err.message || err));
-        throw err;
-      }
-    }
-
-    async function tryResetServer(){
-      try {
-        const res = await fetch(API_RESET, { method: 'POST' });
-        if (res.ok) {
-          alert('Simulator reset successfully!');
-          await fetchStatus();
-          state.priceHistory = [];
-          state.timestamps = [];
-          priceChart.data.labels = [];
-          priceChart.data.datasets[0].data = [];
-          priceChart.update();
-        } else {
-          const txt = await res.text().catch(()=>null);
-          alert('Server reset responded: ' + (txt || res.statusText));
-        }
-      } catch (err){
-        console.info('Server reset error', err);
-        alert('Server reset failed: ' + err.message);
-      }
-    }
-
-    function updateStatusUI(){
-      balanceAmtEl.textContent = formatCurrency(state.balance);
-      availCashEl.textContent = formatCurrency(state.balance);
-      
-      if (!state.holdings || Object.keys(state.holdings).length === 0){
-        portfolioContainer.innerHTML = '<div class="muted">No holdings</div>';
-        holdingsList.innerHTML = '<div class="muted">No holdings</div>';
-        posQtyEl.textContent = '0';
-      } else {
-        let html = '<table><thead><tr><th>Symbol</th><th>Qty</th><th>Avg Price</th><th>Value</th></tr></thead><tbody>';
-        let holdingsListHtml = '';
-        for (const [sym, info] of Object.entries(state.holdings)){
-          const qty = Number(info.qty || 0);
-          const avg = Number(info.avg_price || info.avgPrice || 0);
-          const val = qty * avg;
-          html += `<tr><td>${sym}</td><td>${qty}</td><td>${formatCurrency(avg)}</td><td>${formatCurrency(val)}</td></tr>`;
-          holdingsListHtml += `<div style="margin-bottom:6px"><strong>${sym}</strong> — ${qty} @ ${formatCurrency(avg)}</div>`;
-          if (sym === state.symbol) posQtyEl.textContent = qty;
-        }
-        html += '</tbody></table>';
-        portfolioContainer.innerHTML = html;
-        holdingsList.innerHTML = holdingsListHtml;
-        
-        if (state.symbol && state.holdings[state.symbol]) {
-          posQtyEl.textContent = state.holdings[state.symbol].qty;
-        } else if (state.symbol) {
-          posQtyEl.textContent = '0';
-        }
-      }
-
-      renderTransactions();
-      calculateAndRenderPnL();
-    }
-
-    function renderTransactions(){
-      if (!state.transactions || state.transactions.length === 0){
-        transactionsContainer.innerHTML = '<div class="muted">No transactions yet</div>';
-        return;
-      }
-      let html = '<table><thead><tr><th>Time</th><th>Symbol</th><th>Side</th><th>Qty</th><th>Price</th></tr></thead><tbody>';
-      for (let i = state.transactions.length-1; i >= 0; i--){
-        const t = state.transactions[i];
-        const time = new Date(t.timestamp * 1000).toLocaleTimeString();
-        html += `<tr>
-          <td>${time}</td>
-          <td>${t.symbol}</td>
-          <td class="${t.type === 'BUY' ? 'pos' : 'neg'}">${t.type}</td>
-          <td>${t.qty}</td>
-          <td>${formatCurrency(t.price)}</td>
-        </tr>`;
-      }
-      html += '</tbody></table>';
-      transactionsContainer.innerHTML = html;
-    }
-
-    function calculateAndRenderPnL(){
-      let totalInvested = 0;
-      let totalCurrentValue = 0;
-      let stockPnlHtml = '';
-      
-      if (!state.holdings || Object.keys(state.holdings).length === 0){
-        document.getElementById('totalInvested').textContent = formatCurrency(0);
-        document.getElementById('currentValue').textContent = formatCurrency(0);
-        document.getElementById('overallPnl').textContent = formatCurrency(0);
-        document.getElementById('overallPnl').className = '';
-        document.getElementById('overallPnlPct').textContent = '(0.00%)';
-        document.getElementById('stockPnlList').innerHTML = '<div class="muted small-muted">No holdings to display P&L</div>';
-        return;
-      }
-
-      for (const [sym, info] of Object.entries(state.holdings)){
-        const qty = Number(info.qty || 0);
-        const avgPrice = Number(info.avg_price || info.avgPrice || 0);
-        const invested = qty * avgPrice;
-        
-        let currentPrice = avgPrice;
-        if (sym === state.symbol && state.price) {
-          currentPrice = Number(state.price);
-        } else if (info.current_price) {
-          currentPrice = Number(info.current_price);
-        }
-        
-        const currentVal = qty * currentPrice;
-        const pnl = currentVal - invested;
-        const pnlPct = invested > 0 ? (pnl / invested) * 100 : 0;
-        
-        totalInvested += invested;
-        totalCurrentValue += currentVal;
-        
-        const pnlClass = pnl >= 0 ? 'profit' : 'loss';
-        const pnlColor = pnl >= 0 ? 'pos' : 'neg';
-        const pnlSign = pnl >= 0 ? '+' : '';
-        
-        stockPnlHtml += `
-          <div class="pnl-item ${pnlClass}">
-            <div class="pnl-item-header">
-              <span class="pnl-item-symbol">${sym}</span>
-              <span class="pnl-item-value ${pnlColor}">${pnlSign}${formatCurrency(pnl)}</span>
-            </div>
-            <div class="pnl-item-details">
-              <span>${qty} shares @ ${formatCurrency(avgPrice)}</span>
-              <span class="${pnlColor}">${pnlSign}${pnlPct.toFixed(2)}%</span>
-            </div>
-            <div class="pnl-item-details">
-              <span>Invested: ${formatCurrency(invested)}</span>
-              <span>Current: ${formatCurrency(currentVal)}</span>
-            </div>
-          </div>
-        `;
-      }
-      
-      document.getElementById('totalInvested').textContent = formatCurrency(totalInvested);
-      document.getElementById('currentValue').textContent = formatCurrency(totalCurrentValue);
-      
-      const overallPnl = totalCurrentValue - totalInvested;
-      const overallPnlPct = totalInvested > 0 ? (overallPnl / totalInvested) * 100 : 0;
-      
-      const overallPnlEl = document.getElementById('overallPnl');
-      const overallPnlSign = overallPnl >= 0 ? '+' : '';
-      overallPnlEl.textContent = `${overallPnlSign}${formatCurrency(overallPnl)}`;
-      overallPnlEl.className = overallPnl >= 0 ? 'pos' : 'neg';
-      
-      const overallPnlPctEl = document.getElementById('overallPnlPct');
-      overallPnlPctEl.textContent = `(${overallPnlSign}${overallPnlPct.toFixed(2)}%)`;
-      overallPnlPctEl.className = overallPnl >= 0 ? 'small-muted pos' : 'small-muted neg';
-      
-      document.getElementById('stockPnlList').innerHTML = stockPnlHtml;
-    }
-
-    function updateEstValue(){
-      const qty = Number(tradeQtyEl.value) || 0;
-      const price = Number(state.price) || 0;
-      const est = qty * price;
-      estValueEl.textContent = formatCurrency(est);
-    }
-
-    // Toggle collapsible section
-    document.getElementById('paramsToggle').addEventListener('click', function(){
-      const content = document.getElementById('paramsContent');
-      const arrow = this.querySelector('div:last-child');
-      if (content.classList.contains('open')) {
-        content.classList.remove('open');
-        arrow.textContent = '▼';
-      } else {
-        content.classList.add('open');
-        arrow.textContent = '▲';
-      }
-    });
-
-    // Save parameters button
-    document.getElementById('saveParamsBtn').addEventListener('click', saveStrategyParams);
-
-    // Get price button
-    getPriceBtn.addEventListener('click', async () => {
-      const raw = stockInput.value.trim();
-      if (!raw) { alert('Enter a stock name'); return; }
-      try {
-        const data = await fetchLtpFor(raw);
-        const symbol = data.symbol;
-        const ltp = Number(data.ltp);
-        state.symbol = symbol;
-        tradeSymbolEl.value = symbol;
-        pushPrice(ltp);
-        
-        // Update signal display
-        updateSignalDisplay(data.signal, data.bollinger);
-        
-        await fetchStatus();
-
-        if (!state.running){
-          setRunning(true);
-          pollTimer = setInterval(async () => {
-            if (!state.symbol) return;
-            try {
-              const d = await fetchLtpFor(state.symbol);
-              if (d && d.ltp !== undefined){
-                pushPrice(Number(d.ltp));
-                updateSignalDisplay(d.signal, d.bollinger);
-              }
-            } catch (err){
-              console.warn('poll error', err);
-            }
-          }, POLL_MS);
-        }
-      } catch (err){
-        alert('Failed to get price: ' + (err.message || err));
-      }
-    });
-
-    stopBtn.addEventListener('click', () => {
-      if (state.running){
-        setRunning(false);
-      } else {
-        if (state.symbol){
-          setRunning(true);
-          pollTimer = setInterval(async () => {
-            try {
-              const d = await fetchLtpFor(state.symbol);
-              if (d && d.ltp !== undefined) {
-                pushPrice(Number(d.ltp));
-                updateSignalDisplay(d.signal, d.bollinger);
-              }
-            } catch(e){ console.warn('poll error', e); }
-          }, POLL_MS);
-        }
-      }
-    });
-
-    resetBtn.addEventListener('click', async () => {
-      if (confirm('Reset simulator? This will reset your balance and clear all holdings.')) {
-        await tryResetServer();
-      }
-    });
-
-    tradeQtyEl.addEventListener('input', updateEstValue);
-    tradeSymbolEl.addEventListener('input', () => { 
-      state.symbol = tradeSymbolEl.value.trim().toUpperCase(); 
-    });
-
-    buyBtn.addEventListener('click', async () => {
-      const qty = Math.max(1, Math.floor(Number(tradeQtyEl.value) || 1));
-      const sym = (tradeSymbolEl.value || state.symbol || '').trim();
-      if (!sym) return alert('No symbol selected.');
-      
-      const autoTrade = state.strategyParams.auto_trade_enabled || false;
-      
-      try {
-        await placeBuy(sym, qty, autoTrade);
-      } catch (err){
-        // handled in placeBuy
-      }
-    });
-
-    sellBtn.addEventListener('click', async () => {
-      const qty = Math.max(1, Math.floor(Number(tradeQtyEl.value) || 1));
-      const sym = (tradeSymbolEl.value || state.symbol || '').trim();
-      if (!sym) return alert('No symbol selected.');
-      
-      const autoTrade = state.strategyParams.auto_trade_enabled || false;
-      
-      try {
-        await placeSell(sym, qty, autoTrade);
-      } catch (err){
-        // handled in placeSell
-      }
-    });
-
-    // Initial load
-    (async function init(){
-      await fetchStrategyParams();
-      await fetchStatus();
-      updateEstValue();
-    })();
-
-    window._simState = state;
-    window._pushPrice = pushPrice;
-    window._updateStatusUI = updateStatusUI;
-  })();
-  </script>
-</body>
-</html>
-"""
-
 @app.route("/")
 def home():
-    return render_template_string(HTML_PAGE)
+    return asset_response(None)
+
+@app.route("/assets/<name>")
+def dashboard_asset(name):
+    return asset_response(name)
 
 # ---------- Main ----------
 if __name__ == "__main__":
-    ensure_login()
+    start_background_login()
+    get_dashboard()
     url = "http://127.0.0.1:5000"
     print(f"🚀 Server running at {url}")
     print(f"💰 Initial Balance: ₹{SIMULATOR_STATE['balance']:,.2f}")
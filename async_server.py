@@ -0,0 +1,499 @@
+"""Asyncio serving mode for the simulator API.
+
+Serves the same endpoints as White.py from a single tornado/asyncio event
+loop. Broker calls go through tornado's non-blocking HTTP client, so a slow
+SmartAPI round trip parks a coroutine instead of a worker thread, and one
+process can hold thousands of slow requests and streaming connections.
+Calls that take the simulator's TRADE_LOCK or INDICATOR_LOCK (recording a
+tick, fills, resting orders, resets, indicator reads) run on a worker
+thread via asyncio.to_thread, so a lock wait parks one coroutine instead of
+stalling every connection on the loop.
+
+    python async_server.py --port 5000
+"""
+import asyncio
+import argparse
+import json
+import time
+import webbrowser
+import tornado.web
+from tornado.httpclient import AsyncHTTPClient, HTTPRequest, HTTPClientError
+from tornado.iostream import StreamClosedError
+import White as W
+
+# ---------- CONFIG ----------
+ASYNC_MAX_CLIENTS = 1000     # concurrent broker connections from the event loop
+STREAM_INTERVAL = W.POLL_INTERVAL
+# ----------------------------
+
+# ---------- ASYNC BROKER CLIENT ----------
+class AsyncBrokerClient:
+    """Non-blocking twin of White.BrokerClient.
+
+    Shares the blocking client's circuit breaker, counters and quote cache,
+    so both serving modes report and degrade the same way.
+    """
+    def __init__(self, broker):
+        self.broker = broker
+        self.http = AsyncHTTPClient(force_instance=True, max_clients=ASYNC_MAX_CLIENTS)
+
+    async def _send(self, obj, route, params):
+        url, headers, body = W.BrokerClient.prepare(obj, route, params)
+        req = HTTPRequest(url, method="POST", headers=headers, body=body,
+                          connect_timeout=W.BROKER_CONNECT_TIMEOUT,
+                          request_timeout=W.BROKER_CONNECT_TIMEOUT + W.BROKER_READ_TIMEOUT)
+        started = time.perf_counter()
+        try:
+            resp = await self.http.fetch(req, raise_error=False)
+        except HTTPClientError as e:
+            if e.code == 599:
+                raise W.BrokerError("timeout", str(e), retryable=True)
+            raise W.BrokerError("network", str(e), retryable=True)
+        except (OSError, StreamClosedError) as e:
+            raise W.BrokerError("network", str(e), retryable=True)
+        finally:
+            W.BrokerClient.observe_rtt(route, time.perf_counter() - started)
+        return W.BrokerClient.decode(resp.code, resp.body.decode("utf-8", "replace") if resp.body else "")
+
+    async def request(self, route, params):
+        obj, probe = self.broker.begin()
+        try:
+            attempt = 0
+            while True:
+                await asyncio.sleep(self.broker.throttle())
+                try:
+                    data = await self._send(obj, route, params)
+                except W.BrokerError as e:
+                    delay = self.broker.failed(e, attempt)
+                    if delay is None:
+                        raise
+                    attempt += 1
+                    await asyncio.sleep(delay)
+                    continue
+                self.broker.succeeded()
+                return data
+        finally:
+            if probe:
+                self.broker.end_probe()
+
+    async def ltp(self, exchange, symbol, token):
+        """Return (ltp, fresh), falling back to a recent cached quote"""
+        try:
+            data = await self.request("api.ltp.data", W.BrokerClient.ltp_params(exchange, symbol, token))
+            return self.broker.remember_ltp(token, data)
+        except (W.BrokerError, KeyError, TypeError):
+            return self.broker.cached_ltp(token)
+
+    async def ltp_batch(self, exchange, tokens):
+        """Return token -> (ltp, fresh), one market-data call per W.BATCH_QUOTE_MAX tokens"""
+        tokens = list(dict.fromkeys(tokens))
+
+        async def chunk_quotes(chunk):
+            try:
+                data = await self.request("api.market.data", W.BrokerClient.market_params(exchange, chunk))
+                return self.broker.remember_batch(chunk, data)
+            except (W.BrokerError, KeyError, TypeError, AttributeError):
+                return {token: self.broker.cached_ltp(token) for token in chunk}
+
+        quotes = {}
+        chunks = [tokens[i:i + W.BATCH_QUOTE_MAX] for i in range(0, len(tokens), W.BATCH_QUOTE_MAX)]
+        for part in await asyncio.gather(*(chunk_quotes(c) for c in chunks)):
+            quotes.update(part)
+        return quotes
+
+class AsyncSingleFlight:
+    """Coroutine version of White.SingleFlight"""
+    def __init__(self):
+        self._flights = {}
+        self.leaders = 0
+        self.coalesced = 0
+
+    async def do(self, key, fn, *args):
+        flight = self._flights.get(key)
+        if flight is not None:
+            self.coalesced += 1
+            try:
+                return await asyncio.shield(flight)
+            except asyncio.CancelledError:
+                if not flight.cancelled():
+                    raise  # this caller was cancelled, not the leader
+                return await self.do(key, fn, *args)
+
+        flight = self._flights[key] = asyncio.get_running_loop().create_future()
+        # Avoid "exception was never retrieved" when nobody else was waiting
+        flight.add_done_callback(lambda f: f.cancelled() or f.exception())
+        self.leaders += 1
+        try:
+            result = await fn(*args)
+        except asyncio.CancelledError:
+            flight.cancel()  # followers take over rather than wait forever
+            raise
+        except Exception as e:
+            flight.set_exception(e)
+            raise
+        else:
+            flight.set_result(result)
+            return result
+        finally:
+            del self._flights[key]
+
+    def stats(self):
+        return {"leaders": self.leaders, "coalesced": self.coalesced, "in_flight": len(self._flights)}
+
+ABROKER = None
+AFLIGHTS = AsyncSingleFlight()
+
+async def _fetch_and_record(symbol, token):
+    ltp, fresh = await ABROKER.ltp(W.EXCHANGE_WANTED, symbol, token)
+    if fresh:
+        await asyncio.to_thread(W.record_tick, symbol, token, ltp)
+    return ltp, fresh
+
+async def poll_tick(symbol, token):
+    recent = W.SCHEDULER.recent_tick(token)
+    if recent is not None:
+        return recent, True
+    return await AFLIGHTS.do(("tick", token), _fetch_and_record, symbol, token)
+
+async def peek_quote(symbol, token):
+    recent = W.SCHEDULER.recent_tick(token)
+    if recent is not None:
+        return recent, True
+    return await AFLIGHTS.do(("peek", token), ABROKER.ltp, W.EXCHANGE_WANTED, symbol, token)
+
+# ---------- HANDLERS ----------
+class BaseHandler(tornado.web.RequestHandler):
+    route = None  # metrics label; set per route in make_app
+
+    def initialize(self, route=None):
+        self.route = route
+
+    def prepare(self):
+        self.trace_token = W.begin_request(self.request.method, self.route or self.request.path)
+
+    def on_finish(self):
+        token = getattr(self, "trace_token", None)
+        if token is not None:
+            self.trace_token = None
+            W.end_request(token, self.get_status())
+
+    def set_default_headers(self):
+        self.set_header("Access-Control-Allow-Origin", "*")
+        self.set_header("Access-Control-Allow-Headers", "Content-Type")
+        self.set_header("Access-Control-Allow-Methods", "GET, POST, PUT, DELETE, OPTIONS")
+
+    def options(self, *args):
+        self.set_status(204)
+
+    def write_json(self, payload, status=200):
+        self.set_status(status)
+        self.set_header("Content-Type", "application/json")
+        self.finish(W.app.json.dumps(payload))
+
+    def write_versioned(self, name, key, build):
+        status, headers, body = W.render_versioned(name, key, build, self.request.headers.get("If-None-Match"),
+                                                   self.request.headers.get("Accept-Encoding"))
+        self.set_status(status)
+        for k, v in headers.items():
+            self.set_header(k, v)
+        self.finish(body)
+
+    def json_body(self):
+        try:
+            return json.loads(self.request.body or b"null")
+        except ValueError:
+            return None
+
+    def not_ready(self):
+        self.write_json({"error": "Broker session is starting up, please retry shortly",
+                         "status": W.BROKER_STATUS}, 503)
+
+class LtpHandler(BaseHandler):
+    async def get(self):
+        if not W.ensure_login():
+            return self.not_ready()
+        stock = self.get_query_argument("stock", "").strip()
+        if not stock:
+            return self.write_json({"error": "Stock name required"}, 400)
+        symbol, token = W.find_symbol_token(W.TOKEN_DATA, stock)
+        if not symbol:
+            return self.write_json({"error": f"Stock '{stock}' not found"}, 404)
+        W.SCHEDULER.watch(symbol, token, "chart")
+        ltp, fresh = await poll_tick(symbol, token)
+        if ltp is None:
+            return self.write_json({"error": "Failed to fetch price", "broker": W.BROKER.breaker_state()}, 503)
+        self.write_json(W.ltp_response(symbol, ltp, fresh))
+
+class TradeHandler(BaseHandler):
+    def initialize(self, route, side):
+        super().initialize(route)
+        self.fill = W.fill_buy if side == "buy" else W.fill_sell
+
+    async def post(self):
+        if not W.ensure_login():
+            return self.not_ready()
+        stock, qty, auto_trade, error = W.parse_order(self.json_body())
+        if error:
+            return self.write_json({"error": error}, 400)
+        symbol, token = W.find_symbol_token(W.TOKEN_DATA, stock)
+        price = None
+        if symbol:
+            price, fresh = await poll_tick(symbol, token)
+            if not fresh:
+                price = None
+        if not symbol or price is None:
+            return self.write_json({"success": False, "error": f"Stock '{stock}' not found or price unavailable"}, 400)
+        result = await asyncio.to_thread(self.fill, symbol, price, qty, auto_trade)
+        self.write_json(result, 200 if result["success"] else 400)
+
+class BasketHandler(BaseHandler):
+    async def post(self):
+        if not W.ensure_login():
+            return self.not_ready()
+        legs, error = W.parse_basket(self.json_body())
+        if error:
+            return self.write_json({"error": error}, 400)
+        legs = W.resolve_basket(legs)
+        quotes = await ABROKER.ltp_batch(W.EXCHANGE_WANTED, [token for *_, token in legs if token])
+        result = await asyncio.to_thread(W.fill_basket, legs, quotes)
+        self.write_json(result, 200 if result["success"] else 400)
+
+class RestingOrdersHandler(BaseHandler):
+    def get(self):
+        symbol = self.get_query_argument("symbol", "").strip().upper()
+        self.write_json(W.ORDER_BOOK.listing(symbol, self.get_query_argument("status", "open")))
+
+    async def post(self):
+        if not W.ensure_login():
+            return self.not_ready()
+        stock, bodies, error = W.parse_resting_order(self.json_body())
+        if error:
+            return self.write_json({"error": error}, 400)
+        symbol, token = W.find_symbol_token(W.TOKEN_DATA, stock)
+        if not symbol:
+            return self.write_json({"error": f"Stock '{stock}' not found"}, 404)
+        price, _ = await poll_tick(symbol, token)
+        if price is None:
+            return self.write_json({"error": "Failed to fetch price", "broker": W.BROKER.breaker_state()}, 503)
+        self.write_json(*await asyncio.to_thread(W.place_resting_order, symbol, bodies, price))
+
+class RestingOrderHandler(BaseHandler):
+    async def delete(self, order_id):
+        self.write_json(*await asyncio.to_thread(W.cancel_resting_order, int(order_id)))
+
+class RiskHandler(BaseHandler):
+    def get(self):
+        self.write_json(W.RISK.report())
+
+class ScannerHandler(BaseHandler):
+    def get(self):
+        self.write_json(*W.scanner_request(self.get_query_argument))
+
+    def post(self):
+        self.write_json(*W.set_scanner(self.json_body()))
+
+class WatchlistsHandler(BaseHandler):
+    def get(self):
+        self.write_json(W.WATCHLISTS.snapshot())
+
+class WatchlistHandler(BaseHandler):
+    def put(self, name):
+        self.write_json(*W.put_watchlist(name, self.json_body()))
+
+    def delete(self, name):
+        self.write_json(*W.delete_watchlist(name))
+
+class WatchlistSubscriptionsHandler(BaseHandler):
+    def post(self, name):
+        self.write_json(*W.subscribe_watchlist(name))
+
+class WatchlistSubscriptionHandler(BaseHandler):
+    def delete(self, name, sub_id):
+        self.write_json(*W.unsubscribe_watchlist(name, sub_id))
+
+class WatchlistQuotesHandler(BaseHandler):
+    def get(self, name):
+        self.write_json(*W.watchlist_quotes(name, self.get_query_argument("subscription", None)))
+
+class StatusHandler(BaseHandler):
+    async def get(self):
+        symbols = list(W.SIMULATOR_STATE["portfolio"])
+        prices = {}
+        if symbols and W.ensure_login():
+            lookups = [W.find_symbol_token(W.TOKEN_DATA, s) for s in symbols]
+            quotes = await asyncio.gather(*(peek_quote(sym, tok) for sym, tok in lookups if sym))
+            found = [sym for sym, _ in lookups if sym]
+            prices = {sym: ltp for sym, (ltp, _) in zip(found, quotes)}
+        since = self.get_query_argument("since", None)
+        if since is not None and since.lstrip("-").isdigit():
+            return self.write_json(W.status_delta(prices, int(since)))
+        self.write_versioned("status", W.status_version(prices), lambda: W.status_response(prices))
+
+class ParamsHandler(BaseHandler):
+    def get(self):
+        self.write_versioned("params", W.PARAMS_VERSION, W.params_payload)
+
+    def post(self):
+        self.write_json(*W.update_strategy_params(self.json_body()))
+
+class StrategiesHandler(BaseHandler):
+    def get(self):
+        self.write_json(W.STRATEGY_ENGINE.report())
+
+class ResetHandler(BaseHandler):
+    async def post(self):
+        self.write_json(await asyncio.to_thread(W.reset_simulator))
+
+class HistoryHandler(BaseHandler):
+    def get(self):
+        self.write_json(*W.history_request(self.get_query_argument))
+
+class IndicatorsHandler(BaseHandler):
+    async def get(self):
+        self.write_json(*await asyncio.to_thread(W.indicators_request, self.get_query_argument))
+
+class BarsHandler(BaseHandler):
+    async def get(self):
+        self.write_json(*await asyncio.to_thread(W.bars_request, self.get_query_argument))
+
+class ScheduleHandler(BaseHandler):
+    def get(self):
+        self.write_json(W.SCHEDULER.report())
+
+class SummaryHandler(BaseHandler):
+    def get(self):
+        symbol = self.get_query_argument("symbol", "").strip().upper()
+        summaries = [s for s in W.SIMULATOR_STATE["tx_summaries"].values() if not symbol or s.symbol == symbol]
+        self.write_json({"summaries": summaries, "hot_count": len(W.SIMULATOR_STATE["transactions"])})
+
+class HealthHandler(BaseHandler):
+    def get(self):
+        health = W.health_response()
+        health["async_flights"] = AFLIGHTS.stats()
+        self.write_json(health, 200 if health["ready"] else 503)
+
+class StreamHandler(BaseHandler):
+    """Server-sent events: one /api/ltp payload per poll interval"""
+    async def get(self):
+        stock = self.get_query_argument("stock", "").strip()
+        if not stock:
+            return self.write_json({"error": "Stock name required"}, 400)
+        self.set_header("Content-Type", "text/event-stream")
+        self.set_header("Cache-Control", "no-cache")
+        self.closed = False
+        while not self.closed:
+            started = time.monotonic()
+            if W.ensure_login():
+                symbol, token = W.find_symbol_token(W.TOKEN_DATA, stock)
+                if not symbol:
+                    self.write(f"event: error\ndata: {json.dumps({'error': f'Stock {stock} not found'})}\n\n")
+                    break
+                W.SCHEDULER.watch(symbol, token, "chart")
+                ltp, fresh = await poll_tick(symbol, token)
+                if ltp is not None:
+                    self.write(f"data: {W.app.json.dumps(W.ltp_response(symbol, ltp, fresh))}\n\n")
+            try:
+                await self.flush()
+            except StreamClosedError:
+                return
+            await asyncio.sleep(max(STREAM_INTERVAL - (time.monotonic() - started), 0))
+        self.finish()
+
+    def on_connection_close(self):
+        self.closed = True
+
+class AdminHandler(BaseHandler):
+    def prepare(self):
+        super().prepare()
+        denied = W.admin_error(self.request.headers.get("X-Admin-Token"))
+        if denied:
+            self.write_json(*denied)
+
+class ProfilerHandler(AdminHandler):
+    def get(self):
+        if self.get_query_argument("format", "") == "status":
+            return self.write_json(W.PROFILER.status())
+        self.set_header("Content-Type", "text/plain")
+        self.set_header("Content-Disposition", "attachment; filename=profile.folded")
+        self.finish(W.PROFILER.folded())
+
+    def post(self):
+        self.write_json(*W.profiler_control(self.json_body()))
+
+class TracesHandler(AdminHandler):
+    def get(self):
+        self.write_json({"threshold_ms": W.SLOW_REQUEST_SECONDS * 1000, "traces": list(W.SLOW_TRACES)})
+
+class MetricsHandler(BaseHandler):
+    def get(self):
+        self.set_header("Content-Type", "text/plain; version=0.0.4; charset=utf-8")
+        self.finish(W.metrics_text())
+
+class DashboardHandler(BaseHandler):
+    """The dashboard page (no name) and its content-hashed assets"""
+    def get(self, name=None):
+        status, headers, body = W.render_asset(name, self.request.headers.get("If-None-Match"),
+                                               self.request.headers.get("Accept-Encoding"))
+        self.set_status(status)
+        for k, v in headers.items():
+            self.set_header(k, v)
+        self.finish(body)
+
+def make_app():
+    global ABROKER
+    ABROKER = AsyncBrokerClient(W.BROKER)
+    routes = [
+        (r"/", DashboardHandler),
+        (r"/assets/([^/]+)", DashboardHandler, {"route": "/assets/<name>"}),
+        (r"/api/ltp", LtpHandler),
+        (r"/api/buy", TradeHandler, {"side": "buy"}),
+        (r"/api/sell", TradeHandler, {"side": "sell"}),
+        (r"/api/orders", BasketHandler),
+        (r"/api/orders/resting", RestingOrdersHandler),
+        (r"/api/orders/resting/([0-9]+)", RestingOrderHandler, {"route": "/api/orders/resting/<int:order_id>"}),
+        (r"/api/status", StatusHandler),
+        (r"/api/risk", RiskHandler),
+        (r"/api/scanner", ScannerHandler),
+        (r"/api/watchlists", WatchlistsHandler),
+        (r"/api/watchlists/([^/]+)", WatchlistHandler, {"route": "/api/watchlists/<name>"}),
+        (r"/api/watchlists/([^/]+)/subscriptions", WatchlistSubscriptionsHandler,
+         {"route": "/api/watchlists/<name>/subscriptions"}),
+        (r"/api/watchlists/([^/]+)/subscriptions/([^/]+)", WatchlistSubscriptionHandler,
+         {"route": "/api/watchlists/<name>/subscriptions/<sub_id>"}),
+        (r"/api/watchlists/([^/]+)/quotes", WatchlistQuotesHandler, {"route": "/api/watchlists/<name>/quotes"}),
+        (r"/api/stream", StreamHandler),
+        (r"/api/health", HealthHandler),
+        (r"/api/strategy/params", ParamsHandler),
+        (r"/api/strategies", StrategiesHandler),
+        (r"/api/history", HistoryHandler),
+        (r"/api/indicators", IndicatorsHandler),
+        (r"/api/bars", BarsHandler),
+        (r"/api/quotes/schedule", ScheduleHandler),
+        (r"/api/transactions/summary", SummaryHandler),
+        (r"/api/reset", ResetHandler),
+        (r"/metrics", MetricsHandler),
+        (r"/api/admin/profiler", ProfilerHandler),
+        (r"/api/admin/traces", TracesHandler),
+    ]
+    # Label metrics with the same route names as the Flask app
+    routes = [(pattern, handler, {"route": pattern, **(kwargs[0] if kwargs else {})})
+              for pattern, handler, *kwargs in routes]
+    return tornado.web.Application(routes, static_path="static")
+
+# ---------- Main ----------
+async def main(port, open_browser):
+    W.start_background_login()
+    W.get_dashboard()
+    make_app().listen(port)
+    url = f"http://127.0.0.1:{port}"
+    print(f"🚀 Async server running at {url}")
+    if open_browser:
+        webbrowser.open(url)
+    await asyncio.Event().wait()
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Serve the simulator API on an asyncio event loop")
+    parser.add_argument("--port", type=int, default=5000)
+    parser.add_argument("--no-browser", action="store_true")
+    args = parser.parse_args()
+    asyncio.run(main(args.port, not args.no_browser))
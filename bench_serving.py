@@ -0,0 +1,142 @@
+"""Benchmark the Flask and asyncio serving modes against a slow broker.
+
+Starts a local stand-in for the SmartAPI LTP endpoint that answers after a
+fixed delay, points the simulator at it, then fires a burst of concurrent
+/api/ltp requests (one distinct symbol each, so nothing is coalesced) at
+each server in turn.
+
+    python bench_serving.py --concurrency 1000 --latency 0.2 --flask-threads 32
+"""
+import asyncio
+import argparse
+import json
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+import tornado.web
+from tornado.httpclient import AsyncHTTPClient, HTTPClientError
+from werkzeug.serving import BaseWSGIServer, WSGIRequestHandler
+import White as W
+import async_server
+
+# ---------- Fake broker ----------
+class FakeLtpHandler(tornado.web.RequestHandler):
+    def initialize(self, latency):
+        self.latency = latency
+
+    async def post(self, _path):
+        await asyncio.sleep(self.latency)
+        params = json.loads(self.request.body)
+        ltp = 100 + int(params.get("symboltoken", 0)) % 50
+        self.write({"status": True, "message": "SUCCESS", "data": {"ltp": ltp}})
+
+class FakeSession:
+    """Just enough of a SmartConnect object for BrokerClient.prepare"""
+    def __init__(self, root):
+        self.root = root
+        self._routes = {"api.ltp.data": "/ltp"}
+        self.access_token = "bench"
+
+    def requestHeaders(self):
+        return {"Content-type": "application/json", "Accept": "application/json"}
+
+def run_loop_in_thread(setup):
+    """Run an asyncio loop in a daemon thread after awaiting setup() on it"""
+    ready = threading.Event()
+
+    def target():
+        async def body():
+            await setup()
+            ready.set()
+            await asyncio.Event().wait()
+        asyncio.run(body())
+
+    threading.Thread(target=target, daemon=True).start()
+    ready.wait()
+
+# ---------- Flask with a bounded thread pool (like a gthread worker) ----------
+class QuietRequestHandler(WSGIRequestHandler):
+    def log_request(self, *args):
+        pass
+
+class PooledWSGIServer(BaseWSGIServer):
+    request_queue_size = 4096
+
+    def __init__(self, host, port, app, threads):
+        super().__init__(host, port, app, handler=QuietRequestHandler)
+        self.pool = ThreadPoolExecutor(threads)
+
+    def process_request(self, request, client_address):
+        self.pool.submit(self._handle, request, client_address)
+
+    def _handle(self, request, client_address):
+        try:
+            self.finish_request(request, client_address)
+        except Exception:
+            self.handle_error(request, client_address)
+        finally:
+            self.shutdown_request(request)
+
+# ---------- Load generator ----------
+async def burst(base_url, n):
+    client = AsyncHTTPClient(force_instance=True, max_clients=n)
+    latencies, errors = [], 0
+
+    async def one(i):
+        nonlocal errors
+        started = time.perf_counter()
+        try:
+            await client.fetch(f"{base_url}/api/ltp?stock=BENCH{i:05d}", request_timeout=300)
+            latencies.append(time.perf_counter() - started)
+        except (HTTPClientError, OSError):
+            errors += 1
+
+    started = time.perf_counter()
+    await asyncio.gather(*(one(i) for i in range(n)))
+    elapsed = time.perf_counter() - started
+    client.close()
+    return elapsed, latencies, errors
+
+def report(name, n, elapsed, latencies, errors):
+    latencies.sort()
+    pct = lambda p: latencies[min(int(p * len(latencies)), len(latencies) - 1)] * 1000 if latencies else float("nan")
+    print(f"{name:<8} {n:>6} req  {elapsed:7.2f}s  {n / elapsed:8.1f} req/s  "
+          f"p50 {pct(0.50):8.1f}ms  p99 {pct(0.99):8.1f}ms  errors {errors}")
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--concurrency", type=int, default=1000)
+    parser.add_argument("--latency", type=float, default=0.2, help="fake broker delay in seconds")
+    parser.add_argument("--flask-threads", type=int, default=32)
+    args = parser.parse_args()
+
+    broker_port, flask_port, async_port = 18700, 18701, 18702
+
+    async def start_broker():
+        tornado.web.Application([(r"/(.*)", FakeLtpHandler, {"latency": args.latency})]).listen(broker_port)
+    run_loop_in_thread(start_broker)
+
+    W.SMART_OBJ = FakeSession(f"http://127.0.0.1:{broker_port}")
+    W.TOKEN_DATA = [{"symbol": f"BENCH{i:05d}-EQ", "token": str(i)} for i in range(args.concurrency)]
+    W.BROKER_STATUS["started"] = True
+    W.BREAKER_FAILURE_THRESHOLD = args.concurrency * 10
+    # Measure the servers, not the broker quota: the fake broker has no limit
+    W.RATE_LIMITER = W.TokenBucket(1e9, 1e9)
+    W.WARM_START_ENABLED = False  # the fake broker has no candle route
+
+    server = PooledWSGIServer("127.0.0.1", flask_port, W.app, args.flask_threads)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+
+    async def start_async():
+        async_server.make_app().listen(async_port)
+    run_loop_in_thread(start_async)
+
+    print(f"broker latency {args.latency * 1000:.0f}ms, {args.concurrency} concurrent requests, "
+          f"flask pool {args.flask_threads} threads")
+    for name, port in (("flask", flask_port), ("async", async_port)):
+        W.BROKER.quote_cache.clear()
+        report(name, args.concurrency, *asyncio.run(burst(f"http://127.0.0.1:{port}", args.concurrency)))
+    server.shutdown()
+
+if __name__ == "__main__":
+    main()
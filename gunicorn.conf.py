@@ -0,0 +1,17 @@
+# Multi-worker production mode: gunicorn -c gunicorn.conf.py multiworker:app
+import os
+import multiworker
+
+bind = os.getenv("BIND", "0.0.0.0:5000")
+workers = int(os.getenv("WEB_CONCURRENCY", os.cpu_count() or 2))
+worker_class = "gthread"
+threads = int(os.getenv("WORKER_THREADS", "8"))
+
+def on_starting(server):
+    multiworker.start_owner()
+
+def on_exit(server):
+    multiworker.stop_owner()
+
+def child_exit(server, worker):
+    multiworker.worker_exited(worker.pid)
@@ -0,0 +1,430 @@
+"""Multi-process production mode.
+
+One owner process holds the simulator state and the broker session. It polls
+quotes for every symbol somebody is watching and publishes them, with their
+Bollinger values and signal, into a shared-memory table. Gunicorn HTTP workers
+answer /api/ltp straight from that table and forward every other request to
+the owner over a local authenticated socket (the dashboard page and its
+assets are static and served by the workers themselves), so there is exactly one
+portfolio, one price history and one broker session however many workers run.
+
+Only quote reads scale with the worker count. Everything that reads the
+portfolio, price history or indicators (/api/status, /api/history,
+/api/indicators, /api/bars, ...) is owner-bound: it is forwarded and served
+by the owner process, one request at a time per worker connection.
+
+/metrics merges the owner's metrics with each worker's own HTTP metrics,
+labelled worker="<pid>". Workers write theirs to files in SIM_METRICS_DIR
+every METRICS_FLUSH_INTERVAL seconds, so any worker can answer a scrape.
+
+    gunicorn -c gunicorn.conf.py multiworker:app
+"""
+import os
+import sys
+import math
+import time
+import secrets
+import threading
+import subprocess
+import tempfile
+from multiprocessing import shared_memory, resource_tracker
+from multiprocessing.connection import Listener, Client
+import numpy as np
+from flask import Flask, Response, request, jsonify
+from flask_cors import CORS
+import White as W
+
+# ---------- CONFIG ----------
+QUOTE_TABLE_SLOTS = 4096             # symbols the shared table can hold
+QUOTE_MAX_AGE = 3 * W.POLL_INTERVAL  # older rows are refreshed through the owner
+SUBSCRIPTION_TTL = 60                # seconds without a read before the owner stops polling a symbol
+OWNER_ADDRESS = ("127.0.0.1", int(os.getenv("SIM_OWNER_PORT", "5901")))
+TABLE_ENV = "SIM_QUOTE_TABLE"
+AUTHKEY_ENV = "SIM_OWNER_AUTHKEY"
+METRICS_DIR_ENV = "SIM_METRICS_DIR"
+METRICS_FLUSH_INTERVAL = 5           # seconds between a worker's writes of its own metrics
+WORKER_METRICS = ("http_request_seconds", "http_requests_total", "http_requests_in_flight", "json_encode_seconds")
+TOKEN_RETRY_INTERVAL = 5             # seconds between a worker's attempts to load the owner's instrument file
+# ----------------------------
+
+STRATEGY_NAMES = list(W.STRATEGY_TYPES)  # signal code is +/-(index + 1): positive for BUY
+QUOTE_DTYPE = np.dtype([
+    ("seq", "u8"),        # seqlock counter, odd while the owner is writing
+    ("token", "i8"),      # 0 marks a free slot
+    ("ltp", "f8"),
+    ("ts", "f8"),
+    ("upper", "f8"),      # NaN until the Bollinger window is full
+    ("middle", "f8"),
+    ("lower", "f8"),
+    ("atr", "f8"),
+    ("signal", "i1"),     # 0 for none, else STRATEGY_NAMES code
+    ("last_read", "f8")   # written by workers, read by the owner for expiry
+])
+
+# ---------- SHARED QUOTE TABLE ----------
+class QuoteTable:
+    """Fixed-size quote and indicator table in shared memory.
+
+    Only the owner writes quote fields, each row guarded by a seqlock, so
+    readers in other processes never take a lock or receive a copy of the
+    table through IPC.
+    """
+    def __init__(self, shm):
+        self.shm = shm
+        self.rows = np.ndarray((QUOTE_TABLE_SLOTS,), dtype=QUOTE_DTYPE, buffer=shm.buf)
+        self._slots = {}  # token -> slot, a per-process cache verified on every read
+
+    @classmethod
+    def create(cls):
+        shm = shared_memory.SharedMemory(create=True, size=QUOTE_DTYPE.itemsize * QUOTE_TABLE_SLOTS)
+        table = cls(shm)
+        table.rows[:] = np.zeros(QUOTE_TABLE_SLOTS, dtype=QUOTE_DTYPE)
+        return table
+
+    @classmethod
+    def attach(cls, name):
+        try:
+            shm = shared_memory.SharedMemory(name=name, track=False)
+        except TypeError:
+            # Python < 3.13 always registers the segment with this process's
+            # resource tracker, which would unlink it when the process exits
+            # even though the gunicorn master owns it.
+            shm = shared_memory.SharedMemory(name=name)
+            resource_tracker.unregister(shm._name, "shared_memory")
+        return cls(shm)
+
+    # ----- owner side -----
+    def assign(self, token):
+        free = np.flatnonzero(self.rows["token"] == 0)
+        if not len(free):
+            return None
+        slot = int(free[0])
+        row = self.rows[slot:slot + 1]
+        row["ltp"] = row["ts"] = 0.0
+        row["last_read"] = time.time()
+        row["token"] = token
+        return slot
+
+    def release(self, slot):
+        self.rows["token"][slot] = 0
+
+    def publish(self, slot, ltp, bollinger, signal):
+        rows = self.rows
+        rows["seq"][slot] += 1
+        rows["ltp"][slot] = ltp
+        rows["ts"][slot] = time.time()
+        if bollinger:
+            rows["upper"][slot] = bollinger["upper"]
+            rows["middle"][slot] = bollinger["middle"]
+            rows["lower"][slot] = bollinger["lower"]
+            rows["atr"][slot] = math.nan if bollinger["atr"] is None else bollinger["atr"]
+        else:
+            rows["upper"][slot] = rows["middle"][slot] = rows["lower"][slot] = rows["atr"][slot] = math.nan
+        rows["signal"][slot] = signal_code(signal)
+        rows["seq"][slot] += 1
+
+    # ----- reader side -----
+    def read(self, token):
+        """Return a consistent snapshot of the row for token, or None"""
+        slot = self._slots.get(token)
+        if slot is None or self.rows["token"][slot] != token:
+            found = np.flatnonzero(self.rows["token"] == token)
+            if not len(found):
+                return None
+            slot = self._slots[token] = int(found[0])
+        for _ in range(100):
+            seq = self.rows["seq"][slot]
+            if seq & 1:
+                continue
+            snap = self.rows[slot].copy()
+            if self.rows["seq"][slot] == seq and snap["token"] == token:
+                self.rows["last_read"][slot] = time.time()
+                return snap
+        return None
+
+TABLE = None
+
+def signal_code(signal):
+    if not signal:
+        return 0
+    code = STRATEGY_NAMES.index(signal.strategy) + 1
+    return code if signal.action == "BUY" else -code
+
+def get_table():
+    global TABLE
+    if TABLE is None:
+        TABLE = QuoteTable.attach(os.environ[TABLE_ENV])
+    return TABLE
+
+# ---------- OWNER PROCESS ----------
+class MarketDataOwner:
+    """Single writer for the quote table and the simulator state"""
+    def __init__(self, table):
+        self.table = table
+        self.slots = {}  # symbol -> (slot, token)
+        self._lock = threading.Lock()
+
+    def on_tick(self, symbol, price):
+        entry = self.slots.get(symbol)
+        if entry is None:
+            _, token = W.find_symbol_token(W.TOKEN_DATA, symbol)
+            if not token:
+                return
+            with self._lock:
+                slot = self.table.assign(int(token))
+                if slot is None:
+                    return
+                entry = self.slots[symbol] = (slot, token)
+        payload = W.ltp_response(symbol, price, True)
+        self.table.publish(entry[0], price, payload["bollinger"], payload["signal"])
+
+    def poll_forever(self):
+        """Keep the quote scheduler polling every symbol workers are still reading"""
+        while True:
+            started = time.time()
+            for symbol, (slot, token) in list(self.slots.items()):
+                if started - self.table.rows["last_read"][slot] > SUBSCRIPTION_TTL:
+                    with self._lock:
+                        del self.slots[symbol]
+                        self.table.release(slot)
+                    continue
+                W.SCHEDULER.watch(symbol, token, "chart", ttl=W.POLL_INTERVAL * 3)
+            time.sleep(max(W.POLL_INTERVAL - (time.time() - started), 0))
+
+    def serve(self, authkey):
+        listener = Listener(OWNER_ADDRESS, authkey=authkey)
+        while True:
+            try:
+                conn = listener.accept()
+            except Exception as e:
+                print(f"⚠️ Rejected owner connection: {e}")
+                continue
+            threading.Thread(target=self._serve_conn, args=(conn,), daemon=True).start()
+
+    def _serve_conn(self, conn):
+        client = W.app.test_client()
+        with conn:
+            while True:
+                try:
+                    method, path, query, body, headers = conn.recv()
+                except (EOFError, OSError):
+                    return
+                try:
+                    resp = client.open(path, method=method, query_string=query, data=body, headers=headers)
+                    reply = (resp.status_code, list(resp.headers.items()), resp.get_data())
+                except Exception as e:
+                    reply = (500, [("Content-Type", "application/json")],
+                             W.app.json.dumps({"error": f"Owner failed: {e}"}).encode())
+                conn.send(reply)
+
+def run_owner(table_name, authkey):
+    owner = MarketDataOwner(QuoteTable.attach(table_name))
+    W.TICK_LISTENERS.append(owner.on_tick)
+    W.start_background_login()
+    threading.Thread(target=owner.poll_forever, name="quote-poller", daemon=True).start()
+    owner.serve(authkey)
+
+OWNER_PROCESS = None
+
+def start_owner():
+    """Create the shared table and start the owner; call once in the gunicorn master.
+
+    The owner is a separate interpreter rather than a multiprocessing child,
+    so forked workers do not inherit a handle to it and cannot terminate it
+    from their own exit hooks.
+    """
+    global TABLE, OWNER_PROCESS
+    TABLE = QuoteTable.create()
+    os.environ[TABLE_ENV] = TABLE.shm.name
+    os.environ[AUTHKEY_ENV] = secrets.token_hex(16)
+    os.environ.setdefault(METRICS_DIR_ENV, tempfile.mkdtemp(prefix="sim-metrics-"))
+    OWNER_PROCESS = subprocess.Popen([sys.executable, os.path.abspath(__file__)])
+
+def stop_owner():
+    if OWNER_PROCESS is not None:
+        OWNER_PROCESS.terminate()
+        OWNER_PROCESS.wait(5)
+    if TABLE is not None:
+        TABLE.shm.close()
+        TABLE.shm.unlink()
+
+def worker_exited(pid):
+    """Drop a dead worker's metrics file; call from gunicorn's child_exit hook"""
+    try:
+        os.remove(worker_metrics_path(pid))
+    except (KeyError, OSError):
+        pass
+
+# ---------- WORKER METRICS ----------
+def worker_metrics_path(pid):
+    return os.path.join(os.environ[METRICS_DIR_ENV], f"worker-{pid}.prom")
+
+def _flush_metrics_forever():
+    pid = os.getpid()
+    path = worker_metrics_path(pid)
+    while True:
+        text = W.METRICS.render(extra=(("worker", str(pid)),), only=WORKER_METRICS)
+        tmp = f"{path}.tmp"
+        try:
+            with open(tmp, "w", encoding="utf-8") as f:
+                f.write(text)
+            os.replace(tmp, path)
+        except OSError as e:
+            print(f"⚠️ Could not write worker metrics: {e}")
+        time.sleep(METRICS_FLUSH_INTERVAL)
+
+def merge_metrics(texts):
+    """Join Prometheus texts, keeping one HELP/TYPE header per metric family"""
+    families = {}  # name -> [help, type, samples...]
+    for text in texts:
+        family = None
+        for line in text.splitlines():
+            if line.startswith("# HELP "):
+                family = families.setdefault(line.split(" ", 3)[2], [line, None])
+            elif line.startswith("# TYPE "):
+                if family[1] is None:
+                    family[1] = line
+            elif line and family is not None:
+                family.append(line)
+    return "".join("\n".join(line for line in families[name] if line) + "\n" for name in sorted(families))
+
+# ---------- HTTP WORKERS ----------
+app = Flask(__name__)
+app.json = W.SimulatorJSONProvider(app)
+CORS(app)
+_local = threading.local()
+_tokens = None        # (SYMBOL -> (symbol, token), instrument list) once the owner has saved the file
+_tokens_tried = 0.0
+_flusher_pid = None   # pid that started the metrics flusher; gunicorn forks after import
+
+FORWARDED_HEADERS = ("Content-Type", "Accept", "Accept-Encoding", "If-None-Match", "Authorization", "X-Admin-Token")
+
+def _owner_call(message):
+    """Send (method, path, ...) to the owner and return its reply, reconnecting once
+    if the pooled connection has died. Once the request is sent only a GET is
+    retried: the owner may already have run a POST whose reply was lost."""
+    for attempt in range(2):
+        conn = getattr(_local, "conn", None)
+        sent = False
+        try:
+            if conn is None:
+                conn = _local.conn = Client(OWNER_ADDRESS, authkey=os.environ[AUTHKEY_ENV].encode())
+            conn.send(message)
+            sent = True
+            return conn.recv()
+        except (EOFError, OSError):
+            _local.conn = None
+            if attempt or (sent and message[0] != "GET"):
+                raise
+
+def _token_data():
+    """The owner's instrument list and its symbol index, retried until the owner
+    has downloaded it; a fresh deploy starts before the file exists"""
+    global _tokens, _tokens_tried
+    now = time.monotonic()
+    if _tokens is None and now - _tokens_tried >= TOKEN_RETRY_INTERVAL:
+        _tokens_tried = now
+        if os.path.exists(W.TOKEN_FILE):
+            try:
+                data = W.load_or_download_tokens()
+            except (OSError, ValueError):
+                return None  # the owner is still writing it
+            _tokens = ({item["symbol"].upper(): (item["symbol"], item["token"]) for item in data}, data)
+    return _tokens
+
+def find_token(stock):
+    """(symbol, token) for stock: a dict lookup for the exact or -EQ symbol,
+    falling back to White's prefix scan"""
+    tokens = _token_data()
+    if tokens is None:
+        return None, None
+    index, data = tokens
+    name = stock.upper().strip()
+    found = index.get(name) or index.get(f"{name}-EQ")
+    return found or W.find_symbol_token(data, name)
+
+def row_response(symbol, row):
+    """Rebuild the /api/ltp payload from a table row"""
+    ltp = float(row["ltp"])
+    bollinger = None
+    if not math.isnan(row["upper"]):
+        atr = None if math.isnan(row["atr"]) else float(row["atr"])
+        bollinger = {"upper": float(row["upper"]), "middle": float(row["middle"]),
+                     "lower": float(row["lower"]), "atr": atr}
+    signal = None
+    code = int(row["signal"])
+    if code:
+        strategy = W.STRATEGY_TYPES[STRATEGY_NAMES[abs(code) - 1]]
+        action = "BUY" if code > 0 else "SELL"
+        bands = (None, None, None)
+        if strategy is W.BollingerReversion and bollinger:
+            bands = (bollinger["lower"], bollinger["middle"], bollinger["upper"])
+        signal = W.Signal(action, strategy.REASONS[action], ltp, *bands,
+                          bollinger["atr"] if bollinger else None, strategy.name)
+    return {"symbol": symbol, "ltp": ltp, "signal": signal, "bollinger": bollinger, "stale": False}
+
+@app.route("/api/ltp")
+def api_ltp():
+    stock = request.args.get("stock", "").strip()
+    if stock:
+        symbol, token = find_token(stock)
+        if symbol:
+            row = get_table().read(int(token))
+            if row is not None and row["ts"] and time.time() - row["ts"] <= QUOTE_MAX_AGE:
+                return jsonify(row_response(symbol, row))
+    # Unknown or cold symbol: the owner polls it and starts publishing it
+    return forward("api/ltp")
+
+@app.before_request
+def _start_request():
+    global _flusher_pid
+    if _flusher_pid != os.getpid() and METRICS_DIR_ENV in os.environ:
+        _flusher_pid = os.getpid()
+        threading.Thread(target=_flush_metrics_forever, name="metrics-flush", daemon=True).start()
+    route = request.url_rule.rule if request.url_rule else "unmatched"
+    request.environ["sim.trace"] = W.begin_request(request.method, route)
+
+@app.after_request
+def _record_request(response):
+    request.environ["sim.status"] = response.status_code
+    return response
+
+@app.teardown_request
+def _finish_request(exc):
+    token = request.environ.pop("sim.trace", None)
+    if token is not None:
+        W.end_request(token, request.environ.get("sim.status", 500))
+
+@app.route("/metrics")
+def metrics():
+    """Owner metrics plus every live worker's request metrics"""
+    _, _, body = _owner_call(("GET", "/metrics", "", b"", {}))
+    texts = [body.decode("utf-8")]
+    folder = os.environ.get(METRICS_DIR_ENV)
+    for name in sorted(os.listdir(folder)) if folder else ():
+        if name.endswith(".prom"):
+            try:
+                with open(os.path.join(folder, name), encoding="utf-8") as f:
+                    texts.append(f.read())
+            except OSError:
+                pass
+    return Response(merge_metrics(texts), mimetype="text/plain; version=0.0.4")
+
+@app.route("/")
+def home():
+    return W.asset_response(None)
+
+@app.route("/assets/<name>")
+def dashboard_asset(name):
+    return W.asset_response(name)
+
+@app.route("/<path:path>", methods=["GET", "POST", "PUT", "DELETE"])
+def forward(path):
+    headers = {k: v for k, v in request.headers.items() if k in FORWARDED_HEADERS}
+    status, resp_headers, body = _owner_call(
+        (request.method, "/" + path, request.query_string.decode(), request.get_data(), headers))
+    resp_headers = [(k, v) for k, v in resp_headers if k.lower() != "content-length"]
+    return Response(body, status=status, headers=resp_headers)
+
+if __name__ == "__main__":
+    run_owner(os.environ[TABLE_ENV], os.environ[AUTHKEY_ENV].encode())
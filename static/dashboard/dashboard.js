@@ -0,0 +1,631 @@
+  (function(){
+    const API_LTP = "/api/ltp";
+    const API_BUY = "/api/buy";
+    const API_SELL = "/api/sell";
+    const API_STATUS = "/api/status";
+    const API_RESET = "/api/reset";
+    const API_PARAMS = "/api/strategy/params";
+    const API_HISTORY = "/api/history";
+    const POLL_MS = 1000;
+    const MAX_POINTS = 600;
+    const HISTORY_POINTS = 300;
+
+    const state = {
+      symbol: null,
+      price: null,
+      prevPrice: null,
+      priceHistory: [],
+      timestamps: [],
+      upperBand: [],
+      lowerBand: [],
+      running: false,
+      lastUpdated: null,
+      balance: 10000000.00,
+      holdings: {},
+      transactions: [],
+      statusVersion: null,
+      strategyParams: {},
+      currentSignal: null,
+      bollingerData: null
+    };
+
+    const stockInput = document.getElementById("stockInput");
+    const getPriceBtn = document.getElementById("getPriceBtn");
+    const stopBtn = document.getElementById("stopBtn");
+    const resetBtn = document.getElementById("resetBtn");
+    const currentSymbolEl = document.getElementById("currentSymbol");
+    const currentPriceEl = document.getElementById("currentPrice");
+    const priceChangeEl = document.getElementById("priceChange");
+    const lastUpdatedEl = document.getElementById("lastUpdated");
+    const balanceAmtEl = document.getElementById("balanceAmt");
+    const tradeSymbolEl = document.getElementById("tradeSymbol");
+    const tradeQtyEl = document.getElementById("tradeQty");
+    const estValueEl = document.getElementById("estValue");
+    const posQtyEl = document.getElementById("posQty");
+    const usedPriceEl = document.getElementById("usedPrice");
+    const availCashEl = document.getElementById("availCash");
+    const portfolioContainer = document.getElementById("portfolioContainer");
+    const holdingsList = document.getElementById("holdingsList");
+    const transactionsContainer = document.getElementById("transactionsContainer");
+    const buyBtn = document.getElementById("buyBtn");
+    const sellBtn = document.getElementById("sellBtn");
+    const signalIndicator = document.getElementById("signalIndicator");
+    const bollingerBands = document.getElementById("bollingerBands");
+
+    let pollTimer = null;
+
+    const ctx = document.getElementById('chart').getContext('2d');
+    const chartData = {
+      labels: state.timestamps,
+      datasets: [{
+        label: 'Price',
+        data: state.priceHistory,
+        tension: 0.25,
+        borderWidth: 2,
+        pointRadius: 0,
+        fill: true,
+        backgroundColor: 'rgba(63, 196, 255, 0.06)',
+        borderColor: '#3dd3c9'
+      }, {
+        label: 'Upper band',
+        data: state.upperBand,
+        borderWidth: 1,
+        borderDash: [4, 4],
+        pointRadius: 0,
+        spanGaps: true,
+        borderColor: 'rgba(239, 68, 68, 0.6)'
+      }, {
+        label: 'Lower band',
+        data: state.lowerBand,
+        borderWidth: 1,
+        borderDash: [4, 4],
+        pointRadius: 0,
+        spanGaps: true,
+        borderColor: 'rgba(16, 185, 129, 0.6)'
+      }]
+    };
+    const chartOpts = {
+      animation: false,
+      responsive: true,
+      maintainAspectRatio: false,
+      scales: {
+        x: { display: false },
+        y: {
+          ticks: { callback: v => '₹' + Number(v).toLocaleString() },
+          grid: { color: 'rgba(255,255,255,0.03)' }
+        }
+      },
+      plugins: {
+        legend: { display: false }
+      }
+    };
+    const priceChart = new Chart(ctx, {
+      type: 'line',
+      data: chartData,
+      options: chartOpts
+    });
+
+    function formatCurrency(v){ return '₹ ' + Number(v).toLocaleString(undefined, {minimumFractionDigits:2, maximumFractionDigits:2}); }
+    function nowTime(){ return new Date().toLocaleTimeString(); }
+
+    // The chart datasets alias the state arrays, so ticks are appended in place
+    function setChartSeries(labels, prices, upper, lower){
+      state.timestamps.splice(0, state.timestamps.length, ...labels);
+      state.priceHistory.splice(0, state.priceHistory.length, ...prices);
+      state.upperBand.splice(0, state.upperBand.length, ...upper);
+      state.lowerBand.splice(0, state.lowerBand.length, ...lower);
+      priceChart.update('none');
+    }
+
+    async function loadHistory(symbol){
+      try {
+        const data = await safeFetchJson(`${API_HISTORY}?stock=${encodeURIComponent(symbol)}&points=${HISTORY_POINTS}`);
+        setChartSeries(
+          data.t.map(t => new Date(t * 1000).toLocaleTimeString()),
+          data.price, data.upper, data.lower
+        );
+      } catch (err){
+        console.warn('History fetch failed', err);
+        setChartSeries([], [], [], []);
+      }
+    }
+
+    function pushPrice(p, bollinger){
+      state.prevPrice = state.price;
+      state.price = p;
+      state.lastUpdated = Date.now();
+
+      state.priceHistory.push(p);
+      state.timestamps.push(new Date().toLocaleTimeString());
+      state.upperBand.push(bollinger ? bollinger.upper : null);
+      state.lowerBand.push(bollinger ? bollinger.lower : null);
+
+      if (state.priceHistory.length > MAX_POINTS){
+        state.priceHistory.shift();
+        state.timestamps.shift();
+        state.upperBand.shift();
+        state.lowerBand.shift();
+      }
+      priceChart.update('none');
+
+      currentPriceEl.textContent = formatCurrency(p);
+      currentSymbolEl.textContent = state.symbol || '—';
+
+      if (state.prevPrice != null){
+        const diff = p - state.prevPrice;
+        const pct = (diff / state.prevPrice) * 100;
+        const sign = diff >= 0 ? '+' : '-';
+        priceChangeEl.innerHTML = `${sign} ₹${Math.abs(diff).toFixed(2)} (${sign}${Math.abs(pct).toFixed(2)}%)`;
+        priceChangeEl.className = diff >= 0 ? 'price-change pos' : 'price-change neg';
+      } else {
+        priceChangeEl.textContent = '—';
+        priceChangeEl.className = 'price-change';
+      }
+      lastUpdatedEl.textContent = `Updated ${nowTime()}`;
+      usedPriceEl.textContent = formatCurrency(p);
+      updateEstValue();
+      calculateAndRenderPnL();
+    }
+
+    function updateSignalDisplay(signal, bbData){
+      state.currentSignal = signal;
+      state.bollingerData = bbData;
+
+      if (signal && signal.action) {
+        if (signal.action === "BUY") {
+          signalIndicator.className = "signal-indicator signal-buy";
+          signalIndicator.textContent = `🔵 BUY SIGNAL: ${signal.reason}`;
+        } else if (signal.action === "SELL") {
+          signalIndicator.className = "signal-indicator signal-sell";
+          signalIndicator.textContent = `🔴 SELL SIGNAL: ${signal.reason}`;
+        }
+      } else {
+        signalIndicator.className = "signal-indicator signal-neutral";
+        signalIndicator.textContent = "No active signal";
+      }
+
+      if (bbData && bbData.upper !== undefined) {
+        bollingerBands.style.display = "block";
+        document.getElementById("bbUpper").textContent = formatCurrency(bbData.upper);
+        document.getElementById("bbMiddle").textContent = formatCurrency(bbData.middle);
+        document.getElementById("bbLower").textContent = formatCurrency(bbData.lower);
+        document.getElementById("bbATR").textContent = bbData.atr ? bbData.atr.toFixed(4) : "N/A";
+      } else {
+        bollingerBands.style.display = "none";
+      }
+    }
+
+    function setRunning(flag){
+      state.running = flag;
+      if (!flag){
+        if (pollTimer) { clearInterval(pollTimer); pollTimer = null; }
+        stopBtn.textContent = 'Start Updates';
+      } else {
+        stopBtn.textContent = 'Stop Updates';
+      }
+    }
+
+    function safeFetchJson(url, opts){
+      return fetch(url, opts).then(async r => {
+        const ct = r.headers.get('content-type') || '';
+        if (!r.ok) {
+          let text = await r.text();
+          throw new Error(text || r.statusText || ('HTTP ' + r.status));
+        }
+        if (ct.indexOf('application/json') !== -1) return r.json();
+        return JSON.parse(await r.text());
+      });
+    }
+
+    async function fetchLtpFor(stock){
+      const url = `${API_LTP}?stock=${encodeURIComponent(stock)}`;
+      try {
+        const data = await safeFetchJson(url, { method: 'GET' });
+        if (data && (data.ltp !== undefined && data.symbol)) {
+          return data;
+        }
+        throw new Error('Unexpected LTP response');
+      } catch (err){
+        throw err;
+      }
+    }
+
+    async function fetchStatus(){
+      try {
+        const url = state.statusVersion === null ? API_STATUS : `${API_STATUS}?since=${state.statusVersion}`;
+        const data = await safeFetchJson(url);
+        if (data) {
+          state.balance = Number(data.balance ?? state.balance);
+          if (data.delta) {
+            Object.assign(state.holdings, data.portfolio);
+            for (const sym of data.removed ?? []) delete state.holdings[sym];
+            state.transactions = state.transactions.concat(data.transactions ?? []).slice(-50);
+          } else {
+            state.holdings = data.portfolio ?? {};
+            state.transactions = data.transactions ?? [];
+          }
+          state.statusVersion = data.version ?? null;
+          if (data.strategy_params) {
+            state.strategyParams = data.strategy_params;
+          }
+          updateStatusUI();
+        }
+      } catch (err){
+        console.warn('Status fetch failed', err);
+      }
+    }
+
+    async function fetchStrategyParams(){
+      try {
+        const data = await safeFetchJson(API_PARAMS);
+        if (data) {
+          state.strategyParams = data;
+          loadParamsToUI();
+        }
+      } catch (err){
+        console.warn('Params fetch failed', err);
+      }
+    }
+
+    async function saveStrategyParams(){
+      const params = {
+        enabled: document.getElementById("strategyEnabled").checked,
+        auto_trade_enabled: document.getElementById("autoTradeEnabled").checked,
+        bb_window: parseInt(document.getElementById("bbWindow").value),
+        std_dev_base: parseFloat(document.getElementById("stdDevBase").value),
+        std_dev_alt: parseFloat(document.getElementById("stdDevAlt").value),
+        atr_period: parseInt(document.getElementById("atrPeriod").value),
+        atr_multiplier: parseFloat(document.getElementById("atrMultiplier").value),
+        confirmation_ticks: parseInt(document.getElementById("confirmationTicks").value),
+        stop_loss_mode: document.getElementById("stopLossMode").value,
+        stop_loss_pct: parseFloat(document.getElementById("stopLossPct").value),
+        risk_per_trade_pct: parseFloat(document.getElementById("riskPerTrade").value),
+        slippage_pct: parseFloat(document.getElementById("slippagePct").value),
+        execution_model: document.getElementById("executionModel").value,
+        version: state.strategyParams.version
+      };
+
+      try {
+        const res = await safeFetchJson(API_PARAMS, {
+          method: 'POST',
+          headers: { 'Content-Type': 'application/json' },
+          body: JSON.stringify(params)
+        });
+        alert('Strategy parameters saved successfully!');
+        state.strategyParams = {...res.params, version: res.version};
+      } catch (err){
+        alert('Failed to save parameters: ' + err.message);
+      }
+    }
+
+    function loadParamsToUI(){
+      const p = state.strategyParams;
+      document.getElementById("strategyEnabled").checked = p.enabled || false;
+      document.getElementById("autoTradeEnabled").checked = p.auto_trade_enabled || false;
+      document.getElementById("bbWindow").value = p.bb_window || 20;
+      document.getElementById("stdDevBase").value = p.std_dev_base || 2.5;
+      document.getElementById("stdDevAlt").value = p.std_dev_alt || 2.8;
+      document.getElementById("atrPeriod").value = p.atr_period || 14;
+      document.getElementById("atrMultiplier").value = p.atr_multiplier || 1.5;
+      document.getElementById("confirmationTicks").value = p.confirmation_ticks || 1;
+      document.getElementById("stopLossMode").value = p.stop_loss_mode || "ATR";
+      document.getElementById("stopLossPct").value = p.stop_loss_pct || 0.07;
+      document.getElementById("riskPerTrade").value = p.risk_per_trade_pct || 0.01;
+      document.getElementById("slippagePct").value = p.slippage_pct || 0.02;
+      document.getElementById("executionModel").value = p.execution_model || "flat";
+    }
+
+    async function placeBuy(stock, qty, autoTrade){
+      try {
+        const res = await safeFetchJson(API_BUY, {
+          method: 'POST',
+          headers: { 'Content-Type': 'application/json' },
+          body: JSON.stringify({ stock, qty, auto_trade: autoTrade })
+        });
+        await fetchStatus();
+        if (res.message) alert(res.message);
+        if (res.signal) {
+          console.log('Trade executed on signal:', res.signal);
+        }
+        return res;
+      } catch (err){
+        alert('Buy failed: ' + (err.message || err));
+        throw err;
+      }
+    }
+
+    async function placeSell(stock, qty, autoTrade){
+      try {
+        const res = await safeFetchJson(API_SELL, {
+          method: 'POST',
+          headers: { 'Content-Type': 'application/json' },
+          body: JSON.stringify({ stock, qty, auto_trade: autoTrade })
+        });
+        await fetchStatus();
+        if (res.message) alert(res.message);
+        if (res.signal) {
+          console.log('Trade executed on signal:', res.signal);
+        }
+        return res;
+      } catch (err){
+        alert('Sell failed: ' + (err.message || err));
+        throw err;
+      }
+    }
+
+    async function tryResetServer(){
+      try {
+        const res = await fetch(API_RESET, { method: 'POST' });
+        if (res.ok) {
+          alert('Simulator reset successfully!');
+          await fetchStatus();
+          setChartSeries([], [], [], []);
+        } else {
+          const txt = await res.text().catch(()=>null);
+          alert('Server reset responded: ' + (txt || res.statusText));
+        }
+      } catch (err){
+        console.info('Server reset error', err);
+        alert('Server reset failed: ' + err.message);
+      }
+    }
+
+    function updateStatusUI(){
+      balanceAmtEl.textContent = formatCurrency(state.balance);
+      availCashEl.textContent = formatCurrency(state.balance);
+      
+      if (!state.holdings || Object.keys(state.holdings).length === 0){
+        portfolioContainer.innerHTML = '<div class="muted">No holdings</div>';
+        holdingsList.innerHTML = '<div class="muted">No holdings</div>';
+        posQtyEl.textContent = '0';
+      } else {
+        let html = '<table><thead><tr><th>Symbol</th><th>Qty</th><th>Avg Price</th><th>Value</th></tr></thead><tbody>';
+        let holdingsListHtml = '';
+        for (const [sym, info] of Object.entries(state.holdings)){
+          const qty = Number(info.qty || 0);
+          const avg = Number(info.avg_price || info.avgPrice || 0);
+          const val = qty * avg;
+          html += `<tr><td>${sym}</td><td>${qty}</td><td>${formatCurrency(avg)}</td><td>${formatCurrency(val)}</td></tr>`;
+          holdingsListHtml += `<div style="margin-bottom:6px"><strong>${sym}</strong> — ${qty} @ ${formatCurrency(avg)}</div>`;
+          if (sym === state.symbol) posQtyEl.textContent = qty;
+        }
+        html += '</tbody></table>';
+        portfolioContainer.innerHTML = html;
+        holdingsList.innerHTML = holdingsListHtml;
+        
+        if (state.symbol && state.holdings[state.symbol]) {
+          posQtyEl.textContent = state.holdings[state.symbol].qty;
+        } else if (state.symbol) {
+          posQtyEl.textContent = '0';
+        }
+      }
+
+      renderTransactions();
+      calculateAndRenderPnL();
+    }
+
+    function renderTransactions(){
+      if (!state.transactions || state.transactions.length === 0){
+        transactionsContainer.innerHTML = '<div class="muted">No transactions yet</div>';
+        return;
+      }
+      let html = '<table><thead><tr><th>Time</th><th>Symbol</th><th>Side</th><th>Qty</th><th>Price</th></tr></thead><tbody>';
+      for (let i = state.transactions.length-1; i >= 0; i--){
+        const t = state.transactions[i];
+        const time = new Date(t.timestamp * 1000).toLocaleTimeString();
+        html += `<tr>
+          <td>${time}</td>
+          <td>${t.symbol}</td>
+          <td class="${t.type === 'BUY' ? 'pos' : 'neg'}">${t.type}</td>
+          <td>${t.qty}</td>
+          <td>${formatCurrency(t.price)}</td>
+        </tr>`;
+      }
+      html += '</tbody></table>';
+      transactionsContainer.innerHTML = html;
+    }
+
+    function calculateAndRenderPnL(){
+      let totalInvested = 0;
+      let totalCurrentValue = 0;
+      let stockPnlHtml = '';
+      
+      if (!state.holdings || Object.keys(state.holdings).length === 0){
+        document.getElementById('totalInvested').textContent = formatCurrency(0);
+        document.getElementById('currentValue').textContent = formatCurrency(0);
+        document.getElementById('overallPnl').textContent = formatCurrency(0);
+        document.getElementById('overallPnl').className = '';
+        document.getElementById('overallPnlPct').textContent = '(0.00%)';
+        document.getElementById('stockPnlList').innerHTML = '<div class="muted small-muted">No holdings to display P&L</div>';
+        return;
+      }
+
+      for (const [sym, info] of Object.entries(state.holdings)){
+        const qty = Number(info.qty || 0);
+        const avgPrice = Number(info.avg_price || info.avgPrice || 0);
+        const invested = qty * avgPrice;
+        
+        let currentPrice = avgPrice;
+        if (sym === state.symbol && state.price) {
+          currentPrice = Number(state.price);
+        } else if (info.current_price) {
+          currentPrice = Number(info.current_price);
+        }
+        
+        const currentVal = qty * currentPrice;
+        const pnl = currentVal - invested;
+        const pnlPct = invested > 0 ? (pnl / invested) * 100 : 0;
+        
+        totalInvested += invested;
+        totalCurrentValue += currentVal;
+        
+        const pnlClass = pnl >= 0 ? 'profit' : 'loss';
+        const pnlColor = pnl >= 0 ? 'pos' : 'neg';
+        const pnlSign = pnl >= 0 ? '+' : '';
+        
+        stockPnlHtml += `
+          <div class="pnl-item ${pnlClass}">
+            <div class="pnl-item-header">
+              <span class="pnl-item-symbol">${sym}</span>
+              <span class="pnl-item-value ${pnlColor}">${pnlSign}${formatCurrency(pnl)}</span>
+            </div>
+            <div class="pnl-item-details">
+              <span>${qty} shares @ ${formatCurrency(avgPrice)}</span>
+              <span class="${pnlColor}">${pnlSign}${pnlPct.toFixed(2)}%</span>
+            </div>
+            <div class="pnl-item-details">
+              <span>Invested: ${formatCurrency(invested)}</span>
+              <span>Current: ${formatCurrency(currentVal)}</span>
+            </div>
+          </div>
+        `;
+      }
+      
+      document.getElementById('totalInvested').textContent = formatCurrency(totalInvested);
+      document.getElementById('currentValue').textContent = formatCurrency(totalCurrentValue);
+      
+      const overallPnl = totalCurrentValue - totalInvested;
+      const overallPnlPct = totalInvested > 0 ? (overallPnl / totalInvested) * 100 : 0;
+      
+      const overallPnlEl = document.getElementById('overallPnl');
+      const overallPnlSign = overallPnl >= 0 ? '+' : '';
+      overallPnlEl.textContent = `${overallPnlSign}${formatCurrency(overallPnl)}`;
+      overallPnlEl.className = overallPnl >= 0 ? 'pos' : 'neg';
+      
+      const overallPnlPctEl = document.getElementById('overallPnlPct');
+      overallPnlPctEl.textContent = `(${overallPnlSign}${overallPnlPct.toFixed(2)}%)`;
+      overallPnlPctEl.className = overallPnl >= 0 ? 'small-muted pos' : 'small-muted neg';
+      
+      document.getElementById('stockPnlList').innerHTML = stockPnlHtml;
+    }
+
+    function updateEstValue(){
+      const qty = Number(tradeQtyEl.value) || 0;
+      const price = Number(state.price) || 0;
+      const est = qty * price;
+      estValueEl.textContent = formatCurrency(est);
+    }
+
+    // Toggle collapsible section
+    document.getElementById('paramsToggle').addEventListener('click', function(){
+      const content = document.getElementById('paramsContent');
+      const arrow = this.querySelector('div:last-child');
+      if (content.classList.contains('open')) {
+        content.classList.remove('open');
+        arrow.textContent = '▼';
+      } else {
+        content.classList.add('open');
+        arrow.textContent = '▲';
+      }
+    });
+
+    // Save parameters button
+    document.getElementById('saveParamsBtn').addEventListener('click', saveStrategyParams);
+
+    // Get price button
+    getPriceBtn.addEventListener('click', async () => {
+      const raw = stockInput.value.trim();
+      if (!raw) { alert('Enter a stock name'); return; }
+      try {
+        const data = await fetchLtpFor(raw);
+        const symbol = data.symbol;
+        const ltp = Number(data.ltp);
+        if (symbol !== state.symbol) await loadHistory(symbol);
+        state.symbol = symbol;
+        tradeSymbolEl.value = symbol;
+        pushPrice(ltp, data.bollinger);
+        
+        // Update signal display
+        updateSignalDisplay(data.signal, data.bollinger);
+        
+        await fetchStatus();
+
+        if (!state.running){
+          setRunning(true);
+          pollTimer = setInterval(async () => {
+            if (!state.symbol) return;
+            try {
+              const d = await fetchLtpFor(state.symbol);
+              if (d && d.ltp !== undefined){
+                pushPrice(Number(d.ltp), d.bollinger);
+                updateSignalDisplay(d.signal, d.bollinger);
+              }
+            } catch (err){
+              console.warn('poll error', err);
+            }
+          }, POLL_MS);
+        }
+      } catch (err){
+        alert('Failed to get price: ' + (err.message || err));
+      }
+    });
+
+    stopBtn.addEventListener('click', () => {
+      if (state.running){
+        setRunning(false);
+      } else {
+        if (state.symbol){
+          setRunning(true);
+          pollTimer = setInterval(async () => {
+            try {
+              const d = await fetchLtpFor(state.symbol);
+              if (d && d.ltp !== undefined) {
+                pushPrice(Number(d.ltp), d.bollinger);
+                updateSignalDisplay(d.signal, d.bollinger);
+              }
+            } catch(e){ console.warn('poll error', e); }
+          }, POLL_MS);
+        }
+      }
+    });
+
+    resetBtn.addEventListener('click', async () => {
+      if (confirm('Reset simulator? This will reset your balance and clear all holdings.')) {
+        await tryResetServer();
+      }
+    });
+
+    tradeQtyEl.addEventListener('input', updateEstValue);
+    tradeSymbolEl.addEventListener('input', () => { 
+      state.symbol = tradeSymbolEl.value.trim().toUpperCase(); 
+    });
+
+    buyBtn.addEventListener('click', async () => {
+      const qty = Math.max(1, Math.floor(Number(tradeQtyEl.value) || 1));
+      const sym = (tradeSymbolEl.value || state.symbol || '').trim();
+      if (!sym) return alert('No symbol selected.');
+      
+      const autoTrade = state.strategyParams.auto_trade_enabled || false;
+      
+      try {
+        await placeBuy(sym, qty, autoTrade);
+      } catch (err){
+        // handled in placeBuy
+      }
+    });
+
+    sellBtn.addEventListener('click', async () => {
+      const qty = Math.max(1, Math.floor(Number(tradeQtyEl.value) || 1));
+      const sym = (tradeSymbolEl.value || state.symbol || '').trim();
+      if (!sym) return alert('No symbol selected.');
+      
+      const autoTrade = state.strategyParams.auto_trade_enabled || false;
+      
+      try {
+        await placeSell(sym, qty, autoTrade);
+      } catch (err){
+        // handled in placeSell
+      }
+    });
+
+    // Initial load
+    (async function init(){
+      await fetchStrategyParams();
+      await fetchStatus();
+      updateEstValue();
+    })();
+
+    window._simState = state;
+    window._pushPrice = pushPrice;
+    window._updateStatusUI = updateStatusUI;
+  })();